@@ -0,0 +1,88 @@
+"""Report of the prompt tokens saved by compact knowledge graph formats.
+
+Rebuilds the "kg_to_text" prompts of the original and permuted knowledge graphs
+and the "semantic_groups" prompt of every KEN-C137 generator output under
+`papers/`, with the default dict repr and with `COMPACT_PROMPT_FORMATS`, and
+counts their tokens. Run from the repository root:
+
+    python benchmarks/kg_prompt_tokens.py
+    python benchmarks/kg_prompt_tokens.py --model gpt-4o --papers-dir papers
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from generators.ken_c137.graphs.compact_permutations import load_permutations  # noqa: E402
+from generators.ken_c137.prompts.create_user_prompts import KnowledgeGraphCreator  # noqa: E402
+from generators.ken_c137.prompts.kg_formats import COMPACT_PROMPT_FORMATS  # noqa: E402
+from llm.caller import count_tokens  # noqa: E402
+
+
+def prompt_tokens(outputs: dict, kg_creator: KnowledgeGraphCreator, model: str) -> dict[str, int]:
+    """Count the tokens of the knowledge graph prompts of generator outputs.
+
+    Args:
+        outputs: The generator outputs.
+        kg_creator: Prompt creator with the formats to count.
+        model: Model whose tokenizer counts the tokens.
+
+    Returns:
+        The tokens of the "kg_to_text" prompts, summed over the original and
+        permuted graphs, and of the "semantic_groups" prompt.
+    """
+    kg_to_text = 0
+    for experiment, kg in outputs["knowledge_graph"].items():
+        permutations = load_permutations(outputs).get(experiment, {})
+        for permuted_kg in [kg, *permutations.values()]:
+            kg_to_text += count_tokens(
+                model, kg_creator.convert_kg_to_text_single_experiment(permuted_kg)
+            )
+    semantic_groups = count_tokens(
+        model, kg_creator.identify_semantic_groups(outputs["knowledge_graph"])
+    )
+    return {"kg_to_text": kg_to_text, "semantic_groups": semantic_groups}
+
+
+def main() -> None:
+    """Run the prompt token report."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--papers-dir", type=Path, default=Path("papers"), help="Papers folder")
+    parser.add_argument("--model", default="gpt-4o", help="Model whose tokenizer is used")
+    args = parser.parse_args()
+
+    default_creator = KnowledgeGraphCreator("")
+    compact_creator = KnowledgeGraphCreator("", COMPACT_PROMPT_FORMATS)
+    totals = {"dict": 0, "compact": 0}
+    for outputs_path in sorted(args.papers_dir.glob("*/gen_ken_c137*.json")):
+        with outputs_path.open() as f:
+            outputs = json.load(f)
+        if not outputs.get("knowledge_graph"):
+            continue
+        default_tokens = prompt_tokens(outputs, default_creator, args.model)
+        compact_tokens = prompt_tokens(outputs, compact_creator, args.model)
+        print(f"{outputs_path.parent.name}/{outputs_path.name}")
+        for prompt, tokens in default_tokens.items():
+            saved = 1 - compact_tokens[prompt] / tokens if tokens else 0.0
+            print(
+                f"  {prompt:<16} dict {tokens:8d} tokens, compact {compact_tokens[prompt]:8d} "
+                f"tokens ({saved:.1%} saved)"
+            )
+        totals["dict"] += sum(default_tokens.values())
+        totals["compact"] += sum(compact_tokens.values())
+
+    if totals["dict"]:
+        saved = 1 - totals["compact"] / totals["dict"]
+        print(
+            f"total: dict {totals['dict']} tokens, compact {totals['compact']} tokens "
+            f"({saved:.1%} saved)"
+        )
+    else:
+        print(f"No KEN-C137 generator outputs under {args.papers_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""Local stand-in for an OpenAI-compatible chat completions server.
+
+Answers `/v1/chat/completions` requests with schema-valid payloads for the
+response models of the `ken_c137` pipeline, built from the outputs saved for
+the sample paper, after a log-normally distributed latency. A configurable
+fraction of requests is rejected with HTTP 429, as a provider under load would.
+With a capacity, requests beyond it are rejected with HTTP 429 and a
+`Retry-After` of one second, and latency grows once more than half of the
+capacity is in use, as with a key shared with other jobs. Used by
+`benchmarks/pipeline_throughput.py`; it can also be run on its own:
+
+    python benchmarks/llm_server.py --port 8765 --median-latency 0.2 --error-rate 0.05 --capacity 8
+"""
+
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import ClassVar
+
+SAMPLE_OUTPUTS_PATH = next(
+    (Path(__file__).parent.parent / "papers").glob("*/gen_ken_c137_algo1_gpt-4o-2024-08-06.json")
+)
+PACKED_ID_PATTERN = re.compile(r"Knowledge graph (\S+):\s")
+
+
+def initial_kg_payload(knowledge_graph: dict) -> dict:
+    """Build an `InitialKG` payload.
+
+    Args:
+        knowledge_graph: Knowledge graph with experiment_N keys.
+
+    Returns:
+        The payload.
+    """
+    return {
+        "knowledge_graph": [
+            {"experiment_name": experiment, **graph}
+            for experiment, graph in knowledge_graph.items()
+        ]
+    }
+
+
+def semantic_groups_payload(semantic_groups: dict) -> dict:
+    """Build an `IdentifiedSemanticGroups` payload.
+
+    Args:
+        semantic_groups: Semantic groups with experiment_N keys.
+
+    Returns:
+        The payload.
+    """
+    return {
+        "experiment_semantic_groups": [
+            {
+                "experiment_name": experiment,
+                "semantic_groups": [
+                    {"group_name": group_name, "nodes": nodes}
+                    for group_name, nodes in groups.items()
+                ],
+            }
+            for experiment, groups in semantic_groups.items()
+        ]
+    }
+
+
+class SimulatedLLM:
+    """Payloads, latency and failures of the simulated server."""
+
+    def __init__(
+        self, median_latency: float, latency_sigma: float, error_rate: float, capacity: int = 0
+    ) -> None:
+        """Initialize the simulation.
+
+        Args:
+            median_latency: Median latency of a request in seconds.
+            latency_sigma: Standard deviation of the log latency.
+            error_rate: Fraction of requests rejected with HTTP 429.
+            capacity: Maximal number of requests served at the same time, 0 for no limit.
+        """
+        self.median_latency = median_latency
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.capacity = capacity
+        self.in_flight = 0
+        with SAMPLE_OUTPUTS_PATH.open() as f:
+            self.sample = json.load(f)
+        self.results = next(iter(self.sample["results"].values()))
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.rejected = 0
+        self.connections = 0
+
+    def payload(self, schema_name: str, prompt: str) -> dict:
+        """Build a payload valid for a response schema.
+
+        Args:
+            schema_name: Name of the response schema.
+            prompt: The user prompt of the request.
+
+        Returns:
+            The payload.
+        """
+        if schema_name == "SummarizeMethods":
+            return {"methods": self.sample["methods"]}
+        if schema_name == "InitialKG":
+            return initial_kg_payload(self.sample["knowledge_graph"])
+        if schema_name == "IdentifiedSemanticGroups":
+            return semantic_groups_payload(self.sample["semantic_groups"])
+        if schema_name == "PackedKGAsText":
+            return {
+                "permutations": [
+                    {"permutation_id": permutation_id, "results": self.results}
+                    for permutation_id in PACKED_ID_PATTERN.findall(prompt)
+                ]
+            }
+        return {"results": self.results}
+
+    def sample_latency(self) -> float:
+        """Draw the latency of a request, inflated by the load beyond half of the capacity.
+
+        Returns:
+            The latency in seconds.
+        """
+        latency = random.lognormvariate(math.log(self.median_latency), self.latency_sigma)
+        if self.capacity:
+            latency *= max(1.0, 2 * self.in_flight / self.capacity)
+        return latency
+
+    def admit(self) -> bool:
+        """Take a slot for a request, if the capacity allows it.
+
+        Returns:
+            False if the request is over capacity and rejected with HTTP 429.
+        """
+        with self._lock:
+            if self.capacity and self.in_flight >= self.capacity:
+                self.requests += 1
+                self.rejected += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def finish(self) -> None:
+        """Free the slot of an admitted request."""
+        with self._lock:
+            self.in_flight -= 1
+
+    def should_reject(self) -> bool:
+        """Count a request and decide whether to reject it.
+
+        Returns:
+            True if the request is rejected with HTTP 429.
+        """
+        rejected = random.random() < self.error_rate
+        with self._lock:
+            self.requests += 1
+            self.rejected += rejected
+        return rejected
+
+
+class ChatCompletionsHandler(BaseHTTPRequestHandler):
+    """Handler of chat completion requests."""
+
+    simulation: ClassVar[SimulatedLLM]
+    # Keep connections open between requests, as providers do.
+    protocol_version = "HTTP/1.1"
+
+    def setup(self) -> None:
+        """Count the connection before serving its requests."""
+        super().setup()
+        with self.simulation._lock:
+            self.simulation.connections += 1
+
+    def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+        """Silence the request log.
+
+        Args:
+            format: Format of the message.
+            *args: Arguments of the message.
+        """
+
+    def send_json(self, status: int, body: dict, retry_after: str = "0") -> None:
+        """Send a JSON response.
+
+        Args:
+            status: HTTP status.
+            body: The body of the response.
+            retry_after: `Retry-After` header of 429 responses, in seconds.
+        """
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if status == 429:
+            self.send_header("Retry-After", retry_after)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self) -> None:  # noqa: N802
+        """Answer a chat completion request."""
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        rate_limit_error = {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}}
+        if not self.simulation.admit():
+            self.send_json(429, rate_limit_error, retry_after="1")
+            return
+        try:
+            time.sleep(self.simulation.sample_latency())
+        finally:
+            self.simulation.finish()
+        if self.simulation.should_reject():
+            self.send_json(429, rate_limit_error)
+            return
+
+        response_format = request.get("response_format") or {}
+        schema_name = response_format.get("json_schema", {}).get("name", "")
+        prompt = request["messages"][-1]["content"]
+        content = json.dumps(self.simulation.payload(schema_name, prompt))
+        prompt_tokens = sum(len(message["content"]) for message in request["messages"]) // 4
+        completion_tokens = len(content) // 4
+        self.send_json(
+            200,
+            {
+                "id": "chatcmpl-simulated",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            },
+        )
+
+
+def start_server(simulation: SimulatedLLM, port: int = 0) -> ThreadingHTTPServer:
+    """Start the simulated server in a background thread.
+
+    Args:
+        simulation: The simulation answering requests.
+        port: Port to listen on, 0 for any free port.
+
+    Returns:
+        The running server.
+    """
+    handler = type("Handler", (ChatCompletionsHandler,), {"simulation": simulation})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    """Run the simulated server until interrupted."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on")
+    parser.add_argument("--median-latency", type=float, default=0.2, help="Median latency (s)")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Sigma of log latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of 429 responses")
+    parser.add_argument("--capacity", type=int, default=0, help="Max concurrent requests, 0: none")
+    args = parser.parse_args()
+
+    simulation = SimulatedLLM(
+        args.median_latency, args.latency_sigma, args.error_rate, args.capacity
+    )
+    server = start_server(simulation, args.port)
+    print(f"Serving on http://127.0.0.1:{server.server_port}/v1, press Ctrl+C to stop")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
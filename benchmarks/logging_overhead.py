@@ -0,0 +1,152 @@
+"""Benchmark of the logging overhead on hot paths.
+
+Measures, with debug logs disabled, the cost of the eager f-string debug calls
+`create_permutations` used to make for every candidate permutation against the
+level check it now does once, on the permutation combinations of the largest
+synthetic graph of `permutations.py`. Then measures how long callers are
+blocked logging records, in text or JSON, to a plain file and to a file synced
+after every record (standing in for a slow terminal or pipe), with a
+synchronous handler and with the queue-backed `NonBlockingHandler`. Run from
+the repository root:
+
+    python benchmarks/logging_overhead.py
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from itertools import permutations, product
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from permutations import CASES, synthetic_kg  # noqa: E402
+
+from logger.handlers import JsonFormatter, NonBlockingHandler, log_context  # noqa: E402
+
+
+class SyncedFileHandler(logging.FileHandler):
+    """File handler syncing the file to disk after every record."""
+
+    def flush(self) -> None:
+        """Flush and sync the file."""
+        super().flush()
+        if self.stream is not None:
+            os.fsync(self.stream.fileno())
+
+
+def perm_combos(case: dict) -> list[tuple]:
+    """Enumerate the candidate permutations of a synthetic graph.
+
+    Args:
+        case: Sizes of the synthetic graph, see `permutations.synthetic_kg`.
+
+    Returns:
+        One permutation of node ids per semantic group, for every candidate.
+    """
+    _, semantic_groups = synthetic_kg(**case)
+    groups = semantic_groups["experiment_1"].values()
+    group_swaps = [list(permutations([node["id"] for node in nodes])) for nodes in groups]
+    return list(product(*group_swaps))
+
+
+def time_hot_loop(logger: logging.Logger, combos: list[tuple], repeats: int) -> tuple[float, float]:
+    """Time the debug logging of a permutation loop, eager and guarded.
+
+    Args:
+        logger: Logger whose debug level is disabled.
+        combos: The candidate permutations.
+        repeats: Number of passes over the candidates.
+
+    Returns:
+        The seconds spent with eager f-string calls and with a level check done once.
+    """
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for perm_combo in combos:
+            logger.debug(f"  Applying perm_combo: {perm_combo}")
+            for perm in perm_combo:
+                logger.debug(f"   new_order: {perm}")
+    eager_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        log_debug = logger.isEnabledFor(logging.DEBUG)
+        for perm_combo in combos:
+            if log_debug:
+                logger.debug(f"  Applying perm_combo: {perm_combo}")
+            for perm in perm_combo:
+                if log_debug:
+                    logger.debug(f"   new_order: {perm}")
+    return eager_seconds, time.perf_counter() - start
+
+
+def time_handler(handler: logging.Handler, num_records: int) -> tuple[float, float]:
+    """Time logging records through a handler.
+
+    Args:
+        handler: The handler, closed once the records are logged.
+        num_records: Number of records to log.
+
+    Returns:
+        The seconds callers were blocked logging, and until every record was written.
+    """
+    logger = logging.getLogger(f"benchmark.{id(handler)}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    start = time.perf_counter()
+    with log_context(run_id="benchmark/run", stage="convert"):
+        for record_i in range(num_records):
+            logger.info("Converting permutation %d...", record_i)
+    caller_seconds = time.perf_counter() - start
+    handler.close()
+    logger.removeHandler(handler)
+    return caller_seconds, time.perf_counter() - start
+
+
+def main() -> None:
+    """Run the logging overhead benchmark."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeats", type=int, default=200, help="Passes over the candidates")
+    parser.add_argument("--records", type=int, default=5000, help="Records per handler")
+    args = parser.parse_args()
+
+    combos = perm_combos(CASES[-1])
+    logger = logging.getLogger("benchmark.hot_loop")
+    logger.setLevel(logging.INFO)
+    eager_seconds, guarded_seconds = time_hot_loop(logger, combos, args.repeats)
+    num_candidates = len(combos) * args.repeats
+    print(
+        f"hot loop, debug off: eager f-strings {eager_seconds / num_candidates * 1e9:6.0f} "
+        f"ns/candidate, level checked once {guarded_seconds / num_candidates * 1e9:6.0f} "
+        f"ns/candidate ({len(combos)} candidates x {args.repeats})"
+    )
+
+    text_format = "%(asctime)s - %(levelname)s - %(name)s - %(message)s"
+    with tempfile.TemporaryDirectory() as log_dir:
+        for sink, handler_class in (("file", logging.FileHandler), ("synced", SyncedFileHandler)):
+            for record_format in ("text", "json"):
+                for queued in (False, True):
+                    name = f"{sink} {record_format}{' queued' if queued else ''}"
+                    handler = handler_class(Path(log_dir, f"{name}.log"))
+                    handler.setFormatter(
+                        JsonFormatter()
+                        if record_format == "json"
+                        else logging.Formatter(text_format)
+                    )
+                    caller_seconds, total_seconds = time_handler(
+                        NonBlockingHandler(handler) if queued else handler, args.records
+                    )
+                    print(
+                        f"{name:<19} callers blocked "
+                        f"{caller_seconds / args.records * 1e6:7.1f} us/record, "
+                        f"all written after {total_seconds:.2f}s"
+                    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""Benchmark of the permutation engine on synthetic knowledge graphs.
+
+Generates knowledge graphs and semantic groups of controllable size, then
+measures the wall-clock time, peak memory and throughput of
+`create_permutations`, `sampling_permutations` and
+`graph_deviation_from_original` across a sweep of sizes. Results can be saved
+as a JSON baseline and later runs are compared against it, flagging cases that
+got slower or more memory hungry beyond a tolerance, or whose number of
+permutations changed. Run from the repository root:
+
+    python benchmarks/permutations.py --save-baseline
+    python benchmarks/permutations.py --tolerance 0.5
+"""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+from typing import TypeVar
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from generators.ken_c137.graphs.permute_knowledge_graph import (  # noqa: E402
+    create_permutations,
+    graph_deviation_from_original,
+)
+from generators.ken_c137.kg_pipeline import sampling_permutations  # noqa: E402
+
+T = TypeVar("T")
+
+BASELINE_PATH = Path(__file__).parent / "baselines" / "permutations.json"
+# Increases below these are measurement noise and never flagged.
+NOISE_FLOORS = {"create_seconds": 0.01, "deviation_seconds": 0.01, "create_peak_bytes": 65536}
+
+# Sweep of synthetic graph sizes; the number of permutations grows with the
+# number of groups and factorially with the group size.
+CASES = [
+    {"num_nodes": 10, "num_edges": 12, "num_groups": 1, "group_size": 3},
+    {"num_nodes": 20, "num_edges": 30, "num_groups": 2, "group_size": 3},
+    {"num_nodes": 40, "num_edges": 60, "num_groups": 3, "group_size": 3},
+    {"num_nodes": 40, "num_edges": 60, "num_groups": 1, "group_size": 5},
+    {"num_nodes": 80, "num_edges": 120, "num_groups": 2, "group_size": 4},
+]
+
+
+def synthetic_kg(
+    num_nodes: int, num_edges: int, num_groups: int, group_size: int, seed: int = 0
+) -> tuple[dict, dict]:
+    """Generate a single-experiment knowledge graph and its semantic groups.
+
+    Args:
+        num_nodes: Number of nodes.
+        num_edges: Number of edges, between random pairs of distinct nodes.
+        num_groups: Number of semantic groups of swappable nodes.
+        group_size: Number of nodes in each semantic group.
+        seed: Seed of the random edges.
+
+    Returns:
+        The knowledge graph and the semantic groups, keyed by "experiment_1".
+    """
+    if num_groups * group_size > num_nodes:
+        raise ValueError("Semantic groups need more nodes than the graph has")
+    rng = random.Random(seed)
+    nodes = [{"id": i, "label": f"Node {i}"} for i in range(1, num_nodes + 1)]
+    edges = []
+    for edge_i in range(num_edges):
+        source, target = rng.sample(range(1, num_nodes + 1), 2)
+        edges.append({"source": source, "target": target, "relation": f"relation {edge_i % 7}"})
+    semantic_groups = {
+        f"Group {group_i}": [
+            {"id": node_id, "label": f"Node {node_id}", "level": 1}
+            for node_id in range(group_i * group_size + 1, (group_i + 1) * group_size + 1)
+        ]
+        for group_i in range(num_groups)
+    }
+    return {"experiment_1": {"nodes": nodes, "edges": edges}}, {"experiment_1": semantic_groups}
+
+
+def measure(function: Callable[[], T], repeats: int) -> tuple[float, int, T]:
+    """Measure the median time and the peak memory of a function.
+
+    Args:
+        function: The function to measure.
+        repeats: Number of timed runs.
+
+    Returns:
+        The median wall-clock time in seconds, the peak traced memory in bytes
+        and the result of the function.
+    """
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    # Memory is traced in a separate run, tracing slows the function down.
+    tracemalloc.start()
+    result = function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak, result
+
+
+def run_case(case: dict, repeats: int) -> dict:
+    """Benchmark the permutation engine on one synthetic graph.
+
+    Args:
+        case: Sizes of the synthetic graph, see `synthetic_kg`.
+        repeats: Number of timed runs.
+
+    Returns:
+        The number of permutations, timings, peak memory and throughput.
+    """
+    knowledge_graph, semantic_groups = synthetic_kg(**case)
+    original = knowledge_graph["experiment_1"]
+
+    create_seconds, create_peak, (permutations, _, _) = measure(
+        lambda: create_permutations(knowledge_graph, semantic_groups), repeats
+    )
+    kg_perms = permutations["experiment_1"]
+    sampling_seconds, _, _ = measure(lambda: sampling_permutations(kg_perms, 10), repeats)
+    deviation_seconds, _, _ = measure(
+        lambda: [graph_deviation_from_original(kg, original) for kg in kg_perms.values()],
+        repeats,
+    )
+    return {
+        "case": case,
+        "num_permutations": len(kg_perms),
+        "create_seconds": create_seconds,
+        "create_peak_bytes": create_peak,
+        "permutations_per_second": len(kg_perms) / create_seconds if create_seconds else 0.0,
+        "sampling_seconds": sampling_seconds,
+        "deviation_seconds": deviation_seconds,
+        "deviation_seconds_per_graph": deviation_seconds / max(len(kg_perms), 1),
+    }
+
+
+def case_name(case: dict) -> str:
+    """Name a case after its sizes.
+
+    Args:
+        case: Sizes of the synthetic graph.
+
+    Returns:
+        The name of the case.
+    """
+    return "n{num_nodes}-e{num_edges}-g{num_groups}x{group_size}".format(**case)
+
+
+def find_regressions(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Compare results to a baseline.
+
+    Args:
+        results: Results keyed by case name.
+        baseline: Baseline results keyed by case name.
+        tolerance: Relative increase of time or memory above which a case regressed,
+            if the increase is also above the noise floor of the metric.
+
+    Returns:
+        A description of each regression.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        expected = baseline[name]
+        if result["num_permutations"] != expected["num_permutations"]:
+            regressions.append(
+                f"{name}: {result['num_permutations']} permutations instead of "
+                f"{expected['num_permutations']}"
+            )
+        for metric, noise_floor in NOISE_FLOORS.items():
+            increase = result[metric] - expected[metric]
+            if increase > expected[metric] * tolerance and increase > noise_floor:
+                regressions.append(
+                    f"{name}: {metric} {result[metric]:.4g} vs baseline {expected[metric]:.4g}"
+                )
+    return regressions
+
+
+def main() -> None:
+    """Run the permutation engine benchmark."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeats", type=int, default=3, help="Number of timed runs per case")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.5,
+        help="Relative slowdown or memory increase flagged as a regression",
+    )
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH, help="Baseline file")
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="Save the results as the new baseline"
+    )
+    args = parser.parse_args()
+
+    results = {}
+    for case in CASES:
+        result = run_case(case, args.repeats)
+        results[case_name(case)] = result
+        print(
+            f"{case_name(case):<22} {result['num_permutations']:>6} permutations "
+            f"{result['create_seconds']:.3f}s "
+            f"{result['permutations_per_second']:>9.0f} perms/s "
+            f"peak {result['create_peak_bytes'] / 1e6:.1f} MB"
+        )
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        with args.baseline.open("w") as f:
+            json.dump(results, f, indent=4)
+        print(f"Saved baseline {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}, run with --save-baseline to create one")
+        return
+    with args.baseline.open() as f:
+        regressions = find_regressions(results, json.load(f), args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""End-to-end throughput benchmark of the generation pipeline.
+
+Runs `generators.main.generate` with the `ken_c137` pipeline on copies of the
+sample paper against the simulated OpenAI-compatible server of
+`llm_server.py`, so orchestration overhead and concurrency behaviour can be
+measured without a provider. For each concurrency setting, papers are generated
+by that many threads sharing the process rate limiter, and the benchmark
+reports papers/min, LLM calls/s, time spent waiting on the rate limiter, 429
+rejections, connections opened to the server and the p95 latency of each
+pipeline stage (from `llm.telemetry`).
+With `--capacity`, the server only serves that many requests at a time, as a
+key shared with other jobs would; `--adaptive` then turns on the adaptive
+concurrency controller of `llm.caller` and reports the limits it settled on.
+Run from the repository root:
+
+    python benchmarks/pipeline_throughput.py --papers 8 --concurrency 1,2,4,8
+    python benchmarks/pipeline_throughput.py --concurrency 8 --capacity 4 --adaptive
+    python benchmarks/pipeline_throughput.py --llm azure/gpt-4o-2024-08-06
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from llm_server import SAMPLE_OUTPUTS_PATH, SimulatedLLM, start_server  # noqa: E402
+
+# litellm warns about its own response objects on every call.
+warnings.filterwarnings("ignore", category=UserWarning, module="pydantic")
+
+
+def run_setting(
+    papers: list[str], concurrency: int, llm: str, max_num_samples: int, run_kwargs: dict
+) -> dict:
+    """Generate outputs for papers with a number of concurrent threads.
+
+    Args:
+        papers: DOIs of the papers, under `papers/` in the working directory.
+        concurrency: Number of papers generated at the same time.
+        llm: LLM to use for processing.
+        max_num_samples: Max number of permutations converted per paper.
+        run_kwargs: Additional keyword arguments passed to the pipeline.
+
+    Returns:
+        The number of generated papers, papers per minute and the LLM telemetry.
+    """
+    from generators.main import generate
+    from llm.caller import get_concurrency_controller, get_rate_limiter
+    from llm.telemetry import get_telemetry
+
+    # Each setting starts with a full rate limiter bucket, maximal adaptive limits
+    # and empty telemetry.
+    get_rate_limiter.cache_clear()
+    get_concurrency_controller.cache_clear()
+    get_telemetry().reset()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        output_paths = list(
+            executor.map(
+                lambda doi: generate(
+                    doi, "ken_c137", "algo1", llm, max_num_samples, run_kwargs=run_kwargs
+                ),
+                papers,
+            )
+        )
+    seconds = time.perf_counter() - start
+    num_generated = sum(output_path is not None for output_path in output_paths)
+    return {
+        "papers": num_generated,
+        "failed": len(papers) - num_generated,
+        "papers_per_minute": num_generated / seconds * 60,
+        "telemetry": get_telemetry().summary(),
+    }
+
+
+def print_setting(concurrency: int, result: dict, rejected: int, connections: int) -> None:
+    """Print the results of a concurrency setting.
+
+    Args:
+        concurrency: Number of papers generated at the same time.
+        result: The results of the setting.
+        rejected: Number of requests rejected with HTTP 429 by the server.
+        connections: Number of connections opened to the server.
+    """
+    telemetry = result["telemetry"]
+    print(
+        f"concurrency {concurrency:>2}: {result['papers_per_minute']:7.1f} papers/min, "
+        f"{telemetry['calls_per_second']:6.2f} calls/s, "
+        f"rate limiter wait {telemetry['rate_limit_wait_seconds']:.1f}s, "
+        f"{rejected} x 429, {result['failed']} failed papers, {connections} connections"
+    )
+    if telemetry["concurrency"]:
+        concurrency_state = telemetry["concurrency"]
+        print(
+            f"    adaptive: {concurrency_state['limit']} requests in flight, "
+            f"{concurrency_state['tokens_per_minute']} tokens/min after "
+            f"{concurrency_state['decreases']} decreases, "
+            f"slot wait {concurrency_state['wait_seconds']:.1f}s"
+        )
+    for stage, stats in telemetry["stages"].items():
+        print(
+            f"    {stage:<26} {stats['calls']:>4} calls  "
+            f"mean {stats['mean_seconds']:.3f}s  p95 {stats['p95_seconds']:.3f}s"
+        )
+
+
+def main() -> None:
+    """Run the pipeline throughput benchmark."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--papers", type=int, default=8, help="Number of papers per setting")
+    parser.add_argument(
+        "--concurrency", type=str, default="1,2,4,8", help="Comma-separated concurrency settings"
+    )
+    parser.add_argument("--median-latency", type=float, default=0.1, help="Median latency (s)")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Sigma of log latency")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="Fraction of 429 responses")
+    parser.add_argument(
+        "--tokens-per-minute", type=int, default=1_000_000, help="Rate limit of the process"
+    )
+    parser.add_argument("--capacity", type=int, default=0, help="Server capacity, 0 for none")
+    parser.add_argument(
+        "--adaptive", action="store_true", help="Enable adaptive concurrency in the caller"
+    )
+    parser.add_argument("--max-num-samples", type=int, default=10, help="Permutations per paper")
+    parser.add_argument("--packed", action="store_true", help="Pack permutations per request")
+    parser.add_argument(
+        "--llm", default="openai/gpt-4o-2024-08-06", help="Model, openai/ or azure/ prefixed"
+    )
+    args = parser.parse_args()
+
+    simulation = SimulatedLLM(
+        args.median_latency, args.latency_sigma, args.error_rate, args.capacity
+    )
+    server = start_server(simulation)
+    os.environ["OPENAI_API_BASE"] = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ["OPENAI_API_KEY"] = "sk-simulated"
+    os.environ["AZURE_API_BASE"] = f"http://127.0.0.1:{server.server_port}"
+    os.environ["AZURE_API_KEY"] = "sk-simulated"
+    os.environ["AZURE_API_VERSION"] = "2024-08-01-preview"
+    os.environ["MAX_TOKENS_PER_MINUTE"] = str(args.tokens_per_minute)
+    os.environ["ADAPTIVE_CONCURRENCY"] = "1" if args.adaptive else "0"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    run_kwargs = {"packed": args.packed}
+    paper_path = SAMPLE_OUTPUTS_PATH.parent / "original_paper.txt"
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)
+        papers = [f"simulated-{paper_i}" for paper_i in range(args.papers)]
+        for doi in papers:
+            Path("papers", doi).mkdir(parents=True)
+            shutil.copy(paper_path, Path("papers", doi, "original_paper.txt"))
+
+        for concurrency in map(int, args.concurrency.split(",")):
+            rejected_before = simulation.rejected
+            connections_before = simulation.connections
+            result = run_setting(papers, concurrency, args.llm, args.max_num_samples, run_kwargs)
+            print_setting(
+                concurrency,
+                result,
+                simulation.rejected - rejected_before,
+                simulation.connections - connections_before,
+            )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Benchmark of CLI startup time.
+
+Measures the wall-clock time of commands that should never pay for importing the
+LLM provider stack, e.g. printing the `--help` of the entry points or importing a
+generator. Run from the repository root:
+
+    python benchmarks/startup.py --repeats 5 --max-seconds 1.0
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+COMMANDS = {
+    "generators.main --help": [sys.executable, "-m", "generators.main", "--help"],
+    "evaluators.main --help": [sys.executable, "-m", "evaluators.main", "--help"],
+    "import generators.ken_c137": [sys.executable, "-c", "import generators.ken_c137"],
+    "import litellm (reference)": [sys.executable, "-c", "import litellm"],
+}
+
+
+def time_command(command: list[str], repeats: int) -> list[float]:
+    """Time a command several times.
+
+    Args:
+        command: The command to run.
+        repeats: The number of runs.
+
+    Returns:
+        The wall-clock time of each run in seconds.
+    """
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, capture_output=True)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main() -> None:
+    """Run the startup benchmark."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeats", type=int, default=5, help="Number of runs per command")
+    parser.add_argument(
+        "--max-seconds",
+        type=float,
+        default=1.0,
+        help="Median startup time above which a command is flagged",
+    )
+    args = parser.parse_args()
+
+    failed = False
+    for name, command in COMMANDS.items():
+        median = statistics.median(time_command(command, args.repeats))
+        is_reference = "reference" in name
+        flag = ""
+        if not is_reference and median > args.max_seconds:
+            flag = "  <-- slower than limit"
+            failed = True
+        print(f"{name:<30} median {median:.3f}s{flag}")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,20 @@
 """Report module for generating and updating reports."""
 
 import re
+import sys
 from pathlib import Path
 
+# The report runs without installing the package, the corpus index only needs the stdlib.
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+from corpus import CorpusIndex  # noqa: E402
+
 
 def generate_report() -> tuple[int, int, int]:
     """Generate a report of the number of papers, alternatives, and evaluations."""
-    papers_dir = Path("papers")
-    total_papers = 0
-    total_gen = 0
-    total_eval = 0
-
-    if papers_dir.exists():
-        for doi in papers_dir.iterdir():
-            if doi.is_dir():
-                total_papers += 1
-                total_gen += len(list(doi.glob("gen_*.json")))
-                total_eval += len(list(doi.glob("eval_*.json")))
-
-    return total_papers, total_gen, total_eval
+    with CorpusIndex() as index:
+        index.refresh(Path("papers"))
+        return index.counts()
 
 
 def update_readme(total_papers: int, total_gen: int, total_eval: int) -> None:
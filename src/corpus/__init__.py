@@ -0,0 +1,5 @@
+"""Index of the corpus of generator and evaluator outputs."""
+
+from .index import CorpusIndex, index_output
+
+__all__ = ["CorpusIndex", "index_output"]
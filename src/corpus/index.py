@@ -0,0 +1,282 @@
+"""SQLite index of the generator and evaluator outputs under `papers/`.
+
+Each `gen_*.json` and `eval_*.json` is parsed once and its metadata, costs and
+per-permutation statistics are stored in an embedded database, so corpus
+statistics and queries do not have to load every JSON file. Outputs are
+indexed as generators and evaluators save them, and `refresh` re-indexes only
+files whose modification time changed. Files are keyed by their resolved path,
+so relative and absolute spellings of a path are the same file. Only the
+standard library is used, so `report.py` can read the index without installing
+the package.
+"""
+
+import json
+import os
+import re
+import sqlite3
+from pathlib import Path
+from types import TracebackType
+
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_INDEX_PATH = Path(os.getenv("ALT_CORE_CACHE_DIR", ".cache")) / "corpus_index.sqlite"
+
+# Contributor uids are "<name>_c<number>", e.g. "ken_c137".
+GEN_FILENAME_PATTERN = re.compile(r"gen_(?P<uid>[^_]+_c\d+)_(?P<algo>[^_]+)_.+\.json")
+EVAL_FILENAME_PATTERN = re.compile(r"eval_(?P<uid>[^_]+_c\d+)_(?P<gen_run_id>gen_.+)\.json")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS papers (doi TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY, doi TEXT NOT NULL, kind TEXT NOT NULL, mtime REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS gen_runs (
+    run_id TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    doi TEXT NOT NULL,
+    uid TEXT,
+    algo TEXT,
+    model TEXT,
+    num_graph_permutations INTEGER,
+    num_results_permutations INTEGER,
+    total_cost REAL
+);
+CREATE TABLE IF NOT EXISTS step_costs (
+    run_id TEXT NOT NULL, step TEXT NOT NULL, cost REAL, PRIMARY KEY (run_id, step)
+);
+CREATE TABLE IF NOT EXISTS permutations (
+    run_id TEXT NOT NULL,
+    experiment TEXT NOT NULL,
+    permutation_id TEXT NOT NULL,
+    deviation REAL,
+    has_results INTEGER NOT NULL,
+    PRIMARY KEY (run_id, experiment, permutation_id)
+);
+CREATE INDEX IF NOT EXISTS permutations_deviation ON permutations (deviation);
+CREATE TABLE IF NOT EXISTS evaluations (
+    path TEXT PRIMARY KEY, doi TEXT NOT NULL, uid TEXT, gen_run_id TEXT, summary TEXT
+);
+"""
+
+
+class CorpusIndex:
+    """Index of the outputs of a corpus of papers."""
+
+    def __init__(self, path: Path = DEFAULT_INDEX_PATH) -> None:
+        """Open the index, creating it if needed.
+
+        Args:
+            path: Path of the SQLite database.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Batch evaluation writes from several processes, wait for their locks.
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self) -> "CorpusIndex":
+        """Enter the context.
+
+        Returns:
+            The index.
+        """
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """Close the index when leaving the context.
+
+        Args:
+            exc_type: Type of the exception raised in the context, if any.
+            exc: Exception raised in the context, if any.
+            traceback: Traceback of the exception, if any.
+        """
+        self.close()
+
+    def close(self) -> None:
+        """Close the index."""
+        self.connection.close()
+
+    def index_file(self, path: Path) -> None:
+        """Index a generator or evaluator output, replacing its previous entry.
+
+        Args:
+            path: Path of the output, under `papers/<doi>/`.
+        """
+        path = path.resolve()
+        doi = path.parent.name
+        kind = "gen" if path.name.startswith("gen_") else "eval"
+        with path.open() as f:
+            outputs = json.load(f)
+
+        with self.connection:
+            self._remove(str(path))
+            if kind == "gen":
+                # The run may have been indexed under another spelling of its path.
+                self._remove_gen_run(f"{doi}/{path.stem}")
+            self.connection.execute("INSERT OR IGNORE INTO papers VALUES (?)", (doi,))
+            self.connection.execute(
+                "INSERT INTO files VALUES (?, ?, ?, ?)",
+                (str(path), doi, kind, path.stat().st_mtime),
+            )
+            if kind == "gen":
+                self._index_gen_run(path, doi, outputs)
+            else:
+                self._index_evaluation(path, doi, outputs)
+
+    def _index_gen_run(self, path: Path, doi: str, outputs: dict) -> None:
+        match = GEN_FILENAME_PATTERN.fullmatch(path.name)
+        run_id = f"{doi}/{path.stem}"
+        token_cost = outputs.get("token_cost", {})
+        results_permutations = outputs.get("results_permutations", {})
+        self.connection.execute(
+            "INSERT INTO gen_runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                run_id,
+                str(path),
+                doi,
+                match["uid"] if match else None,
+                match["algo"] if match else None,
+                outputs.get("llm"),
+                outputs.get("num_graph_permutations", {}).get("total"),
+                sum(len(alternatives) for alternatives in results_permutations.values()),
+                token_cost.get("total"),
+            ),
+        )
+        self.connection.executemany(
+            "INSERT INTO step_costs VALUES (?, ?, ?)",
+            [(run_id, step, cost) for step, cost in token_cost.items() if step != "total"],
+        )
+        self.connection.executemany(
+            "INSERT INTO permutations VALUES (?, ?, ?, ?, ?)",
+            [
+                (
+                    run_id,
+                    experiment,
+                    str(permutation_id),
+                    deviation,
+                    str(permutation_id) in results_permutations.get(experiment, {}),
+                )
+                for experiment, deviations in outputs.get("triple_deviation_pct", {}).items()
+                for permutation_id, deviation in deviations.items()
+            ],
+        )
+
+    def _index_evaluation(self, path: Path, doi: str, outputs: dict) -> None:
+        match = EVAL_FILENAME_PATTERN.fullmatch(path.name)
+        self.connection.execute(
+            "INSERT INTO evaluations VALUES (?, ?, ?, ?, ?)",
+            (
+                str(path),
+                doi,
+                match["uid"] if match else None,
+                f"{doi}/{match['gen_run_id']}" if match else None,
+                json.dumps(outputs["summary"]) if "summary" in outputs else None,
+            ),
+        )
+
+    def _remove(self, path: str) -> None:
+        self.connection.execute("DELETE FROM files WHERE path = ?", (path,))
+        self.connection.execute("DELETE FROM evaluations WHERE path = ?", (path,))
+        for row in self.connection.execute(
+            "SELECT run_id FROM gen_runs WHERE path = ?", (path,)
+        ).fetchall():
+            self._remove_gen_run(row["run_id"])
+
+    def _remove_gen_run(self, run_id: str) -> None:
+        for table in ("step_costs", "permutations", "gen_runs"):
+            self.connection.execute(f"DELETE FROM {table} WHERE run_id = ?", (run_id,))
+
+    def refresh(self, papers_dir: Path = Path("papers")) -> dict[str, int]:
+        """Bring the index up to date with the outputs on disk.
+
+        Only outputs which are new or whose modification time changed are parsed,
+        entries of deleted outputs are removed.
+
+        Args:
+            papers_dir: Directory holding one directory per paper.
+
+        Returns:
+            The number of indexed, removed and unchanged outputs.
+        """
+        indexed_mtimes = {
+            row["path"]: row["mtime"] for row in self.connection.execute("SELECT * FROM files")
+        }
+        on_disk = {}
+        dois = []
+        if papers_dir.exists():
+            dois = [paper_dir.name for paper_dir in papers_dir.iterdir() if paper_dir.is_dir()]
+            for output_path in [
+                *papers_dir.glob("*/gen_*.json"),
+                *papers_dir.glob("*/eval_*.json"),
+            ]:
+                on_disk[str(output_path.resolve())] = output_path.stat().st_mtime
+
+        stats = {"indexed": 0, "removed": 0, "unchanged": 0}
+        for path, mtime in on_disk.items():
+            if indexed_mtimes.get(path) == mtime:
+                stats["unchanged"] += 1
+                continue
+            try:
+                self.index_file(Path(path))
+                stats["indexed"] += 1
+            except (OSError, ValueError):
+                logger.exception(f"Could not index {path}")
+
+        with self.connection:
+            for path in indexed_mtimes.keys() - on_disk.keys():
+                self._remove(path)
+                stats["removed"] += 1
+            self.connection.execute("DELETE FROM papers")
+            self.connection.executemany("INSERT INTO papers VALUES (?)", [(doi,) for doi in dois])
+        logger.info(
+            f"Index refreshed: {stats['indexed']} indexed, {stats['removed']} removed, "
+            f"{stats['unchanged']} unchanged"
+        )
+        return stats
+
+    def counts(self) -> tuple[int, int, int]:
+        """Count papers, generator outputs and evaluator outputs.
+
+        Returns:
+            The number of papers, generator outputs and evaluator outputs.
+        """
+        row = self.connection.execute(
+            "SELECT (SELECT COUNT(*) FROM papers), (SELECT COUNT(*) FROM gen_runs), "
+            "(SELECT COUNT(*) FROM evaluations)"
+        ).fetchone()
+        return row[0], row[1], row[2]
+
+    def query(self, sql: str, params: tuple = ()) -> list[sqlite3.Row]:
+        """Run a query on the index.
+
+        Args:
+            sql: The SQL query.
+            params: Parameters of the query.
+
+        Returns:
+            The rows of the result.
+        """
+        return self.connection.execute(sql, params).fetchall()
+
+
+def index_output(path: Path, index_path: Path = DEFAULT_INDEX_PATH) -> None:
+    """Index an output right after it was saved.
+
+    Failing to index never fails the run, the next `refresh` catches up.
+
+    Args:
+        path: Path of the generator or evaluator output.
+        index_path: Path of the SQLite database.
+    """
+    try:
+        with CorpusIndex(index_path) as index:
+            index.index_file(path)
+    except (OSError, ValueError, sqlite3.Error):
+        logger.exception(f"Could not index {path}")
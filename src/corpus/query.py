@@ -0,0 +1,88 @@
+"""Command-line queries on the corpus index.
+
+Run from the repository root, e.g.:
+
+    python -m corpus.query cost-by-model
+    python -m corpus.query deviations --min 0.5
+    python -m corpus.query sql "SELECT doi, COUNT(*) FROM gen_runs GROUP BY doi"
+"""
+
+import argparse
+import sqlite3
+from pathlib import Path
+
+from .index import DEFAULT_INDEX_PATH, CorpusIndex
+
+QUERIES = {
+    "stats": (
+        "SELECT (SELECT COUNT(*) FROM papers) AS papers, "
+        "(SELECT COUNT(*) FROM gen_runs) AS gen_runs, "
+        "(SELECT COUNT(*) FROM evaluations) AS evaluations, "
+        "(SELECT SUM(num_results_permutations) FROM gen_runs) AS alternatives, "
+        "(SELECT SUM(total_cost) FROM gen_runs) AS total_cost"
+    ),
+    "cost-by-model": (
+        "SELECT model, COUNT(*) AS runs, SUM(total_cost) AS total_cost, "
+        "SUM(num_results_permutations) AS alternatives FROM gen_runs "
+        "GROUP BY model ORDER BY total_cost DESC"
+    ),
+    "cost-by-step": (
+        "SELECT step, SUM(cost) AS total_cost FROM step_costs "
+        "GROUP BY step ORDER BY total_cost DESC"
+    ),
+    "runs": "SELECT run_id, uid, algo, model, num_results_permutations, total_cost FROM gen_runs",
+    "evaluations": "SELECT uid, gen_run_id, summary FROM evaluations ORDER BY gen_run_id, uid",
+}
+
+
+def print_rows(rows: list[sqlite3.Row]) -> None:
+    """Print rows as a tab-separated table with a header.
+
+    Args:
+        rows: The rows to print.
+    """
+    if not rows:
+        print("No rows")
+        return
+    print("\t".join(rows[0].keys()))
+    for row in rows:
+        print("\t".join("" if value is None else str(value) for value in row))
+
+
+def main() -> None:
+    """Refresh the corpus index and run a query on it."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--papers-dir", type=Path, default=Path("papers"), help="Papers directory")
+    parser.add_argument("--index", type=Path, default=DEFAULT_INDEX_PATH, help="Index database")
+    parser.add_argument(
+        "--no-refresh", action="store_true", help="Query the index without refreshing it first"
+    )
+    subparsers = parser.add_subparsers(dest="query", required=True)
+    for name in QUERIES:
+        subparsers.add_parser(name, help=f"Show {name.replace('-', ' ')}")
+    deviations_parser = subparsers.add_parser(
+        "deviations", help="List permutations whose triple deviation is at least --min"
+    )
+    deviations_parser.add_argument("--min", type=float, default=0.5, help="Minimal deviation")
+    sql_parser = subparsers.add_parser("sql", help="Run an arbitrary SQL query")
+    sql_parser.add_argument("sql", type=str, help="The SQL query")
+    args = parser.parse_args()
+
+    with CorpusIndex(args.index) as index:
+        if not args.no_refresh:
+            index.refresh(args.papers_dir)
+        if args.query == "deviations":
+            rows = index.query(
+                "SELECT run_id, experiment, permutation_id, deviation, has_results "
+                "FROM permutations WHERE deviation >= ? ORDER BY deviation DESC",
+                (args.min,),
+            )
+        elif args.query == "sql":
+            rows = index.query(args.sql)
+        else:
+            rows = index.query(QUERIES[args.query])
+    print_rows(rows)
+
+
+if __name__ == "__main__":
+    main()
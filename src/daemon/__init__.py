@@ -0,0 +1,5 @@
+"""Daemon keeping the LLM stack warm and running generation and evaluation jobs."""
+
+from .server import serve
+
+__all__ = ["serve"]
@@ -0,0 +1,105 @@
+"""Thin client submitting jobs to the daemon and streaming their progress.
+
+Run from the repository root, e.g.
+
+    python -m daemon.client generate --doi <doi> --gen-uid <uid> --algo-name <algo> --llm <llm>
+    python -m daemon.client evaluate --doi <doi> --eval-uid <uid> --gen-outputs-path <path>
+    python -m daemon.client status
+"""
+
+import argparse
+import socket
+import sys
+from collections.abc import Iterator
+from pathlib import Path
+
+from .protocol import DEFAULT_SOCKET_PATH, FINAL_EVENTS, decode, encode
+
+
+def submit(job: dict, socket_path: str = DEFAULT_SOCKET_PATH) -> Iterator[dict]:
+    """Submit a job to the daemon.
+
+    Args:
+        job: The job.
+        socket_path: Path of the daemon's Unix socket.
+
+    Yields:
+        The events of the job, ending with a "done" or "error" event.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(encode(job))
+        with sock.makefile("rb") as stream:
+            for line in stream:
+                event = decode(line)
+                yield event
+                if event["event"] in FINAL_EVENTS:
+                    return
+
+
+def main() -> None:
+    """Main function for submitting jobs to the daemon."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--socket", type=str, default=DEFAULT_SOCKET_PATH, help="Unix socket path")
+    subparsers = parser.add_subparsers(dest="kind", required=True)
+
+    generate_parser = subparsers.add_parser("generate", help="Run a generator on a paper")
+    generate_parser.add_argument("--doi", type=str, required=True, help="DOI of the paper")
+    generate_parser.add_argument("--gen-uid", type=str, required=True, help="UID of the generator")
+    generate_parser.add_argument("--algo-name", type=str, required=True, help="Algorithm name")
+    generate_parser.add_argument(
+        "--llm", type=str, default="azure/gpt-4o-2024-08-06", help="LLM to use for processing"
+    )
+    generate_parser.add_argument(
+        "--max-num-samples", type=int, default=10, help="Max number of permutations to convert"
+    )
+    generate_parser.add_argument("--packed", action="store_true", help="Pack permutations")
+    generate_parser.add_argument("--compact", action="store_true", help="Store id remaps")
+    generate_parser.add_argument(
+        "--compact-prompts", action="store_true", help="Write graphs in prompts as triples"
+    )
+    generate_parser.add_argument(
+        "--similarity-threshold", type=float, default=None, help="Drop near-duplicate permutations"
+    )
+    generate_parser.add_argument("--incremental", action="store_true", help="Reuse outputs")
+    generate_parser.add_argument(
+        "--stream-output", action="store_true", help="Log stages and permutations as produced"
+    )
+    generate_parser.add_argument("--max-cost", type=float, default=None, help="Max cost")
+    generate_parser.add_argument("--max-tokens", type=int, default=None, help="Max tokens")
+    generate_parser.add_argument("--max-seconds", type=float, default=None, help="Max seconds")
+    generate_parser.add_argument(
+        "--additional-config", type=str, default="", help="Optional additional config"
+    )
+
+    evaluate_parser = subparsers.add_parser("evaluate", help="Run an evaluator on outputs")
+    evaluate_parser.add_argument("--doi", type=str, required=True, help="DOI of the paper")
+    evaluate_parser.add_argument("--eval-uid", type=str, required=True, help="UID of the evaluator")
+    evaluate_parser.add_argument(
+        "--gen-outputs-path", type=str, required=True, help="Path to the generator outputs"
+    )
+
+    subparsers.add_parser("status", help="Show the status of the daemon")
+    args = parser.parse_args()
+
+    job = {key: value for key, value in vars(args).items() if key != "socket"}
+    if args.kind == "evaluate":
+        # The daemon may run from another directory.
+        job["gen_outputs_path"] = str(Path(args.gen_outputs_path).resolve())
+
+    try:
+        for event in submit(job, args.socket):
+            if event["event"] == "log":
+                print(event["message"])
+            elif event["event"] == "error":
+                print(f"Job failed: {event['message']}", file=sys.stderr)
+                sys.exit(1)
+            else:
+                print({key: value for key, value in event.items() if key != "event"})
+    except (ConnectionRefusedError, FileNotFoundError):
+        print(f"No daemon listening on {args.socket}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Protocol between the daemon and its clients.
+
+Clients send a single job as one line of JSON, e.g.
+`{"kind": "generate", "doi": ..., "gen_uid": ..., "algo_name": ..., "llm": ...}`,
+and the daemon streams back events as lines of JSON until a "done" or "error" event.
+"""
+
+import json
+import os
+import tempfile
+from pathlib import Path
+
+DEFAULT_SOCKET_PATH = os.getenv(
+    "ALT_CORE_DAEMON_SOCKET", str(Path(tempfile.gettempdir()) / "alt-core-daemon.sock")
+)
+
+# Events ending the stream of a job.
+FINAL_EVENTS = ("done", "error")
+
+
+def encode(message: dict) -> bytes:
+    """Encode a message as a line of JSON.
+
+    Args:
+        message: The message.
+
+    Returns:
+        The encoded message.
+    """
+    return (json.dumps(message) + "\n").encode()
+
+
+def decode(line: bytes | str) -> dict:
+    """Decode a line of JSON into a message.
+
+    Args:
+        line: The encoded message.
+
+    Returns:
+        The message.
+    """
+    return json.loads(line)
@@ -0,0 +1,244 @@
+"""Daemon serving generation and evaluation jobs over a Unix socket.
+
+A single long-lived process keeps litellm imported, its HTTP clients alive and
+owns the rate limiter shared by every job, so concurrent jobs never exceed
+`MAX_TOKENS_PER_MINUTE` together. Start it from the repository root:
+
+    python -m daemon.server --workers 4
+"""
+
+import argparse
+import asyncio
+import logging
+import threading
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from evaluators.main import evaluate
+from generators.main import generate
+from llm.budget import RunBudget
+from llm.caller import get_rate_limiter
+from llm.config import get_config
+from logger import add_handler, get_logger, remove_handler
+
+from .protocol import DEFAULT_SOCKET_PATH, FINAL_EVENTS, decode, encode
+
+logger = get_logger(__name__)
+
+
+class JobLogHandler(logging.Handler):
+    """Forward the log records of a job's thread as progress events."""
+
+    def __init__(self, thread_id: int, publish: Callable[[dict], None]) -> None:
+        """Initialize the handler.
+
+        Args:
+            thread_id: Identifier of the thread running the job.
+            publish: Function publishing an event to the job's client.
+        """
+        super().__init__()
+        self.thread_id = thread_id
+        self.publish = publish
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Publish a log record of the job's thread.
+
+        Args:
+            record: The log record.
+        """
+        if record.thread == self.thread_id:
+            self.publish(
+                {"event": "log", "level": record.levelname, "message": self.format(record)}
+            )
+
+
+def run_job(job: dict) -> Path | None:
+    """Run a generation or evaluation job.
+
+    Args:
+        job: The job, with a "kind" of "generate" or "evaluate" and its arguments.
+
+    Returns:
+        The path of the saved outputs, or None if the job failed.
+    """
+    if job["kind"] == "generate":
+        run_kwargs: dict = {"packed": True} if job.get("packed") else {}
+        if job.get("compact"):
+            run_kwargs["compact"] = True
+        if job.get("compact_prompts"):
+            run_kwargs["compact_prompts"] = True
+        if job.get("similarity_threshold") is not None:
+            run_kwargs["similarity_threshold"] = job["similarity_threshold"]
+        limits = [job.get("max_cost"), job.get("max_tokens"), job.get("max_seconds")]
+        if any(limit is not None for limit in limits):
+            run_kwargs["budget"] = RunBudget(*limits)
+        return generate(
+            job["doi"],
+            job["gen_uid"],
+            job["algo_name"],
+            job["llm"],
+            job.get("max_num_samples", 10),
+            job.get("additional_config", ""),
+            job.get("incremental", False),
+            run_kwargs,
+            job.get("stream_output", False),
+        )
+    if job["kind"] == "evaluate":
+        return evaluate(job["doi"], job["eval_uid"], Path(job["gen_outputs_path"]))
+    raise ValueError(f"Unknown job kind {job['kind']}")
+
+
+def run_job_with_progress(job: dict, publish: Callable[[dict], None]) -> None:
+    """Run a job, publishing its logs and its final event.
+
+    Args:
+        job: The job.
+        publish: Function publishing an event to the job's client.
+    """
+    handler = JobLogHandler(threading.get_ident(), publish)
+    handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(name)s - %(message)s"))
+    add_handler(handler)
+    try:
+        output_path = run_job(job)
+    except Exception as e:
+        logger.exception("Error running job")
+        publish({"event": "error", "message": str(e)})
+        return
+    finally:
+        remove_handler(handler)
+
+    if output_path is None:
+        publish({"event": "error", "message": "Job failed, see the daemon logs"})
+    else:
+        publish({"event": "done", "output_path": str(output_path)})
+
+
+class Daemon:
+    """Daemon accepting jobs from clients and running them in a thread pool."""
+
+    def __init__(self, workers: int = 4) -> None:
+        """Initialize the daemon.
+
+        Args:
+            workers: Maximal number of jobs running concurrently.
+        """
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.workers = workers
+        self.running_jobs = 0
+
+    def warm_up(self) -> None:
+        """Import the LLM stack and create the shared rate limiter ahead of the first job."""
+        import litellm  # noqa: F401
+
+        get_config()
+        get_rate_limiter()
+        logger.info("LLM stack loaded")
+
+    def status(self) -> dict:
+        """Get the status of the daemon.
+
+        Returns:
+            The number of running jobs and the state of the shared rate limiter.
+        """
+        rate_limiter = get_rate_limiter()
+        return {
+            "event": "done",
+            "workers": self.workers,
+            "running_jobs": self.running_jobs,
+            "tokens_per_minute": rate_limiter.tokens_per_minute,
+            "tokens_available": rate_limiter.tokens_available,
+        }
+
+    def _job_done(self, future: "asyncio.Future[None]") -> None:
+        """Count a job as finished once it has run, whether or not its client is connected.
+
+        Args:
+            future: The future of the job.
+        """
+        self.running_jobs -= 1
+
+    async def handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Run the job sent by a client, streaming its progress back.
+
+        Args:
+            reader: Stream reading from the client.
+            writer: Stream writing to the client.
+        """
+        try:
+            job = decode(await reader.readline())
+            if job.get("kind") == "status":
+                writer.write(encode(self.status()))
+                return
+
+            logger.info(f"Accepted job {job}")
+            loop = asyncio.get_running_loop()
+            events: asyncio.Queue[dict] = asyncio.Queue()
+            client_gone = threading.Event()
+
+            def publish(event: dict) -> None:
+                # A job keeps running after its client disconnects, without an audience.
+                if not client_gone.is_set():
+                    loop.call_soon_threadsafe(events.put_nowait, event)
+
+            self.running_jobs += 1
+            future = loop.run_in_executor(self.executor, run_job_with_progress, job, publish)
+            future.add_done_callback(self._job_done)
+            try:
+                while True:
+                    event = await events.get()
+                    writer.write(encode(event))
+                    await writer.drain()
+                    if event["event"] in FINAL_EVENTS:
+                        break
+            finally:
+                client_gone.set()
+        except (ConnectionError, ValueError) as e:
+            logger.warning(f"Client disconnected or sent an invalid job: {e}")
+        finally:
+            writer.close()
+
+    async def serve_forever(self, socket_path: str) -> None:
+        """Accept clients on a Unix socket until cancelled.
+
+        Args:
+            socket_path: Path of the Unix socket.
+        """
+        Path(socket_path).unlink(missing_ok=True)
+        server = await asyncio.start_unix_server(self.handle_client, path=socket_path)
+        logger.info(f"Daemon listening on {socket_path}")
+        async with server:
+            await server.serve_forever()
+
+
+def serve(socket_path: str = DEFAULT_SOCKET_PATH, workers: int = 4) -> None:
+    """Start the daemon.
+
+    Args:
+        socket_path: Path of the Unix socket.
+        workers: Maximal number of jobs running concurrently.
+    """
+    daemon = Daemon(workers)
+    daemon.warm_up()
+    try:
+        asyncio.run(daemon.serve_forever(socket_path))
+    except KeyboardInterrupt:
+        logger.info("Daemon stopped")
+    finally:
+        Path(socket_path).unlink(missing_ok=True)
+
+
+def main() -> None:
+    """Main function for running the daemon."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--socket", type=str, default=DEFAULT_SOCKET_PATH, help="Unix socket path")
+    parser.add_argument("--workers", type=int, default=4, help="Max number of concurrent jobs")
+    args = parser.parse_args()
+
+    serve(args.socket, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+"""LLM-as-judge plausibility evaluator."""
+
+from .runner import run, stream
+
+__all__ = ["run", "stream"]
@@ -0,0 +1,73 @@
+"""Persistent cache of judgments keyed by methods, alternative text and judge model."""
+
+import hashlib
+import json
+import os
+import sqlite3
+from pathlib import Path
+
+DEFAULT_CACHE_PATH = Path(os.getenv("ALT_CORE_CACHE_DIR", ".cache")) / "judge_c001.sqlite"
+
+
+def judgment_key(methods: str, alternative: str, judge_llm: str) -> str:
+    """Get the cache key of a judgment.
+
+    Args:
+        methods: Summary of the methods of the study.
+        alternative: The alternative result.
+        judge_llm: The judge model.
+
+    Returns:
+        The key.
+    """
+    return hashlib.sha256(json.dumps([methods, alternative, judge_llm]).encode()).hexdigest()
+
+
+class JudgmentCache:
+    """SQLite-backed cache of judgments."""
+
+    def __init__(self, path: Path = DEFAULT_CACHE_PATH) -> None:
+        """Open the cache, creating it if needed.
+
+        Args:
+            path: Path of the SQLite database.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS judgments (key TEXT PRIMARY KEY, judgment TEXT NOT NULL)"
+        )
+
+    def get_many(self, keys: list[str]) -> dict[str, dict]:
+        """Get the cached judgments of several keys.
+
+        Args:
+            keys: The keys.
+
+        Returns:
+            The cached judgments keyed by key, missing keys are left out.
+        """
+        found = {}
+        for key in keys:
+            row = self.connection.execute(
+                "SELECT judgment FROM judgments WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                found[key] = json.loads(row[0])
+        return found
+
+    def put_many(self, judgments: dict[str, dict]) -> None:
+        """Store several judgments.
+
+        Args:
+            judgments: The judgments keyed by key.
+        """
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO judgments (key, judgment) VALUES (?, ?)",
+                [(key, json.dumps(judgment)) for key, judgment in judgments.items()],
+            )
+
+    def close(self) -> None:
+        """Close the cache."""
+        self.connection.close()
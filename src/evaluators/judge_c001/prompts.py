@@ -0,0 +1,58 @@
+"""Prompts and response models of the LLM-as-judge evaluator."""
+
+from pydantic import BaseModel, Field
+
+SYS_PROMPT = """
+You are a critical and rigorous scientist with deep domain knowledge.
+You judge whether reported results could plausibly have been obtained with the described methods.
+"""
+
+
+class Judgment(BaseModel):
+    """Plausibility judgment of a single alternative result."""
+
+    alternative_id: str = Field(description="Identifier of the alternative result")
+    plausibility: int = Field(
+        description="Plausibility of the result given the methods, from 1 (implausible) to 5",
+        ge=1,
+        le=5,
+    )
+    rationale: str = Field(description="One or two sentences justifying the plausibility")
+
+
+class Judgments(BaseModel):
+    """Output for the judge_alternatives prompt."""
+
+    judgments: list[Judgment] = Field(description="List of judgments, one per alternative result")
+
+
+def judge_alternatives(methods: str, alternatives: dict[str, str]) -> str:
+    """Ask for the plausibility of several alternative results.
+
+    Args:
+        methods: Summary of the methods of the study.
+        alternatives: Alternative results keyed by alternative id.
+
+    Returns:
+        A string of the prompt.
+    """
+    alternatives_as_text = "\n".join(
+        f"Result {alternative_id}: {text}" for alternative_id, text in alternatives.items()
+    )
+    prompt = f"""
+        Here are the methods of a study: {methods}
+
+        Below are possible results of this study. Judge each result independently: how plausible is it that following these methods produced this result?
+        Rate the plausibility from 1 (implausible) to 5 (highly plausible) and justify your rating briefly.
+
+        {alternatives_as_text}
+
+        You should return your answer as a json such as:
+        {{
+            "judgments": [
+                {{"alternative_id": "id of result", "plausibility": rating, "rationale": your justification}},
+                ...
+            ]
+        }}
+    """  # noqa: E501
+    return prompt
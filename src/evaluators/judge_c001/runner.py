@@ -0,0 +1,337 @@
+"""Runner for the LLM-as-judge evaluator.
+
+Rates the plausibility of every alternative in `results_permutations` given
+the methods of the paper. All judgment requests of a paper are sent
+concurrently under the shared rate limiter, several alternatives are packed in
+a single request when they fit the token budget, and judgments are cached so
+that re-evaluating after a generator rerun only pays for new alternatives.
+Alternatives whose request failed are left out of the outputs and counted in
+the summary, so the next evaluation judges only them.
+
+`stream` judges alternatives as the generator publishes them, so judging
+overlaps with generation (see `evaluators.streaming`).
+"""
+
+import asyncio
+import os
+from collections.abc import Iterable
+
+from pydantic import ValidationError
+
+from llm.caller import ask_llm_async_with_schema, count_tokens
+from llm.clients import run_async
+from llm.packing import pack_by_token_budget
+from logger import get_logger
+
+from .cache import JudgmentCache, judgment_key
+from .prompts import SYS_PROMPT, Judgments, judge_alternatives
+
+logger = get_logger(__name__)
+
+# Token budget of the alternatives packed in a single judgment request.
+PACK_TOKEN_BUDGET = 6000
+# Maximal number of alternatives judged in a single request.
+MAX_PACK_SIZE = 8
+# Maximal number of streamed alternatives judged in a single request; small packs
+# keep judging close behind generation.
+STREAM_PACK_SIZE = 2
+
+
+def collect_alternatives(gen_outputs_content: dict) -> dict[str, str]:
+    """Collect the alternative results of all experiments.
+
+    Args:
+        gen_outputs_content: The content of the generated outputs.
+
+    Returns:
+        The alternative results keyed by "<experiment>/<permutation id>".
+    """
+    return {
+        f"{experiment_i}/{permutation_id}": text
+        for experiment_i, alternatives in gen_outputs_content.get(
+            "results_permutations", {}
+        ).items()
+        for permutation_id, text in alternatives.items()
+    }
+
+
+async def judge_pack(
+    judge_llm: str, methods: str, alternatives: dict[str, str]
+) -> tuple[dict, float]:
+    """Judge a pack of alternatives in a single request.
+
+    Alternatives missing from the response, or packs whose response does not
+    validate, are judged again one by one.
+
+    Args:
+        judge_llm: The judge model.
+        methods: Summary of the methods of the study.
+        alternatives: The alternative results keyed by alternative id.
+
+    Returns:
+        The judgments keyed by alternative id and the cost of the requests.
+    """
+    user_prompt = judge_alternatives(methods, alternatives)
+    try:
+        response, cost = await ask_llm_async_with_schema(
+            judge_llm, SYS_PROMPT, user_prompt, Judgments, temperature=0
+        )
+    except ValidationError:
+        if len(alternatives) == 1:
+            raise
+        logger.warning(f"Invalid packed judgments, judging {len(alternatives)} alternatives singly")
+        response, cost = Judgments(judgments=[]), 0.0
+
+    if not isinstance(response, Judgments):
+        raise TypeError(f"Expected Judgments, got {type(response).__name__}")
+    judgments = {
+        judgment.alternative_id: {
+            "plausibility": judgment.plausibility,
+            "rationale": judgment.rationale,
+        }
+        for judgment in response.judgments
+        if judgment.alternative_id in alternatives
+    }
+
+    missing = [alternative_id for alternative_id in alternatives if alternative_id not in judgments]
+    if missing and len(alternatives) > 1:
+        single_judgments, single_cost = await judge_packs(
+            judge_llm,
+            methods,
+            [{alternative_id: alternatives[alternative_id]} for alternative_id in missing],
+        )
+        judgments.update(single_judgments)
+        cost += single_cost
+    return judgments, cost
+
+
+def merge_results(
+    packs: list[dict[str, str]], results: list[tuple[dict, float] | BaseException]
+) -> tuple[dict, float]:
+    """Merge the judgments of packs, leaving out the packs which failed.
+
+    Args:
+        packs: The packs of alternatives.
+        results: The judgments and cost of each pack, or the error it raised.
+
+    Returns:
+        The judgments keyed by alternative id and the total cost of the requests.
+    """
+    judgments: dict = {}
+    total_cost = 0.0
+    for pack, result in zip(packs, results, strict=True):
+        if isinstance(result, BaseException):
+            if not isinstance(result, Exception):
+                raise result
+            logger.error(f"Could not judge {', '.join(pack)}: {result!r}")
+            continue
+        pack_judgments, cost = result
+        judgments.update(pack_judgments)
+        total_cost += cost
+    return judgments, total_cost
+
+
+async def judge_packs(
+    judge_llm: str, methods: str, packs: list[dict[str, str]]
+) -> tuple[dict, float]:
+    """Judge packs concurrently, keeping the judgments of the packs which succeed.
+
+    A pack which fails is logged and its alternatives are left unjudged, so that
+    one failure does not lose the judgments of the other packs.
+
+    Args:
+        judge_llm: The judge model.
+        methods: Summary of the methods of the study.
+        packs: The packs of alternatives keyed by alternative id.
+
+    Returns:
+        The judgments keyed by alternative id and the total cost of the requests.
+    """
+    results = await asyncio.gather(
+        *(judge_pack(judge_llm, methods, pack) for pack in packs), return_exceptions=True
+    )
+    return merge_results(packs, results)
+
+
+async def judge_all(
+    judge_llm: str, methods: str, alternatives: dict[str, str]
+) -> tuple[dict, float]:
+    """Judge alternatives concurrently, packing them by token budget.
+
+    Args:
+        judge_llm: The judge model.
+        methods: Summary of the methods of the study.
+        alternatives: The alternative results keyed by alternative id.
+
+    Returns:
+        The judgments keyed by alternative id and the total cost of the requests,
+        without the alternatives whose pack failed.
+    """
+    item_tokens = {
+        alternative_id: count_tokens(judge_llm, text)
+        for alternative_id, text in alternatives.items()
+    }
+    packs = pack_by_token_budget(
+        item_tokens,
+        PACK_TOKEN_BUDGET,
+        overhead_tokens=count_tokens(judge_llm, SYS_PROMPT + methods),
+        max_pack_size=MAX_PACK_SIZE,
+    )
+    logger.info(f"Judging {len(alternatives)} alternatives in {len(packs)} requests")
+    return await judge_packs(
+        judge_llm,
+        methods,
+        [
+            {alternative_id: alternatives[alternative_id] for alternative_id in pack}
+            for pack in packs
+        ],
+    )
+
+
+def run(paper_content: str, gen_outputs_content: dict) -> dict:
+    """Run the evaluator.
+
+    The judge model is read from the `JUDGE_LLM` environment variable and
+    defaults to the model of the generator.
+
+    Args:
+        paper_content: The content of the paper.
+        gen_outputs_content: The content of the generated outputs.
+
+    Returns:
+        A dictionary with the judgments of each experiment and a summary.
+    """
+    judge_llm = os.getenv("JUDGE_LLM", gen_outputs_content["llm"])
+    methods = gen_outputs_content["methods"]
+    alternatives = collect_alternatives(gen_outputs_content)
+    keys = {
+        alternative_id: judgment_key(methods, text, judge_llm)
+        for alternative_id, text in alternatives.items()
+    }
+
+    cache = JudgmentCache()
+    try:
+        cached = cache.get_many(list(keys.values()))
+        pending = {
+            alternative_id: text
+            for alternative_id, text in alternatives.items()
+            if keys[alternative_id] not in cached
+        }
+        logger.info(f"{len(alternatives) - len(pending)} cached judgments, {len(pending)} to judge")
+
+        new_judgments: dict = {}
+        cost = 0.0
+        if pending:
+            new_judgments, cost = run_async(judge_all(judge_llm, methods, pending))
+            cache.put_many(
+                {
+                    keys[alternative_id]: judgment
+                    for alternative_id, judgment in new_judgments.items()
+                }
+            )
+    finally:
+        cache.close()
+
+    return build_outputs(judge_llm, keys, cached, new_judgments, cost)
+
+
+def build_outputs(
+    judge_llm: str, keys: dict[str, str], cached: dict, new_judgments: dict, cost: float
+) -> dict:
+    """Gather cached and new judgments by experiment.
+
+    Args:
+        judge_llm: The judge model.
+        keys: Cache keys keyed by alternative id.
+        cached: Cached judgments keyed by cache key.
+        new_judgments: New judgments keyed by alternative id.
+        cost: Cost of the new judgments.
+
+    Returns:
+        A dictionary with the judgments of each experiment and a summary.
+    """
+    outputs: dict = {"judge_llm": judge_llm, "experiments": {}}
+    for alternative_id, key in keys.items():
+        experiment_i, permutation_id = alternative_id.split("/", 1)
+        if key in cached:
+            judgment = {**cached[key], "cached": True}
+        elif alternative_id in new_judgments:
+            judgment = {**new_judgments[alternative_id], "cached": False}
+        else:
+            continue
+        outputs["experiments"].setdefault(experiment_i, {})[permutation_id] = judgment
+
+    num_cached = sum(key in cached for key in keys.values())
+    outputs["summary"] = {
+        "num_alternatives": len(keys),
+        "num_judged": len(new_judgments),
+        "num_cached": num_cached,
+        "num_failed": len(keys) - num_cached - len(new_judgments),
+        "token_cost": cost,
+    }
+    return outputs
+
+
+def stream(paper_content: str, events: Iterable[dict]) -> dict:
+    """Judge alternatives as the generator publishes them.
+
+    Args:
+        paper_content: The content of the paper.
+        events: The generator events, see `evaluators.streaming`.
+
+    Returns:
+        The same outputs as `run` on the final generator outputs.
+    """
+    return run_async(judge_stream(events))
+
+
+async def judge_stream(events: Iterable[dict]) -> dict:
+    """Judge streamed alternatives, sending a request whenever a pack is full.
+
+    Args:
+        events: The generator events.
+
+    Returns:
+        A dictionary with the judgments of each experiment and a summary.
+    """
+    iterator = iter(events)
+    judge_llm = methods = ""
+    keys: dict[str, str] = {}
+    cached: dict = {}
+    pack: dict[str, str] = {}
+    packs: list[dict[str, str]] = []
+    tasks: list[asyncio.Task] = []
+
+    cache = JudgmentCache()
+    try:
+        # Wait for events in a thread so that requests already sent keep progressing.
+        while (event := await asyncio.to_thread(next, iterator, None)) is not None:
+            if event["event"] == "context":
+                judge_llm = os.getenv("JUDGE_LLM", event["llm"])
+                methods = event["methods"]
+            if event["event"] != "permutation":
+                continue
+            alternative_id = f"{event['experiment']}/{event['permutation_id']}"
+            keys[alternative_id] = judgment_key(methods, event["results"], judge_llm)
+            cached.update(cache.get_many([keys[alternative_id]]))
+            if keys[alternative_id] not in cached:
+                pack[alternative_id] = event["results"]
+            if len(pack) >= STREAM_PACK_SIZE:
+                packs.append(pack)
+                tasks.append(asyncio.create_task(judge_pack(judge_llm, methods, pack)))
+                pack = {}
+        if pack:
+            packs.append(pack)
+            tasks.append(asyncio.create_task(judge_pack(judge_llm, methods, pack)))
+
+        new_judgments, cost = merge_results(
+            packs, await asyncio.gather(*tasks, return_exceptions=True)
+        )
+        cache.put_many(
+            {keys[alternative_id]: judgment for alternative_id, judgment in new_judgments.items()}
+        )
+    finally:
+        cache.close()
+
+    logger.info(f"Judged {len(new_judgments)} streamed alternatives, {len(cached)} were cached")
+    return build_outputs(judge_llm, keys, cached, new_judgments, cost)
@@ -0,0 +1,5 @@
+"""Structural knowledge graph evaluator against hand-labelled graphs."""
+
+from .runner import run
+
+__all__ = ["run"]
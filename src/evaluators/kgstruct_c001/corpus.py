@@ -0,0 +1,134 @@
+"""Corpus-level structural evaluation of all generated graphs against labels.
+
+Every generated graph and every labelled graph of every paper is scored in a
+single vectorized pass, pairs from different papers being masked out. Run from
+the repository root:
+
+    python -m evaluators.kgstruct_c001.corpus --output kgstruct_corpus.json
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+
+from logger import get_logger
+
+from .metrics import score_graphs, scores_at
+from .runner import generated_graphs, group_labels
+
+logger = get_logger(__name__)
+
+
+def load_corpus(papers_dir: Path) -> tuple[list[dict], list[dict]]:
+    """Load the generated and labelled graphs of every paper.
+
+    Args:
+        papers_dir: Directory holding one directory per paper.
+
+    Returns:
+        The generated graphs and the labelled graphs, each as a list of records
+        with the paper, the source file, the graph id and the graph.
+    """
+    generated = []
+    labelled = []
+    for paper_dir in sorted(path for path in papers_dir.iterdir() if path.is_dir()):
+        labels = {}
+        for label_path in sorted(paper_dir.glob("label_*.json")):
+            with label_path.open() as f:
+                labels[label_path.name] = json.load(f)
+        if not labels:
+            continue
+
+        for uid, graphs in group_labels(labels).items():
+            for graph_id, graph in graphs.items():
+                labelled.append(
+                    {"paper": paper_dir.name, "source": uid, "id": graph_id, "graph": graph}
+                )
+
+        for gen_path in sorted(paper_dir.glob("gen_*.json")):
+            with gen_path.open() as f:
+                gen_outputs_content = json.load(f)
+            if "knowledge_graph" not in gen_outputs_content:
+                continue
+            for graph_id, graph in generated_graphs(gen_outputs_content).items():
+                generated.append(
+                    {
+                        "paper": paper_dir.name,
+                        "source": gen_path.name,
+                        "llm": gen_outputs_content.get("llm"),
+                        "id": graph_id,
+                        "graph": graph,
+                    }
+                )
+    return generated, labelled
+
+
+def evaluate_corpus(papers_dir: Path = Path("papers")) -> dict:
+    """Score all generated graphs of the corpus against the labelled graphs.
+
+    Args:
+        papers_dir: Directory holding one directory per paper.
+
+    Returns:
+        Per generator output scores and a corpus-level summary.
+    """
+    generated, labelled = load_corpus(papers_dir)
+    if not generated or not labelled:
+        logger.warning("No generated outputs with labelled graphs found")
+        return {"outputs": {}, "summary": {}}
+
+    scores = score_graphs([g["graph"] for g in generated], [g["graph"] for g in labelled])
+    generated_papers = np.array([g["paper"] for g in generated])
+    labelled_papers = np.array([g["paper"] for g in labelled])
+    same_paper = generated_papers[:, None] == labelled_papers[None, :]
+    triple_f1 = np.where(same_paper, scores["triples"]["f1"], -1.0)
+
+    generated_is_original = np.array([g["id"] == "original" for g in generated])
+    outputs: dict = {}
+    for j, label in enumerate(labelled):
+        rows = np.flatnonzero(
+            same_paper[:, j] & (generated_is_original == (label["id"] == "original"))
+        ).tolist()
+        for source in sorted({generated[i]["source"] for i in rows}):
+            source_rows = [i for i in rows if generated[i]["source"] == source]
+            best = source_rows[int(np.argmax(triple_f1[source_rows, j]))]
+            key = f"{label['paper']}/{source}"
+            outputs.setdefault(key, {"llm": generated[best]["llm"], "labels": {}})
+            outputs[key]["labels"][f"{label['source']}/{label['id']}"] = {
+                "best_match": generated[best]["id"],
+                **scores_at(scores, best, j),
+            }
+
+    summary: dict = {"num_generator_outputs": len(outputs), "by_llm": {}}
+    for output in outputs.values():
+        by_llm = summary["by_llm"].setdefault(output["llm"], {"original": [], "permutations": []})
+        for label_id, label_scores in output["labels"].items():
+            group = "original" if label_id.endswith("/original") else "permutations"
+            by_llm[group].append(label_scores["triples"]["f1"])
+    for llm, groups in summary["by_llm"].items():
+        summary["by_llm"][llm] = {
+            f"mean_{group}_triple_f1": float(np.mean(f1s)) if f1s else None
+            for group, f1s in groups.items()
+        }
+    return {"outputs": outputs, "summary": summary}
+
+
+def main() -> None:
+    """Main function for the corpus-level structural evaluation."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--papers-dir", type=str, default="papers", help="Papers directory")
+    parser.add_argument("--output", type=str, default=None, help="Optional output JSON path")
+    args = parser.parse_args()
+
+    results = evaluate_corpus(Path(args.papers_dir))
+    logger.info(f"Corpus summary: {results['summary']}")
+    if args.output:
+        with Path(args.output).open("w") as f:
+            json.dump(results, f, indent=4)
+            logger.info(f"Successfully saved file {args.output}")
+
+
+if __name__ == "__main__":
+    main()
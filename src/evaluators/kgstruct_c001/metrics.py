@@ -0,0 +1,130 @@
+"""Vectorized node, edge and triple precision, recall and F1 between graphs.
+
+Generated graphs reference nodes by id and name edges with "relation", while
+hand-labelled graphs reference nodes by label and name edges with "label". Both
+are reduced to sets of normalized nodes, (source, target) edges and
+(source, relation, target) triples, encoded as integer ids, and compared with
+matrix products over their incidence matrices.
+"""
+
+import re
+
+import numpy as np
+
+KINDS = ("nodes", "edges", "triples")
+METRICS = ("precision", "recall", "f1")
+
+
+def normalize_label(label: object) -> str:
+    """Normalize a node or relation label for matching.
+
+    Lowercases, treats hyphens and underscores as spaces, drops punctuation and
+    strips the plural "s" of words longer than three letters.
+
+    Args:
+        label: The label.
+
+    Returns:
+        The normalized label.
+    """
+    words = re.sub(r"[^a-z0-9 ]", "", re.sub(r"[-_]", " ", str(label).lower())).split()
+    return " ".join(word[:-1] if len(word) > 3 and word.endswith("s") else word for word in words)
+
+
+def graph_items(graph: dict) -> dict[str, set]:
+    """Get the normalized nodes, edges and triples of a generated or labelled graph.
+
+    Args:
+        graph: The graph, with "nodes" and "edges".
+
+    Returns:
+        The sets of nodes, edges and triples.
+    """
+    id_to_label = {node.get("id", node["label"]): node["label"] for node in graph["nodes"]}
+    nodes = {normalize_label(label) for label in id_to_label.values()}
+    edges = set()
+    triples = set()
+    for edge in graph["edges"]:
+        source = normalize_label(id_to_label.get(edge["source"], edge["source"]))
+        target = normalize_label(id_to_label.get(edge["target"], edge["target"]))
+        relation = normalize_label(edge.get("relation", edge.get("label", "")))
+        edges.add((source, target))
+        triples.add((source, relation, target))
+    return {"nodes": nodes, "edges": edges, "triples": triples}
+
+
+def encode(items: list[set]) -> np.ndarray:
+    """Encode sets of items as a boolean incidence matrix over integer item ids.
+
+    Args:
+        items: One set of hashable items per graph.
+
+    Returns:
+        Matrix of shape (number of graphs, number of distinct items).
+    """
+    vocabulary: dict = {}
+    rows = []
+    columns = []
+    for row, graph_set in enumerate(items):
+        for item in graph_set:
+            rows.append(row)
+            columns.append(vocabulary.setdefault(item, len(vocabulary)))
+
+    incidence = np.zeros((len(items), len(vocabulary)), dtype=bool)
+    incidence[np.array(rows, dtype=int), np.array(columns, dtype=int)] = True
+    return incidence
+
+
+def _safe_divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """Divide element-wise, returning 0 where the denominator is 0."""
+    numerator, denominator = np.broadcast_arrays(numerator, denominator)
+    return np.divide(
+        numerator,
+        denominator,
+        out=np.zeros(numerator.shape, dtype=float),
+        where=denominator > 0,
+    )
+
+
+def score_graphs(predicted: list[dict], gold: list[dict]) -> dict[str, dict[str, np.ndarray]]:
+    """Score every predicted graph against every gold graph.
+
+    Args:
+        predicted: The predicted graphs.
+        gold: The gold graphs.
+
+    Returns:
+        For each of nodes, edges and triples, the precision, recall and F1 matrices
+        of shape (number of predicted graphs, number of gold graphs).
+    """
+    predicted_items = [graph_items(graph) for graph in predicted]
+    gold_items = [graph_items(graph) for graph in gold]
+
+    scores = {}
+    for kind in KINDS:
+        incidence = encode([items[kind] for items in predicted_items + gold_items]).astype(float)
+        predicted_incidence = incidence[: len(predicted)]
+        gold_incidence = incidence[len(predicted) :]
+
+        overlap = predicted_incidence @ gold_incidence.T
+        precision = _safe_divide(overlap, predicted_incidence.sum(axis=1, keepdims=True))
+        recall = _safe_divide(overlap, gold_incidence.sum(axis=1, keepdims=True).T)
+        f1 = _safe_divide(2 * precision * recall, precision + recall)
+        scores[kind] = {"precision": precision, "recall": recall, "f1": f1}
+    return scores
+
+
+def scores_at(scores: dict[str, dict[str, np.ndarray]], i: int, j: int) -> dict:
+    """Get the scores of a single pair of predicted and gold graphs.
+
+    Args:
+        scores: The score matrices returned by `score_graphs`.
+        i: Index of the predicted graph.
+        j: Index of the gold graph.
+
+    Returns:
+        The precision, recall and F1 of nodes, edges and triples.
+    """
+    return {
+        kind: {metric: float(scores[kind][metric][i, j]) for metric in METRICS} for kind in KINDS
+    }
@@ -0,0 +1,124 @@
+"""Runner for the structural knowledge graph evaluator.
+
+Compares the generated `knowledge_graph` and `knowledge_graph_permutations` of
+the first experiment against the hand-labelled graphs of the paper
+(`label_<uid>_kg_original.json`, `label_<uid>_kg_perm_<index>.json`), without
+any LLM call.
+"""
+
+import re
+
+import numpy as np
+
+from generators.ken_c137.graphs.compact_permutations import load_permutations
+from logger import get_logger
+
+from .metrics import score_graphs, scores_at
+
+logger = get_logger(__name__)
+
+LABEL_FILENAME_PATTERN = re.compile(r"label_(?P<uid>.+)_kg_(?P<name>original|perm_\d+)\.json")
+
+
+def group_labels(labels: dict[str, dict]) -> dict[str, dict[str, dict]]:
+    """Group label files by labeller uid.
+
+    Args:
+        labels: Labelled graphs keyed by filename.
+
+    Returns:
+        Labelled graphs keyed by uid, then by "original" or "perm_<index>".
+    """
+    grouped: dict[str, dict[str, dict]] = {}
+    for filename, graph in sorted(labels.items()):
+        match = LABEL_FILENAME_PATTERN.fullmatch(filename)
+        if match is None:
+            logger.warning(f"Skipping label file with unexpected name {filename}")
+            continue
+        grouped.setdefault(match["uid"], {})[match["name"]] = graph
+    return grouped
+
+
+def generated_graphs(gen_outputs_content: dict, experiment: str = "experiment_1") -> dict:
+    """Get the generated original and permuted graphs of an experiment.
+
+    Args:
+        gen_outputs_content: The content of the generated outputs.
+        experiment: The experiment key.
+
+    Returns:
+        The generated graphs keyed by "original" or permutation id.
+    """
+    graphs = {"original": gen_outputs_content["knowledge_graph"][experiment]}
+    permutations = load_permutations(gen_outputs_content).get(experiment, {})
+    graphs.update({str(permutation_i): kg for permutation_i, kg in permutations.items()})
+    return graphs
+
+
+def compare_to_labels(generated: dict[str, dict], labelled: dict[str, dict]) -> dict:
+    """Compare generated graphs to one labeller's graphs.
+
+    The generated original graph is compared to the labelled original graph, and
+    every labelled permutation is matched to the generated permutation with the
+    highest triple F1.
+
+    Args:
+        generated: Generated graphs keyed by "original" or permutation id.
+        labelled: Labelled graphs keyed by "original" or "perm_<index>".
+
+    Returns:
+        Scores of the original graph, of the best match of every labelled
+        permutation, and a summary.
+    """
+    generated_ids = list(generated)
+    labelled_ids = list(labelled)
+    scores = score_graphs(list(generated.values()), list(labelled.values()))
+    triple_f1 = scores["triples"]["f1"]
+
+    outputs: dict = {}
+    if "original" in labelled:
+        outputs["original"] = scores_at(scores, 0, labelled_ids.index("original"))
+
+    outputs["permutations"] = {}
+    best_f1s = []
+    for j, labelled_id in enumerate(labelled_ids):
+        if labelled_id == "original" or len(generated_ids) < 2:
+            continue
+        # Row 0 is the generated original graph, only permutations can match.
+        best = 1 + int(np.argmax(triple_f1[1:, j]))
+        outputs["permutations"][labelled_id] = {
+            "best_match": generated_ids[best],
+            **scores_at(scores, best, j),
+        }
+        best_f1s.append(float(triple_f1[best, j]))
+
+    outputs["summary"] = {
+        "original_triple_f1": outputs.get("original", {}).get("triples", {}).get("f1"),
+        "mean_best_permutation_triple_f1": float(np.mean(best_f1s)) if best_f1s else None,
+    }
+    return outputs
+
+
+def run(
+    paper_content: str, gen_outputs_content: dict, labels: dict[str, dict] | None = None
+) -> dict:
+    """Run the evaluator.
+
+    Args:
+        paper_content: The content of the paper.
+        gen_outputs_content: The content of the generated outputs.
+        labels: Labelled graphs of the paper keyed by filename.
+
+    Returns:
+        A dictionary with the comparison to each labeller's graphs.
+    """
+    outputs: dict = {"labels": {}}
+    if not labels:
+        logger.warning("No labelled graphs for this paper, nothing to compare to")
+        return outputs
+
+    generated = generated_graphs(gen_outputs_content)
+    for uid, labelled in group_labels(labels).items():
+        outputs["labels"][uid] = compare_to_labels(generated, labelled)
+        logger.info(f"Compared to labels of {uid}: {outputs['labels'][uid]['summary']}")
+    return outputs
@@ -0,0 +1,5 @@
+"""Lexical-similarity pre-screen evaluator."""
+
+from .runner import run, stream
+
+__all__ = ["run", "stream"]
@@ -0,0 +1,133 @@
+"""Runner for the lexical-similarity pre-screen evaluator.
+
+Scores every alternative in `results_permutations` against the original
+`results` and against each other with TF-IDF n-gram cosine similarity, so that
+alternatives which are trivially unchanged or near-duplicates of an earlier
+alternative can be dropped before any expensive LLM or expert evaluation.
+"""
+
+from collections.abc import Iterable
+
+import numpy as np
+
+from logger import get_logger
+
+from .similarity import cosine_similarity_matrix
+
+logger = get_logger(__name__)
+
+# Alternatives at least this similar to the original results are flagged as unchanged.
+UNCHANGED_THRESHOLD = 0.9
+# Alternatives at least this similar to an earlier alternative are flagged as near-duplicates.
+DUPLICATE_THRESHOLD = 0.85
+
+
+def screen_experiment(
+    original: str,
+    alternatives: dict[str, str],
+    unchanged_threshold: float = UNCHANGED_THRESHOLD,
+    duplicate_threshold: float = DUPLICATE_THRESHOLD,
+) -> dict:
+    """Screen the alternative results of a single experiment.
+
+    Args:
+        original: The original results.
+        alternatives: The alternative results keyed by permutation id.
+        unchanged_threshold: Similarity to the original above which an alternative is unchanged.
+        duplicate_threshold: Similarity to an earlier alternative above which it is a duplicate.
+
+    Returns:
+        The similarity matrix (original first), the flags of each alternative and
+        the ids of the alternatives passing the screen.
+    """
+    ids = list(alternatives)
+    similarity = cosine_similarity_matrix([original, *alternatives.values()])
+    to_original = similarity[0, 1:]
+    between_alternatives = similarity[1:, 1:]
+
+    # Only compare each alternative with the ones before it, so the first of a
+    # group of near-duplicates is kept.
+    earlier = np.tril(np.ones_like(between_alternatives, dtype=bool), k=-1)
+    duplicates = (between_alternatives >= duplicate_threshold) & earlier
+    unchanged = to_original >= unchanged_threshold
+
+    flags = {}
+    for i, permutation_id in enumerate(ids):
+        flags[permutation_id] = {
+            "similarity_to_original": float(to_original[i]),
+            "unchanged": bool(unchanged[i]),
+            "near_duplicate_of": [ids[j] for j in np.flatnonzero(duplicates[i])],
+        }
+    passed = [
+        permutation_id
+        for i, permutation_id in enumerate(ids)
+        if not unchanged[i] and not duplicates[i].any()
+    ]
+
+    return {
+        "ids": ["original", *ids],
+        "similarity_matrix": np.round(similarity, 4).tolist(),
+        "flags": flags,
+        "passed": passed,
+    }
+
+
+def run(paper_content: str, gen_outputs_content: dict) -> dict:
+    """Run the evaluator.
+
+    Args:
+        paper_content: The content of the paper.
+        gen_outputs_content: The content of the generated outputs.
+
+    Returns:
+        A dictionary with the screen of each experiment and a summary.
+    """
+    outputs: dict = {
+        "thresholds": {"unchanged": UNCHANGED_THRESHOLD, "near_duplicate": DUPLICATE_THRESHOLD},
+        "experiments": {},
+    }
+    num_alternatives = 0
+    num_passed = 0
+    for experiment_i, alternatives in gen_outputs_content.get("results_permutations", {}).items():
+        original = gen_outputs_content["results"][experiment_i]
+        screen = screen_experiment(original, alternatives)
+        outputs["experiments"][experiment_i] = screen
+        num_alternatives += len(alternatives)
+        num_passed += len(screen["passed"])
+        logger.info(
+            f"{experiment_i}: {len(screen['passed'])}/{len(alternatives)} passed the screen"
+        )
+
+    outputs["summary"] = {"num_alternatives": num_alternatives, "num_passed": num_passed}
+    return outputs
+
+
+def stream(paper_content: str, events: Iterable[dict]) -> dict:
+    """Run the evaluator on streamed generator events.
+
+    Only the original and alternative results are kept, so memory does not grow
+    with the size of the permuted knowledge graphs.
+
+    Args:
+        paper_content: The content of the paper.
+        events: The generator events, see `evaluators.streaming`.
+
+    Returns:
+        The same outputs as `run` on the final generator outputs.
+    """
+    gen_outputs_content: dict = {"results": {}, "results_permutations": {}}
+    for event in events:
+        if event["event"] == "context":
+            gen_outputs_content["results"] = event["results"]
+        elif event["event"] == "permutation":
+            experiment = gen_outputs_content["results_permutations"].setdefault(
+                event["experiment"], {}
+            )
+            experiment[event["permutation_id"]] = event["results"]
+
+    # Permutations are published as they are converted, the saved outputs sort them.
+    for experiment_i, alternatives in gen_outputs_content["results_permutations"].items():
+        gen_outputs_content["results_permutations"][experiment_i] = dict(
+            sorted(alternatives.items(), key=lambda x: int(x[0]))
+        )
+    return run(paper_content, gen_outputs_content)
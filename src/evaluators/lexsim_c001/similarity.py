@@ -0,0 +1,82 @@
+"""Vectorized TF-IDF n-gram similarity between texts."""
+
+import re
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> list[str]:
+    """Split a text into lowercase word tokens.
+
+    Args:
+        text: The text.
+
+    Returns:
+        The tokens.
+    """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def ngrams(tokens: list[str], ngram_range: tuple[int, int] = (1, 2)) -> list[str]:
+    """Get the word n-grams of a list of tokens.
+
+    Args:
+        tokens: The tokens.
+        ngram_range: Smallest and largest n of the n-grams.
+
+    Returns:
+        The n-grams, joined with spaces.
+    """
+    min_n, max_n = ngram_range
+    return [
+        " ".join(tokens[i : i + n])
+        for n in range(min_n, max_n + 1)
+        for i in range(len(tokens) - n + 1)
+    ]
+
+
+def tfidf_matrix(texts: list[str], ngram_range: tuple[int, int] = (1, 2)) -> np.ndarray:
+    """Compute L2-normalized TF-IDF vectors of texts.
+
+    Args:
+        texts: The texts.
+        ngram_range: Smallest and largest n of the word n-grams.
+
+    Returns:
+        Matrix of shape (number of texts, vocabulary size), one row per text.
+    """
+    documents = [ngrams(tokenize(text), ngram_range) for text in texts]
+    vocabulary: dict[str, int] = {}
+    rows = []
+    columns = []
+    for row, document in enumerate(documents):
+        for gram in document:
+            rows.append(row)
+            columns.append(vocabulary.setdefault(gram, len(vocabulary)))
+
+    counts = np.zeros((len(texts), len(vocabulary)))
+    np.add.at(counts, (np.array(rows, dtype=int), np.array(columns, dtype=int)), 1)
+
+    # Smoothed inverse document frequency, as in scikit-learn.
+    document_frequency = (counts > 0).sum(axis=0)
+    idf = np.log((1 + len(texts)) / (1 + document_frequency)) + 1
+    tfidf = counts * idf
+
+    norms = np.linalg.norm(tfidf, axis=1, keepdims=True)
+    return np.divide(tfidf, norms, out=np.zeros_like(tfidf), where=norms > 0)
+
+
+def cosine_similarity_matrix(texts: list[str], ngram_range: tuple[int, int] = (1, 2)) -> np.ndarray:
+    """Compute the pairwise TF-IDF cosine similarity of texts.
+
+    Args:
+        texts: The texts.
+        ngram_range: Smallest and largest n of the word n-grams.
+
+    Returns:
+        Symmetric matrix of shape (number of texts, number of texts).
+    """
+    vectors = tfidf_matrix(texts, ngram_range)
+    return np.clip(vectors @ vectors.T, 0.0, 1.0)
@@ -2,72 +2,331 @@
 
 import argparse
 import importlib
+import importlib.util
+import inspect
 import json
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from types import ModuleType
 
-from logger import get_logger
+from corpus import index_output
+from generators.jsonl_outputs import is_complete, is_current, iter_records
+from logger import get_logger, log_context
+from profiling import StageProfiler, activate_profiler, profile_stage
 
 logger = get_logger("evaluators.main")
 
 
+def load_labels(doi: str) -> dict[str, dict]:
+    """Load the hand-labelled graphs of a paper.
+
+    Args:
+        doi: DOI of the paper.
+
+    Returns:
+        The labelled graphs keyed by filename.
+    """
+    labels = {}
+    for label_path in sorted(Path(f"papers/{doi}").glob("label_*.json")):
+        with label_path.open() as f:
+            labels[label_path.name] = json.load(f)
+    return labels
+
+
+def evaluate(
+    doi: str, uid: str, gen_outputs_path: Path, profiler: StageProfiler | None = None
+) -> Path | None:
+    """Run an evaluator on the generated outputs of a paper and save its outputs.
+
+    Args:
+        doi: DOI of the paper.
+        uid: UID of the evaluator.
+        gen_outputs_path: Path to the generator outputs.
+        profiler: Optional profiler of the evaluation stages, whose report is saved
+            next to the outputs as `profile_<outputs filename>`.
+
+    Returns:
+        The path of the saved outputs, or None if the evaluator could not be run.
+    """
+    paper_path = Path(f"papers/{doi}/original_paper.txt")
+    if paper_path.exists():
+        with paper_path.open() as f:
+            paper_content = f.read()
+            logger.info(f"Successfully read file {paper_path}")
+    else:
+        logger.error(f"File {paper_path} does not exist")
+        return None
+
+    if not gen_outputs_path.exists():
+        logger.error(f"File {gen_outputs_path} does not exist")
+        return None
+
+    try:
+        # Import the module dynamically
+        module = importlib.import_module(f"evaluators.{uid}")
+        logger.info(f"Successfully imported module {uid}")
+    except ImportError as e:
+        logger.error(f"Module {uid} does not exist: {e}")
+        return None
+
+    run_id = f"{doi}/eval_{uid}_{gen_outputs_path.stem}"
+    with activate_profiler(profiler), log_context(run_id=run_id):
+        try:
+            outputs = run_module(module, doi, paper_content, gen_outputs_path)
+            logger.info(f"Successfully ran module {uid}")
+        except Exception:
+            logger.exception(f"Error running module {uid}")
+            return None
+        output_path = save_outputs(doi, uid, gen_outputs_path, outputs)
+
+    if profiler is not None:
+        profiler.save(output_path.parent / f"profile_{output_path.name}")
+    return output_path
+
+
+def run_module(module: ModuleType, doi: str, paper_content: str, gen_outputs_path: Path) -> dict:
+    """Run an evaluator module on generator outputs.
+
+    Evaluators defining `stream` iterate the `.jsonl` log of streamed generator
+    outputs when it is complete and not older than the JSON file, instead of
+    loading the whole JSON file.
+
+    Args:
+        module: The evaluator module.
+        doi: DOI of the paper.
+        paper_content: The content of the paper.
+        gen_outputs_path: Path to the generator outputs.
+
+    Returns:
+        The evaluator outputs.
+    """
+    log_path = gen_outputs_path.with_suffix(".jsonl")
+    if (
+        hasattr(module, "stream")
+        and is_complete(log_path)
+        and is_current(log_path, gen_outputs_path)
+    ):
+        logger.info(f"Reading streamed outputs {log_path}")
+        with profile_stage("evaluate"):
+            return module.stream(paper_content, iter_records(log_path))
+
+    with profile_stage("load_gen_outputs"), gen_outputs_path.open() as f:
+        gen_outputs_content = json.load(f)
+        logger.info(f"Successfully read file {gen_outputs_path}")
+
+    # Evaluators comparing against ground truth accept the paper's labelled graphs.
+    run_kwargs = {}
+    if "labels" in inspect.signature(module.run).parameters:
+        run_kwargs["labels"] = load_labels(doi)
+    with profile_stage("evaluate"):
+        return module.run(paper_content, gen_outputs_content, **run_kwargs)
+
+
+def save_outputs(doi: str, uid: str, gen_outputs_path: Path, outputs: dict) -> Path:
+    """Save the outputs of an evaluator next to the generator outputs it evaluated.
+
+    Args:
+        doi: DOI of the paper.
+        uid: UID of the evaluator.
+        gen_outputs_path: Path to the generator outputs.
+        outputs: The evaluator outputs.
+
+    Returns:
+        The path of the saved outputs.
+    """
+    output_path = Path(f"papers/{doi}/eval_{uid}_{gen_outputs_path.name}")
+    with profile_stage("save_outputs"), output_path.open("w") as f:
+        json.dump(outputs, f, indent=4)
+        logger.info(f"Successfully saved file {output_path}")
+    index_output(output_path)
+    return output_path
+
+
+def find_gen_outputs(doi: str | None = None) -> list[Path]:
+    """Find the generator outputs of all papers, or of a single paper.
+
+    Args:
+        doi: Optional DOI of the paper to restrict the search to.
+
+    Returns:
+        The paths of the generator outputs.
+    """
+    pattern = f"{doi}/gen_*.json" if doi else "*/gen_*.json"
+    return sorted(Path("papers").glob(pattern))
+
+
+def evaluator_mtime(uid: str) -> float:
+    """Get the last modification time of an evaluator's code.
+
+    Args:
+        uid: UID of the evaluator.
+
+    Returns:
+        The latest modification time of the evaluator's Python files.
+    """
+    spec = importlib.util.find_spec(f"evaluators.{uid}")
+    if spec is None or not spec.submodule_search_locations:
+        raise ImportError(f"Module {uid} does not exist")
+    module_dir = Path(next(iter(spec.submodule_search_locations)))
+    return max(path.stat().st_mtime for path in module_dir.rglob("*.py"))
+
+
+def is_fresh(eval_path: Path, gen_outputs_path: Path, module_mtime: float) -> bool:
+    """Check whether an evaluation is newer than its generator outputs and evaluator.
+
+    Args:
+        eval_path: Path of the evaluator outputs.
+        gen_outputs_path: Path of the generator outputs.
+        module_mtime: Last modification time of the evaluator's code.
+
+    Returns:
+        True if the evaluation does not need to be redone.
+    """
+    if not eval_path.exists():
+        return False
+    eval_mtime = eval_path.stat().st_mtime
+    return eval_mtime > gen_outputs_path.stat().st_mtime and eval_mtime > module_mtime
+
+
+def timed_evaluate(doi: str, uid: str, gen_outputs_path: Path) -> tuple[bool, float]:
+    """Run an evaluator and time it.
+
+    Args:
+        doi: DOI of the paper.
+        uid: UID of the evaluator.
+        gen_outputs_path: Path to the generator outputs.
+
+    Returns:
+        Whether the evaluation succeeded and its wall-clock time in seconds.
+    """
+    start = time.perf_counter()
+    output_path = evaluate(doi, uid, gen_outputs_path)
+    return output_path is not None, time.perf_counter() - start
+
+
+def evaluate_batch(
+    uids: list[str], doi: str | None = None, workers: int = 4, force: bool = False
+) -> dict[str, dict]:
+    """Evaluate every generator output with every evaluator, in parallel.
+
+    Pairs whose evaluation is newer than both the generator outputs and the
+    evaluator's code are skipped, unless `force` is set. Pairs raising an error,
+    and all pairs of an evaluator which does not exist, count as failed.
+
+    Args:
+        uids: UIDs of the evaluators.
+        doi: Optional DOI of the paper to restrict the batch to.
+        workers: Number of worker processes.
+        force: Re-evaluate pairs even if their evaluation is fresh.
+
+    Returns:
+        Per-evaluator counts of evaluated, failed and skipped pairs, and throughput.
+    """
+    gen_outputs_paths = find_gen_outputs(doi)
+    stats = {
+        uid: {"evaluated": 0, "failed": 0, "skipped": 0, "seconds": 0.0, "per_second": 0.0}
+        for uid in uids
+    }
+
+    pairs = []
+    for uid in uids:
+        try:
+            module_mtime = evaluator_mtime(uid)
+        except ImportError as e:
+            logger.error(f"Skipping evaluator {uid}: {e}")
+            stats[uid]["failed"] += len(gen_outputs_paths)
+            continue
+        for gen_outputs_path in gen_outputs_paths:
+            eval_path = gen_outputs_path.parent / f"eval_{uid}_{gen_outputs_path.name}"
+            if not force and is_fresh(eval_path, gen_outputs_path, module_mtime):
+                stats[uid]["skipped"] += 1
+            else:
+                pairs.append((gen_outputs_path.parent.name, uid, gen_outputs_path))
+    num_skipped = sum(uid_stats["skipped"] for uid_stats in stats.values())
+    logger.info(f"Evaluating {len(pairs)} pairs, skipping {num_skipped} fresh ones")
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {pair: executor.submit(timed_evaluate, *pair) for pair in pairs}
+        for (_, uid, gen_outputs_path), future in futures.items():
+            try:
+                succeeded, seconds = future.result()
+            except Exception:
+                # One bad pair, or a crashed worker, must not abort the batch.
+                logger.exception(f"Error evaluating {gen_outputs_path} with {uid}")
+                stats[uid]["failed"] += 1
+                continue
+            stats[uid]["evaluated" if succeeded else "failed"] += 1
+            stats[uid]["seconds"] += seconds
+    wall_seconds = time.perf_counter() - start
+
+    for uid, uid_stats in stats.items():
+        if uid_stats["seconds"] > 0:
+            uid_stats["per_second"] = uid_stats["evaluated"] / uid_stats["seconds"]
+        logger.info(
+            f"{uid}: {uid_stats['evaluated']} evaluated, {uid_stats['failed']} failed, "
+            f"{uid_stats['skipped']} skipped, "
+            f"{uid_stats['per_second']:.2f} evaluations/s per worker"
+        )
+    logger.info(f"Batch finished in {wall_seconds:.2f}s with {workers} workers")
+    return stats
+
+
 def main() -> None:
     """Main function for running evaluators."""
     parser = argparse.ArgumentParser()
     parser.add_argument("--doi", type=str, help="DOI of the paper")
     parser.add_argument("--eval-uid", type=str, help="UID of the evaluator")
     parser.add_argument("--gen-outputs-path", type=str, help="Path to the generator outputs")
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Evaluate every gen_*.json under papers/ (or under --doi) with the "
+        "comma-separated evaluators of --eval-uid",
+    )
+    parser.add_argument("--workers", type=int, default=4, help="Number of batch worker processes")
+    parser.add_argument(
+        "--force", action="store_true", help="Re-evaluate pairs whose evaluation is fresh"
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Time each evaluation stage and save a profile report next to the outputs",
+    )
+    parser.add_argument(
+        "--profile-hotspots",
+        action="store_true",
+        help="With --profile, run cProfile per stage and report its top functions",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="With --profile, trace allocations per stage and report their peak",
+    )
     args = parser.parse_args()
 
-    if args.doi:
-        doi = args.doi
-        paper_path = Path(f"papers/{doi}/original_paper.txt")
-        if paper_path.exists():
-            with paper_path.open() as f:
-                paper_content = f.read()
-                logger.info(f"Successfully read file {paper_path}")
-        else:
-            logger.error(f"File {paper_path} does not exist")
+    if args.batch:
+        if not args.eval_uid:
+            logger.error("Please provide evaluator UID")
             return
-    else:
-        logger.error("Please provide DOI")
+        if args.profile:
+            logger.warning("--profile is ignored with --batch, profile single evaluations")
+        evaluate_batch(args.eval_uid.split(","), args.doi, args.workers, args.force)
         return
 
-    if args.gen_outputs_path:
-        gen_outputs_path = Path(args.gen_outputs_path)
-        if gen_outputs_path.exists():
-            with gen_outputs_path.open() as f:
-                gen_outputs_content = json.load(f)
-                logger.info(f"Successfully read file {gen_outputs_path}")
-        else:
-            logger.error(f"File {gen_outputs_path} does not exist")
-            return
-    else:
+    if not args.doi:
+        logger.error("Please provide DOI")
+        return
+    if not args.gen_outputs_path:
         logger.error("Please provide generator outputs path")
         return
-
-    if args.eval_uid:
-        uid = args.eval_uid
-        try:
-            # Import the module dynamically
-            module = importlib.import_module(f"evaluators.{uid}")
-            logger.info(f"Successfully imported module {uid}")
-        except ImportError as e:
-            logger.error(f"Module {uid} does not exist: {e}")
-            return
-
-        try:
-            outputs = module.run(paper_content, gen_outputs_content)
-            logger.info(f"Successfully ran module {uid}")
-        except Exception:
-            logger.exception(f"Error running module {uid}")
-            return
-
-        output_path = Path(f"papers/{doi}/eval_{uid}_{gen_outputs_path.name}")
-        with output_path.open("w") as f:
-            json.dump(outputs, f, indent=4)
-            logger.info(f"Successfully saved file {output_path}")
-    else:
+    if not args.eval_uid:
         logger.error("Please provide evaluator UID")
+        return
+
+    profiler = StageProfiler(args.profile_hotspots, args.profile_memory) if args.profile else None
+    evaluate(args.doi, args.eval_uid, Path(args.gen_outputs_path), profiler)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,118 @@
+"""Streaming evaluation of generator outputs while they are being generated.
+
+Generators publish events as their outputs become available (see the `on_event`
+argument of `ken_c137.kg_pipeline.run`): first a "context" event with the
+methods and original results, then a "permutation" event for every converted
+permutation. Each evaluator exposing a `stream(paper_content, events)` function
+consumes its own queue of events in a worker thread and returns the same
+outputs as its `run` function, so scoring overlaps with generation. Evaluators
+without `stream` are run on the saved generator outputs once generation ends.
+"""
+
+import importlib
+import queue
+from collections.abc import Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+from logger import get_logger
+
+from .main import evaluate, save_outputs
+
+logger = get_logger(__name__)
+
+# Sentinel closing an event queue.
+_END = None
+
+
+def iter_events(events: "queue.Queue[dict | None]") -> Iterator[dict]:
+    """Iterate over the events of a queue until it is closed.
+
+    Args:
+        events: The queue of events.
+
+    Yields:
+        The events, blocking until each one is published.
+    """
+    while (event := events.get()) is not _END:
+        yield event
+
+
+class StreamingEvaluation:
+    """Fan out generator events to the evaluators of a paper."""
+
+    def __init__(self, doi: str, uids: list[str]) -> None:
+        """Start a consumer thread for every evaluator supporting streaming.
+
+        Evaluators which cannot be imported are logged and skipped, and none is
+        started if the paper does not exist, as generation then fails.
+
+        Args:
+            doi: DOI of the paper.
+            uids: UIDs of the evaluators.
+        """
+        self.doi = doi
+        self.batch_uids: list[str] = []
+        self.queues: dict[str, queue.Queue[dict | None]] = {}
+        self.futures: dict[str, Future[dict]] = {}
+        self.executor = ThreadPoolExecutor(max_workers=max(len(uids), 1))
+
+        paper_path = Path(f"papers/{doi}/original_paper.txt")
+        if not paper_path.exists():
+            logger.error(f"File {paper_path} does not exist, no evaluator is streamed to")
+            return
+        paper_content = paper_path.read_text()
+        for uid in uids:
+            try:
+                module = importlib.import_module(f"evaluators.{uid}")
+            except ImportError as e:
+                logger.error(f"Module {uid} does not exist: {e}")
+                continue
+            if not hasattr(module, "stream"):
+                logger.info(f"Evaluator {uid} does not stream, running it after generation")
+                self.batch_uids.append(uid)
+                continue
+            self.queues[uid] = queue.Queue()
+            self.futures[uid] = self.executor.submit(
+                module.stream, paper_content, iter_events(self.queues[uid])
+            )
+            logger.info(f"Streaming generator events to evaluator {uid}")
+
+    def publish(self, event: dict) -> None:
+        """Publish a generator event to every streaming evaluator.
+
+        Args:
+            event: The event.
+        """
+        for events in self.queues.values():
+            events.put(event)
+
+    def finish(self, gen_outputs_path: Path | None) -> list[Path]:
+        """Close the event queues and save the outputs of every evaluator.
+
+        Args:
+            gen_outputs_path: Path to the saved generator outputs, or None if generation failed.
+
+        Returns:
+            The paths of the saved evaluator outputs.
+        """
+        for events in self.queues.values():
+            events.put(_END)
+
+        output_paths = []
+        for uid, future in self.futures.items():
+            try:
+                outputs = future.result()
+            except Exception:
+                logger.exception(f"Error streaming to module {uid}")
+                continue
+            if gen_outputs_path is not None:
+                output_paths.append(save_outputs(self.doi, uid, gen_outputs_path, outputs))
+        self.executor.shutdown()
+
+        if gen_outputs_path is not None:
+            for uid in self.batch_uids:
+                output_path = evaluate(self.doi, uid, gen_outputs_path)
+                if output_path is not None:
+                    output_paths.append(output_path)
+        return output_paths
@@ -0,0 +1,197 @@
+"""Append-only JSONL log of generator outputs.
+
+While a generator runs, every event it publishes (see the `on_event` argument
+of `ken_c137.kg_pipeline.run`) is appended to `gen_<...>.jsonl` and fsynced, so
+the outputs of completed stages and permutations survive a crash and can be
+resumed with `--incremental`. On completion the outputs are written atomically
+to the usual `gen_<...>.json` layout and a "complete" record closes the log,
+which evaluators can then iterate without loading the whole JSON file.
+"""
+
+import functools
+import json
+import os
+import stat
+import tempfile
+from collections.abc import Iterator
+from pathlib import Path
+
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+COMPLETE_EVENT = "complete"
+# Number of trailing bytes read to find the last record of a log.
+_TAIL_BYTES = 4096
+
+
+class JsonlWriter:
+    """Append records to a JSONL file, each one durable once written."""
+
+    def __init__(self, path: Path, append: bool = False) -> None:
+        """Open the log.
+
+        Args:
+            path: Path of the log.
+            append: Keep the records of an interrupted run instead of starting a new log.
+        """
+        self.path = path
+        if append:
+            truncate_partial_record(path)
+        self.file = path.open("a" if append else "w")
+
+    def write(self, record: dict) -> None:
+        """Append a record and flush it to disk.
+
+        Args:
+            record: The record.
+        """
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self) -> None:
+        """Close the log."""
+        self.file.close()
+
+
+def truncate_partial_record(path: Path) -> None:
+    """Drop the half-written last record a crash can leave at the end of a log.
+
+    Appending after it would otherwise leave a corrupt line in the middle of the log.
+
+    Args:
+        path: Path of the log.
+    """
+    if not path.exists():
+        return
+    with path.open("rb+") as f:
+        size = end = f.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(0, end - _TAIL_BYTES)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b"\n")
+            if newline != -1:
+                end = start + newline + 1
+                break
+            end = start
+        if end < size:
+            logger.warning(f"Dropping truncated record at the end of {path}")
+            f.truncate(end)
+
+
+@functools.cache
+def _umask() -> int:
+    """Get the umask of the process, read once as it can only be read by setting it.
+
+    Returns:
+        The umask.
+    """
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+def write_json_atomic(data: dict, path: Path) -> None:
+    """Write a JSON file so that readers see either the old or the new content.
+
+    The file gets the permissions `open(path, "w")` would give it: those of the
+    file it replaces, or the default ones of the umask for a new file, rather
+    than the owner-only permissions of temporary files.
+
+    Args:
+        data: The data to write.
+        path: Path of the JSON file.
+    """
+    try:
+        mode = stat.S_IMODE(path.stat().st_mode)
+    except FileNotFoundError:
+        mode = 0o666 & ~_umask()
+    with tempfile.NamedTemporaryFile("w", dir=path.parent, suffix=".tmp", delete=False) as f:
+        json.dump(data, f, indent=4)
+        f.flush()
+        os.fchmod(f.fileno(), mode)
+        os.fsync(f.fileno())
+    Path(f.name).replace(path)
+
+
+def iter_records(path: Path) -> Iterator[dict]:
+    """Iterate over the records of a log, one line at a time.
+
+    A truncated last line, left by a crash while writing it, is skipped.
+
+    Args:
+        path: Path of the log.
+
+    Yields:
+        The records in the order they were written.
+    """
+    with path.open() as f:
+        for line in f:
+            if not line.endswith("\n"):
+                logger.warning(f"Skipping truncated record at the end of {path}")
+                return
+            yield json.loads(line)
+
+
+def is_complete(path: Path) -> bool:
+    """Check whether a log was closed by a successful run.
+
+    Args:
+        path: Path of the log.
+
+    Returns:
+        True if the last record of the log is the "complete" record.
+    """
+    if not path.exists():
+        return False
+    with path.open("rb") as f:
+        f.seek(max(0, path.stat().st_size - _TAIL_BYTES))
+        lines = f.read().splitlines()
+    try:
+        return bool(lines) and json.loads(lines[-1]).get("event") == COMPLETE_EVENT
+    except json.JSONDecodeError:
+        return False
+
+
+def is_current(path: Path, output_path: Path) -> bool:
+    """Check whether a log is at least as recent as the JSON outputs next to it.
+
+    A later run without streaming rewrites the JSON outputs but not the log,
+    which then holds stale outputs.
+
+    Args:
+        path: Path of the log.
+        output_path: Path of the JSON outputs.
+
+    Returns:
+        True if the log exists and the JSON outputs are missing or not newer.
+    """
+    if not path.exists():
+        return False
+    return not output_path.exists() or path.stat().st_mtime >= output_path.stat().st_mtime
+
+
+def load_partial_outputs(path: Path) -> dict:
+    """Rebuild the outputs of an interrupted run from its log.
+
+    Only the outputs of completed stages and the converted permutations are
+    recovered, to be passed as `previous_outputs` of the next run. The costs of
+    permutations are not logged, so they are not carried over.
+
+    Args:
+        path: Path of the log.
+
+    Returns:
+        The recovered outputs.
+    """
+    outputs: dict = {"token_cost": {}}
+    for record in iter_records(path):
+        if record["event"] == "stage":
+            outputs[record["key"]] = record["value"]
+            outputs["token_cost"][record["cost_key"]] = record["cost"]
+        elif record["event"] == "permutation":
+            results_permutations = outputs.setdefault("results_permutations", {})
+            experiment = results_permutations.setdefault(record["experiment"], {})
+            experiment[record["permutation_id"]] = record["results"]
+    return outputs
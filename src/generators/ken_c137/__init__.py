@@ -1,5 +1,5 @@
 """Ken C137 generator."""
 
-from .kg_pipeline import run
+from .kg_pipeline import run, run_shared
 
-__all__ = ["run"]
+__all__ = ["run", "run_shared"]
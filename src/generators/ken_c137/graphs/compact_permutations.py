@@ -0,0 +1,181 @@
+"""Compact storage of knowledge graph permutations.
+
+A permutation only remaps the ids of some nodes of the original graph, its
+edges and node order are unchanged. In the compact format each permutation is
+stored as its id remap `[old_ids, new_ids]`, restricted to the nodes whose id
+changed, instead of a full copy of the graph; the original graph is already
+stored once under `knowledge_graph`. Outputs in this format have
+`"permutation_format": "remap"`.
+
+Existing outputs can be converted in place with:
+
+    python -m generators.ken_c137.graphs.compact_permutations papers/*/gen_*.json
+"""
+
+import argparse
+import json
+from collections.abc import Iterator, Mapping
+from pathlib import Path
+
+from logger import get_logger
+
+from .permute_knowledge_graph import apply_permutation
+
+logger = get_logger(__name__)
+
+REMAP_FORMAT = "remap"
+
+
+def encode_permutation(graph: dict, permuted_graph: dict) -> list[list[int]]:
+    """Encode a permutation as the id remap of the nodes whose id changed.
+
+    Args:
+        graph: The original graph.
+        permuted_graph: The permuted graph.
+
+    Returns:
+        The old ids and the new ids of the remapped nodes.
+    """
+    old_ids = []
+    new_ids = []
+    for node, permuted_node in zip(graph["nodes"], permuted_graph["nodes"], strict=True):
+        if node["id"] != permuted_node["id"]:
+            old_ids.append(node["id"])
+            new_ids.append(permuted_node["id"])
+    return [old_ids, new_ids]
+
+
+def decode_permutation(graph: dict, remap: list[list[int]]) -> dict:
+    """Rebuild a permuted graph from its id remap.
+
+    Args:
+        graph: The original graph.
+        remap: The old ids and the new ids of the remapped nodes.
+
+    Returns:
+        The permuted graph.
+    """
+    old_ids, new_ids = remap
+    return apply_permutation(graph, tuple(old_ids), tuple(new_ids))
+
+
+class LazyPermutations(Mapping[str, dict]):
+    """Permutations of an experiment, rebuilt from their remaps when accessed."""
+
+    def __init__(self, graph: dict, remaps: dict[str, list[list[int]]]) -> None:
+        """Initialize the permutations.
+
+        Args:
+            graph: The original graph of the experiment.
+            remaps: The id remaps keyed by permutation id.
+        """
+        self.graph = graph
+        self.remaps = remaps
+
+    def __getitem__(self, permutation_id: str) -> dict:
+        """Rebuild a permuted graph.
+
+        Args:
+            permutation_id: The permutation id.
+
+        Returns:
+            The permuted graph.
+        """
+        return decode_permutation(self.graph, self.remaps[permutation_id])
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the permutation ids.
+
+        Returns:
+            An iterator over the permutation ids.
+        """
+        return iter(self.remaps)
+
+    def __len__(self) -> int:
+        """Get the number of permutations.
+
+        Returns:
+            The number of permutations.
+        """
+        return len(self.remaps)
+
+
+def load_permutations(outputs: dict) -> dict[str, Mapping[str, dict]]:
+    """Get the permuted graphs of generator outputs in either format.
+
+    Args:
+        outputs: The generator outputs.
+
+    Returns:
+        The permuted graphs keyed by experiment, then by permutation id.
+    """
+    permutations = outputs.get("knowledge_graph_permutations", {})
+    if outputs.get("permutation_format") != REMAP_FORMAT:
+        return permutations
+    return {
+        experiment: LazyPermutations(outputs["knowledge_graph"][experiment], remaps)
+        for experiment, remaps in permutations.items()
+    }
+
+
+def compact_outputs(outputs: dict) -> dict:
+    """Store the permutations of generator outputs as id remaps.
+
+    Args:
+        outputs: The generator outputs.
+
+    Returns:
+        The outputs with compact permutations, unchanged if they are already compact.
+    """
+    if outputs.get("permutation_format") == REMAP_FORMAT:
+        return outputs
+    compacted = dict(outputs)
+    compacted["knowledge_graph_permutations"] = {
+        experiment: {
+            str(permutation_i): encode_permutation(outputs["knowledge_graph"][experiment], graph)
+            for permutation_i, graph in permutations.items()
+        }
+        for experiment, permutations in outputs.get("knowledge_graph_permutations", {}).items()
+    }
+    compacted["permutation_format"] = REMAP_FORMAT
+    return compacted
+
+
+def expand_outputs(outputs: dict) -> dict:
+    """Store the permutations of generator outputs as full graphs.
+
+    Args:
+        outputs: The generator outputs.
+
+    Returns:
+        The outputs with full permuted graphs.
+    """
+    expanded = {key: value for key, value in outputs.items() if key != "permutation_format"}
+    expanded["knowledge_graph_permutations"] = {
+        experiment: dict(permutations)
+        for experiment, permutations in load_permutations(outputs).items()
+    }
+    return expanded
+
+
+def main() -> None:
+    """Convert generator outputs between the full and the compact formats in place."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="+", type=Path, help="Generator outputs to convert")
+    parser.add_argument(
+        "--expand", action="store_true", help="Convert compact outputs back to full graphs"
+    )
+    args = parser.parse_args()
+
+    for path in args.paths:
+        with path.open() as f:
+            outputs = json.load(f)
+        size = path.stat().st_size
+        converted = expand_outputs(outputs) if args.expand else compact_outputs(outputs)
+        with path.open("w") as f:
+            json.dump(converted, f, indent=4)
+        logger.info(f"Converted {path}: {size} -> {path.stat().st_size} bytes")
+
+
+if __name__ == "__main__":
+    main()
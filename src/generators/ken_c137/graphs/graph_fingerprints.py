@@ -0,0 +1,259 @@
+"""Near-duplicate detection of knowledge graph permutations.
+
+`create_permutations` only drops permutations with exactly the same triples, so
+permutations differing in a single peripheral triple are all kept, and each of
+them costs an LLM request to convert to text. Here every permuted graph gets a
+Weisfeiler-Lehman (WL) fingerprint: the multiset of its labelled triples and of
+its WL subtree hashes, each hash describing a node together with the relations
+and labels around it. The similarity of two graphs is the weighted Jaccard
+similarity of their fingerprints, so the triples keep it close to the share of
+triples two graphs have in common, while the subtree hashes tell apart graphs
+whose triples are arranged differently. Candidate pairs are found with MinHash signatures and
+locality-sensitive hashing (LSH), so graphs are not compared pairwise, and
+`prune_near_duplicates` keeps only one permutation of each group of permutations
+more similar than a threshold.
+"""
+
+import hashlib
+from collections import Counter
+from collections.abc import Hashable, Iterable
+
+import numpy as np
+
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# Number of WL refinements, i.e. hops of neighbourhood described by a subtree hash.
+# Every further hop changes the hashes of more nodes per swap, which on graphs of
+# about ten nodes leaves little similarity between any two permutations.
+WL_ITERATIONS = 1
+# Number of hash functions of a MinHash signature.
+NUM_PERM = 128
+# Prime modulus of the MinHash hash functions, above the 32-bit feature hashes.
+MINHASH_PRIME = 4_294_967_311
+# Probability that LSH finds graphs exactly as similar as the threshold.
+MIN_CANDIDATE_PROBABILITY = 0.99
+
+
+def _hash(text: str) -> str:
+    """Hash a string into a short hex digest.
+
+    Args:
+        text: The string.
+
+    Returns:
+        The digest.
+    """
+    return hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+
+
+def wl_fingerprint(graph: dict, iterations: int = WL_ITERATIONS) -> Counter[str]:
+    """Compute the labelled triples and WL subtree hashes of a graph.
+
+    Each node starts with its label. Each refinement hashes the label of a node
+    with the sorted relations and labels of its incoming and outgoing edges. The
+    initial labels are the same in every permutation of a graph, so they are not
+    part of the fingerprint, unlike the triples they form.
+
+    Args:
+        graph: The graph, with "nodes" and "edges".
+        iterations: Number of refinements, 0 for the triples only.
+
+    Returns:
+        The count of each triple and subtree hash.
+    """
+    labels = {node["id"]: node["label"] for node in graph["nodes"]}
+    fingerprint: Counter[str] = Counter(
+        _hash(f"{labels[edge['source']]}|{edge['relation']}|{labels[edge['target']]}")
+        for edge in graph["edges"]
+    )
+    for _ in range(iterations):
+        neighbourhoods: dict[int, list[str]] = {node_id: [] for node_id in labels}
+        for edge in graph["edges"]:
+            source, target = edge["source"], edge["target"]
+            neighbourhoods[source].append(f"out:{edge['relation']}:{labels[target]}")
+            neighbourhoods[target].append(f"in:{edge['relation']}:{labels[source]}")
+        labels = {
+            node_id: _hash(labels[node_id] + "|" + "|".join(sorted(neighbourhood)))
+            for node_id, neighbourhood in neighbourhoods.items()
+        }
+        fingerprint.update(labels.values())
+    return fingerprint
+
+
+def weighted_jaccard(first: Counter[str], second: Counter[str]) -> float:
+    """Compute the weighted Jaccard similarity of two fingerprints.
+
+    Args:
+        first: The first fingerprint.
+        second: The second fingerprint.
+
+    Returns:
+        The similarity, between 0 and 1.
+    """
+    union = sum((first | second).values())
+    return sum((first & second).values()) / union if union else 1.0
+
+
+class MinHash:
+    """MinHash signatures of fingerprints, estimating their weighted Jaccard similarity."""
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 42) -> None:
+        """Initialize the hash functions.
+
+        Args:
+            num_perm: Number of hash functions, i.e. length of the signatures.
+            seed: Seed of the hash functions.
+        """
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, 2**31, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 2**32, num_perm, dtype=np.uint64)
+
+    def signature(self, fingerprint: Counter[str]) -> np.ndarray:
+        """Compute the signature of a fingerprint.
+
+        Repeated hashes are numbered, so the Jaccard similarity of the numbered sets
+        is the weighted Jaccard similarity of the fingerprints.
+
+        Args:
+            fingerprint: The fingerprint.
+
+        Returns:
+            The minimum of each hash function over the fingerprint.
+        """
+        features = np.array(
+            [
+                int(_hash(f"{feature}#{i}")[:8], 16)
+                for feature, count in fingerprint.items()
+                for i in range(count)
+            ],
+            dtype=np.uint64,
+        )
+        if features.size == 0:
+            return np.full(self.num_perm, MINHASH_PRIME, dtype=np.uint64)
+        hashes = (np.outer(features, self.a) + self.b) % np.uint64(MINHASH_PRIME)
+        return hashes.min(axis=0)
+
+
+def lsh_bands(threshold: float, num_perm: int = NUM_PERM) -> tuple[int, int]:
+    """Choose the LSH bands for a similarity threshold.
+
+    Signatures sharing all rows of any band are candidates, which happens with
+    probability 1 - (1 - s^rows)^bands for a similarity s. Candidates are checked
+    exactly, so the most rows per band are chosen for which graphs at the threshold
+    are still candidates with probability `MIN_CANDIDATE_PROBABILITY`.
+
+    Args:
+        threshold: The similarity threshold.
+        num_perm: Length of the signatures.
+
+    Returns:
+        The number of bands and of rows per band.
+    """
+    shapes = [(num_perm // rows, rows) for rows in range(1, num_perm + 1) if num_perm % rows == 0]
+    return max(
+        (
+            (bands, rows)
+            for bands, rows in shapes
+            if 1 - (1 - threshold**rows) ** bands >= MIN_CANDIDATE_PROBABILITY
+        ),
+        key=lambda shape: shape[1],
+        default=(num_perm, 1),
+    )
+
+
+class MinHashLSH:
+    """Index of MinHash signatures, finding those likely above a similarity threshold."""
+
+    def __init__(self, threshold: float, num_perm: int = NUM_PERM) -> None:
+        """Initialize an empty index.
+
+        Args:
+            threshold: The similarity threshold.
+            num_perm: Length of the signatures.
+        """
+        self.bands, self.rows = lsh_bands(threshold, num_perm)
+        self.buckets: list[dict[bytes, list[Hashable]]] = [{} for _ in range(self.bands)]
+
+    def _band_keys(self, signature: np.ndarray) -> Iterable[bytes]:
+        for band in range(self.bands):
+            yield signature[band * self.rows : (band + 1) * self.rows].tobytes()
+
+    def insert(self, key: Hashable, signature: np.ndarray) -> None:
+        """Add a signature to the index.
+
+        Args:
+            key: Key of the signature.
+            signature: The signature.
+        """
+        for buckets, band_key in zip(self.buckets, self._band_keys(signature), strict=True):
+            buckets.setdefault(band_key, []).append(key)
+
+    def query(self, signature: np.ndarray) -> list[Hashable]:
+        """Find the signatures sharing a band with a signature.
+
+        Args:
+            signature: The signature.
+
+        Returns:
+            Keys of the candidates, in the order they were inserted.
+        """
+        candidates: dict[Hashable, None] = {}
+        for buckets, band_key in zip(self.buckets, self._band_keys(signature), strict=True):
+            candidates.update(dict.fromkeys(buckets.get(band_key, [])))
+        return list(candidates)
+
+
+def prune_near_duplicates(
+    kg_perms: dict,
+    threshold: float,
+    num_perm: int = NUM_PERM,
+    wl_iterations: int = WL_ITERATIONS,
+) -> tuple[dict, dict]:
+    """Drop permutations too similar to a kept one.
+
+    Permutations are visited in increasing id order and kept unless their
+    similarity to a kept permutation is at least `threshold`. Candidates found by
+    LSH are checked with the exact similarity of their fingerprints.
+
+    Args:
+        kg_perms: Permuted graphs keyed by permutation id.
+        threshold: The similarity threshold, between 0 and 1.
+        num_perm: Length of the MinHash signatures.
+        wl_iterations: Number of WL refinements of the fingerprints.
+
+    Returns:
+        The kept permutations, and the id of the kept permutation each dropped
+        one duplicates, keyed by the id of the dropped one.
+
+    Raises:
+        ValueError: If the threshold is not between 0 and 1.
+    """
+    if not 0 < threshold <= 1:
+        raise ValueError(f"Similarity threshold must be in (0, 1], got {threshold}")
+    minhash = MinHash(num_perm)
+    index = MinHashLSH(threshold, num_perm)
+    fingerprints: dict[Hashable, Counter[str]] = {}
+    kept = {}
+    near_duplicates = {}
+    for permutation_i in sorted(kg_perms, key=int):
+        fingerprint = wl_fingerprint(kg_perms[permutation_i], wl_iterations)
+        signature = minhash.signature(fingerprint)
+        duplicate_of = next(
+            (
+                candidate
+                for candidate in index.query(signature)
+                if weighted_jaccard(fingerprint, fingerprints[candidate]) >= threshold
+            ),
+            None,
+        )
+        if duplicate_of is None:
+            kept[permutation_i] = kg_perms[permutation_i]
+            fingerprints[permutation_i] = fingerprint
+            index.insert(permutation_i, signature)
+        else:
+            near_duplicates[permutation_i] = duplicate_of
+    logger.info(f"Kept {len(kept)} of {len(kg_perms)} permutations below similarity {threshold}")
+    return kept, near_duplicates
@@ -2,6 +2,7 @@
 
 import copy
 import json
+import logging
 from itertools import chain, combinations, permutations, product
 from pathlib import Path
 
@@ -184,6 +185,66 @@ def graph_deviation_from_original(new_graph: dict, original_graph: dict) -> floa
     return deviation_pct
 
 
+def apply_perm_combo(
+    knowledge_graph: dict,
+    group_combo: tuple,
+    perm_combo: tuple,
+    valid_groups: dict,
+    log_debug: bool = False,
+) -> dict:
+    """Apply a permutation of each of several semantic groups to a copy of a graph.
+
+    Args:
+        knowledge_graph: The original knowledge graph.
+        group_combo: Names of the permuted semantic groups.
+        perm_combo: New order of the node ids of each permuted group.
+        valid_groups: Node ids of each semantic group, in their original order.
+        log_debug: Log every applied permutation, checked by the caller once.
+
+    Returns:
+        The permuted knowledge graph.
+    """
+    new_graph = copy.deepcopy(knowledge_graph)
+    for group_name, perm in zip(group_combo, perm_combo, strict=False):
+        old_order = valid_groups[group_name]
+        new_graph = apply_permutation(new_graph, old_order, perm)
+        if log_debug:
+            logger.debug(f"   group_name: {group_name}")
+            logger.debug(f"   old_order: {old_order}")
+            logger.debug(f"   new_order: {perm}")
+    return new_graph
+
+
+def permuted_node_labels(
+    knowledge_graph: dict, group_combo: tuple, perm_combo: tuple, valid_groups: dict
+) -> list:
+    """Get the labels of the nodes swapped by a permutation of semantic groups.
+
+    Args:
+        knowledge_graph: The original knowledge graph.
+        group_combo: Names of the permuted semantic groups.
+        perm_combo: New order of the node ids of each permuted group.
+        valid_groups: Node ids of each semantic group, in their original order.
+
+    Returns:
+        The (old label, new label) pairs of each permuted group.
+    """
+    permuted_nodes = []
+    for group_name, perm in zip(group_combo, perm_combo, strict=False):
+        old_order = valid_groups[group_name]
+        group_permutation = []
+        for old_id, new_id in zip(old_order, perm, strict=False):
+            old_label = [
+                node["label"] for node in knowledge_graph["nodes"] if node["id"] == old_id
+            ][0]
+            new_label = [
+                node["label"] for node in knowledge_graph["nodes"] if node["id"] == new_id
+            ][0]
+            group_permutation.append((old_label, new_label))
+        permuted_nodes.append((group_name, group_permutation))
+    return permuted_nodes
+
+
 def create_permutations(knowledge_graph: dict, semantic_groups: dict) -> tuple[dict, dict, dict]:
     """Create permutations of a knowledge graph.
 
@@ -236,8 +297,11 @@ def create_permutations(knowledge_graph: dict, semantic_groups: dict) -> tuple[d
         logger.info(f"Num. unique groups: {len(valid_groups)}")
         logger.info(f"Num. group combinations: {len(group_combinations)}")
 
+        # Checked once, so the loops below skip formatting when debug logs are off.
+        log_debug = logger.isEnabledFor(logging.DEBUG)
         for group_combo in group_combinations:
-            logger.debug(f"\nProcessing group combination: {group_combo}")
+            if log_debug:
+                logger.debug(f"\nProcessing group combination: {group_combo}")
 
             # Generate all possible swaps for each group
             group_swaps = []
@@ -245,43 +309,25 @@ def create_permutations(knowledge_graph: dict, semantic_groups: dict) -> tuple[d
                 nodes = valid_groups[group_name]
                 group_swaps.append(list(permutations(nodes)))
 
-            logger.debug(f" Group swaps: {group_swaps}")
+            if log_debug:
+                logger.debug(f" Group swaps: {group_swaps}")
             for perm_combo in product(*group_swaps):
-                logger.debug(f"  Applying perm_combo: {perm_combo}")
+                if log_debug:
+                    logger.debug(f"  Applying perm_combo: {perm_combo}")
 
-                new_graph = copy.deepcopy(knowledge_graph_i)
-                for group_name, perm in zip(group_combo, perm_combo, strict=False):
-                    old_order = valid_groups[group_name]
-                    new_graph = apply_permutation(new_graph, old_order, perm)
-                    logger.debug(f"   group_name: {group_name}")
-                    logger.debug(f"   old_order: {old_order}")
-                    logger.debug(f"   new_order: {perm}")
+                new_graph = apply_perm_combo(
+                    knowledge_graph_i, group_combo, perm_combo, valid_groups, log_debug
+                )
 
                 # Check if the new graph is unique
                 if is_unique_permutation(new_graph, list(permutations_i.values())):
                     unique_permutation_count_i += 1
                     permutations_i[unique_permutation_count_i] = new_graph
 
-                    permuted_nodes = []
-                    for group_name, perm in zip(group_combo, perm_combo, strict=False):
-                        old_order = valid_groups[group_name]
-                        group_permutation = []
-                        for old_id, new_id in zip(old_order, perm, strict=False):
-                            old_label = [
-                                node["label"]
-                                for node in knowledge_graph_i["nodes"]
-                                if node["id"] == old_id
-                            ][0]
-                            new_label = [
-                                node["label"]
-                                for node in knowledge_graph_i["nodes"]
-                                if node["id"] == new_id
-                            ][0]
-                            group_permutation.append((old_label, new_label))
-                        permuted_nodes.append((group_name, group_permutation))
-
                     # Track the nodes permuted for post-analysis
-                    node_swaps_tracker_i[unique_permutation_count_i] = permuted_nodes
+                    node_swaps_tracker_i[unique_permutation_count_i] = permuted_node_labels(
+                        knowledge_graph_i, group_combo, perm_combo, valid_groups
+                    )
 
                     # Track % of deviating triples to original
                     triple_deviation_pct_i[unique_permutation_count_i] = (
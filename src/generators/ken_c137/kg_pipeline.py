@@ -1,23 +1,41 @@
 """Knowledge graph pipeline."""
 
+from collections.abc import Callable
 from typing import Any
 
 import numpy as np
+from pydantic import ValidationError
 
-from llm.caller import ask_llm_with_schema
+from llm.budget import BudgetExceededError, RunBudget, activate_budget
+from llm.caller import ask_llm_with_schema, count_tokens
+from llm.packing import pack_by_token_budget
 from logger import get_logger
+from profiling import profile_stage
 
 from .graphs import permute_knowledge_graph
+from .graphs.compact_permutations import compact_outputs, load_permutations
+from .graphs.graph_fingerprints import prune_near_duplicates
 from .prompts import create_sys_prompts, create_user_prompts
+from .prompts.kg_formats import COMPACT_PROMPT_FORMATS
 from .prompts.response_models import (
     IdentifiedSemanticGroups,
     InitialKG,
     KGAsText,
+    PackedKGAsText,
     SummarizeMethods,
 )
 
 logger = get_logger(__name__)
 
+# Token budget of a packed permutation-to-text request (prompt and expected answer).
+PACK_TOKEN_BUDGET = 8000
+# Maximal number of permutations converted by a single packed request.
+MAX_PACK_SIZE = 8
+# Expected number of tokens of a single results paragraph in a packed answer.
+RESULTS_TOKENS_ESTIMATE = 250
+# Steps calling the LLM, keyed as in the token costs, in the order they run.
+LLM_STEPS = ["methods", "res_to_kg", "kg_to_text", "kg_to_semantic_groups", "kg_permutes_to_text"]
+
 
 def sampling_permutations(
     knowledge_graph_permutations_i: dict, max_num_samples: int = 10
@@ -43,21 +61,445 @@ def sampling_permutations(
     return permutes
 
 
-def has_n_experiments(initial_kg: InitialKG, num_experiments: int = 1) -> bool:
+def has_n_experiments(initial_kg: InitialKG | dict, num_experiments: int = 1) -> bool:
     """
     Check if the knowledge graph contains exactly num_experiments experiments.
 
     Args:
-        initial_kg (InitialKG): Knowledge graph.
+        initial_kg (InitialKG | dict): Knowledge graph, as a model or in dictionary format.
         num_experiments (int): Expected number of experiments.
 
     Returns:
         bool: True if the number of experiments equals num_experiments.
     """
-    return len(initial_kg.knowledge_graph) == num_experiments
+    if isinstance(initial_kg, InitialKG):
+        return len(initial_kg.knowledge_graph) == num_experiments
+    return len(initial_kg) == num_experiments
+
+
+def convert_permutation_to_text(
+    kg_creator: create_user_prompts.KnowledgeGraphCreator,
+    llm: str,
+    sys_prompt: str,
+    kg: dict,
+    orig_results: str,
+) -> tuple[str, float]:
+    """
+    Convert a single permuted knowledge graph to text.
+
+    Args:
+        kg_creator (KnowledgeGraphCreator): Prompt creator for the paper.
+        llm (str): LLM model to use for processing.
+        sys_prompt (str): System prompt.
+        kg (dict): Permuted knowledge graph.
+        orig_results (str): Original results used as a style example.
+
+    Returns:
+        tuple[str, float]: Results paragraph and cost of the request.
+    """
+    user_prompt = kg_creator.convert_kg_to_text_single_experiment(
+        kg, orig_results_as_example=orig_results
+    )
+    kg_permutes_to_text, cost = ask_llm_with_schema(llm, sys_prompt, user_prompt, KGAsText)
+    return kg_permutes_to_text.results, cost
+
+
+def convert_permutations_to_text_packed(
+    kg_creator: create_user_prompts.KnowledgeGraphCreator,
+    llm: str,
+    sys_prompt: str,
+    kg_perms: dict,
+    orig_results: str,
+    pack_token_budget: int = PACK_TOKEN_BUDGET,
+    max_pack_size: int = MAX_PACK_SIZE,
+    on_result: Callable[[Any, str], None] | None = None,
+) -> tuple[dict, float]:
+    """
+    Convert several permuted knowledge graphs to text with packed requests.
+
+    Permutations are grouped so that each request stays within `pack_token_budget`,
+    sharing the system prompt, instructions and style example across the group.
+    Permutations missing from a packed answer, or belonging to a pack whose answer
+    fails validation, are converted again with single requests. If the run budget
+    is exhausted, the permutations converted so far are returned.
+
+    Args:
+        kg_creator (KnowledgeGraphCreator): Prompt creator for the paper.
+        llm (str): LLM model to use for processing.
+        sys_prompt (str): System prompt.
+        kg_perms (dict): Permuted knowledge graphs keyed by permutation id.
+        orig_results (str): Original results used as a style example.
+        pack_token_budget (int): Token budget of a packed request.
+        max_pack_size (int): Max number of permutations per packed request.
+        on_result (Callable | None): Called with the id and text of each converted permutation.
+
+    Returns:
+        tuple[dict, float]: Results paragraphs keyed by permutation id and total cost.
+    """
+    keys_by_id = {str(permutation_i): permutation_i for permutation_i in kg_perms}
+    overhead_tokens = count_tokens(
+        llm, sys_prompt + kg_creator.convert_kgs_to_text_packed({}, orig_results)
+    )
+    item_tokens = {
+        str(permutation_i): count_tokens(llm, kg_creator.format_kg(kg, "kg_to_text"))
+        + RESULTS_TOKENS_ESTIMATE
+        for permutation_i, kg in kg_perms.items()
+    }
+    packs = pack_by_token_budget(item_tokens, pack_token_budget, overhead_tokens, max_pack_size)
+    logger.info(f"Packed {len(item_tokens)} permutations into {len(packs)} requests")
+
+    results: dict = {}
+    total_cost = 0.0
+    try:
+        for pack in packs:
+            converted: dict[str, str] = {}
+            if len(pack) > 1:
+                logger.info(f"Converting permutations {', '.join(pack)} in a packed request...")
+                user_prompt = kg_creator.convert_kgs_to_text_packed(
+                    {
+                        permutation_id: kg_perms[keys_by_id[permutation_id]]
+                        for permutation_id in pack
+                    },
+                    orig_results,
+                )
+                try:
+                    packed_to_text, cost = ask_llm_with_schema(
+                        llm, sys_prompt, user_prompt, PackedKGAsText
+                    )
+                    total_cost += cost
+                    converted = packed_to_text.to_dict_format()
+                except ValidationError:
+                    logger.warning(
+                        "Packed response failed validation, falling back to single calls"
+                    )
+
+            for permutation_id in pack:
+                permutation_i = keys_by_id[permutation_id]
+                if converted.get(permutation_id, "").strip():
+                    results[permutation_i] = converted[permutation_id]
+                else:
+                    logger.info(f"Converting permutation {permutation_id} with a single request...")
+                    results[permutation_i], cost = convert_permutation_to_text(
+                        kg_creator, llm, sys_prompt, kg_perms[permutation_i], orig_results
+                    )
+                    total_cost += cost
+                if on_result is not None:
+                    on_result(permutation_i, results[permutation_i])
+
+    except BudgetExceededError:
+        logger.warning("Run budget exhausted, keeping permutations converted so far")
+
+    return results, total_cost
 
 
-def run(paper_text: str, max_num_samples: int = 10, llm: str = "azure/gpt-4o-2024-08-06") -> dict:
+def reuse_or_run(
+    previous: dict, output_key: str, cost_key: str, step: Callable[[], tuple[Any, float]]
+) -> tuple[Any, float]:
+    """
+    Reuse the outputs of a step from a previous run, or run the step.
+
+    Args:
+        previous (dict): Outputs of a previous run, empty if there is none.
+        output_key (str): Key of the step outputs.
+        cost_key (str): Key of the step cost in the token costs.
+        step (Callable): Function running the step and returning its outputs and cost.
+
+    Returns:
+        tuple[Any, float]: Outputs of the step and their cost.
+    """
+    if output_key in previous:
+        logger.info(f"Reusing {output_key} from previous outputs...")
+        return previous[output_key], previous.get("token_cost", {}).get(cost_key, 0.0)
+    return step()
+
+
+def reuse_or_create_permutations(
+    previous: dict, knowledge_graph: dict, semantic_groups: dict
+) -> tuple[dict, dict, dict]:
+    """
+    Reuse the permuted knowledge graphs of a previous run, or create them.
+
+    Args:
+        previous (dict): Outputs of a previous run, empty if there is none.
+        knowledge_graph (dict): Knowledge graph with experiment_N keys.
+        semantic_groups (dict): Semantic groups with experiment_N keys.
+
+    Returns:
+        tuple[dict, dict, dict]: Permuted graphs, node swaps and triple deviations.
+    """
+    if "knowledge_graph_permutations" in previous:
+        logger.info("Reusing knowledge_graph_permutations from previous outputs...")
+        knowledge_graph_permutations = {
+            experiment_i: dict(kg_perms)
+            for experiment_i, kg_perms in load_permutations(previous).items()
+        }
+        return (
+            knowledge_graph_permutations,
+            previous["node_swaps_tracker"],
+            previous["triple_deviation_pct"],
+        )
+    logger.info("Creating permuted knowledge graphs...")
+    return permute_knowledge_graph.create_permutations(knowledge_graph, semantic_groups)
+
+
+def prune_permutations(
+    outputs: dict, similarity_threshold: float | None, max_num_samples: int
+) -> None:
+    """
+    Drop near-duplicate permutations before sampling, see `graphs.graph_fingerprints`.
+
+    The permutations, node swaps and triple deviations in `outputs` are replaced by
+    those of the kept permutations. The dropped permutations, each with the id of the
+    kept permutation it duplicates, and the number of single conversion requests
+    saved (the sampled permutations beyond what is left) are recorded under
+    "near_duplicate_pruning".
+
+    Args:
+        outputs (dict): Outputs holding the permutations, updated in place.
+        similarity_threshold (float | None): Similarity from which permutations are
+            near-duplicates, None to keep them all.
+        max_num_samples (int): Max number of permutations to sample.
+    """
+    if similarity_threshold is None:
+        return
+    near_duplicates = {}
+    llm_calls_saved = 0
+    # The dicts are rebuilt rather than updated, as they may be shared with the
+    # outputs of other runs (see `run_shared`).
+    knowledge_graph_permutations = {}
+    for experiment_i, kg_perms in outputs["knowledge_graph_permutations"].items():
+        kept, near_duplicates[experiment_i] = prune_near_duplicates(kg_perms, similarity_threshold)
+        llm_calls_saved += min(len(kg_perms), max_num_samples) - min(len(kept), max_num_samples)
+        knowledge_graph_permutations[experiment_i] = kept
+    outputs["knowledge_graph_permutations"] = knowledge_graph_permutations
+    for key in ("node_swaps_tracker", "triple_deviation_pct"):
+        outputs[key] = {
+            experiment_i: {
+                permutation_i: value
+                for permutation_i, value in values.items()
+                if permutation_i in knowledge_graph_permutations[experiment_i]
+            }
+            for experiment_i, values in outputs[key].items()
+        }
+    logger.info(f"Near-duplicate pruning saved {llm_calls_saved} LLM calls")
+    outputs["near_duplicate_pruning"] = {
+        "similarity_threshold": similarity_threshold,
+        "near_duplicates": near_duplicates,
+        "llm_calls_saved": llm_calls_saved,
+    }
+
+
+def summarize_methods(llm: str, sys_prompt: str, paper_text: str) -> tuple[str, float]:
+    """
+    Summarize the methods of the paper.
+
+    Args:
+        llm (str): LLM model to use for processing.
+        sys_prompt (str): System prompt.
+        paper_text (str): Full text of the paper.
+
+    Returns:
+        tuple[str, float]: Summary of the methods and cost of the request.
+    """
+    logger.info("Summarizing methods for paper...")
+    user_prompt = create_user_prompts.summarize_methods(paper_text)
+    summarized_methods, cost = ask_llm_with_schema(llm, sys_prompt, user_prompt, SummarizeMethods)
+    return summarized_methods.methods, cost
+
+
+def create_initial_kg(
+    kg_creator: create_user_prompts.KnowledgeGraphCreator, llm: str, sys_prompt: str
+) -> tuple[dict, float]:
+    """
+    Create the initial knowledge graph of the paper.
+
+    Args:
+        kg_creator (KnowledgeGraphCreator): Prompt creator for the paper.
+        llm (str): LLM model to use for processing.
+        sys_prompt (str): System prompt.
+
+    Returns:
+        tuple[dict, float]: Knowledge graph with experiment_N keys and cost of the request.
+    """
+    logger.info("Creating initial knowledge graph for paper...")
+    user_prompt = kg_creator.create_initial_kg()
+    initial_kg, cost = ask_llm_with_schema(llm, sys_prompt, user_prompt, InitialKG)
+    return initial_kg.to_dict_format(), cost
+
+
+def identify_semantic_groups(
+    kg_creator: create_user_prompts.KnowledgeGraphCreator,
+    llm: str,
+    sys_prompt: str,
+    knowledge_graph: dict,
+) -> tuple[dict, float]:
+    """
+    Identify the semantic groups of the knowledge graph.
+
+    Args:
+        kg_creator (KnowledgeGraphCreator): Prompt creator for the paper.
+        llm (str): LLM model to use for processing.
+        sys_prompt (str): System prompt.
+        knowledge_graph (dict): Knowledge graph with experiment_N keys.
+
+    Returns:
+        tuple[dict, float]: Semantic groups with experiment_N keys and cost of the request.
+    """
+    logger.info("Identifying semantic groups...")
+    user_prompt = kg_creator.identify_semantic_groups(knowledge_graph)
+    identified_semantic_groups, cost = ask_llm_with_schema(
+        llm, sys_prompt, user_prompt, IdentifiedSemanticGroups
+    )
+    return identified_semantic_groups.to_dict_format(), cost
+
+
+def convert_kg_to_text(
+    kg_creator: create_user_prompts.KnowledgeGraphCreator,
+    llm: str,
+    sys_prompt: str,
+    knowledge_graph: dict,
+) -> tuple[dict, float]:
+    """
+    Convert the original knowledge graph of every experiment to text.
+
+    Args:
+        kg_creator (KnowledgeGraphCreator): Prompt creator for the paper.
+        llm (str): LLM model to use for processing.
+        sys_prompt (str): System prompt.
+        knowledge_graph (dict): Knowledge graph with experiment_N keys.
+
+    Returns:
+        tuple[dict, float]: Results paragraphs keyed by experiment and total cost.
+    """
+    logger.info("Converting knowledge graph to text...")
+    results = {}
+    kg_to_text_cost = 0.0
+    for experiment_i in range(1, len(knowledge_graph) + 1):
+        key = f"experiment_{experiment_i}"
+        user_prompt = kg_creator.convert_kg_to_text_single_experiment(knowledge_graph[key])
+        kg_to_text, cost = ask_llm_with_schema(llm, sys_prompt, user_prompt, KGAsText)
+        kg_to_text_cost += cost
+        results[key] = kg_to_text.results
+    return results, kg_to_text_cost
+
+
+def convert_permutations_to_text(
+    kg_creator: create_user_prompts.KnowledgeGraphCreator,
+    llm: str,
+    sys_prompt: str,
+    kg_perms: dict,
+    orig_results: str,
+    packed: bool = False,
+    on_result: Callable[[Any, str], None] | None = None,
+) -> tuple[dict, float]:
+    """
+    Convert permuted knowledge graphs of a single experiment to text.
+
+    If the run budget is exhausted, the permutations converted so far are returned.
+
+    Args:
+        kg_creator (KnowledgeGraphCreator): Prompt creator for the paper.
+        llm (str): LLM model to use for processing.
+        sys_prompt (str): System prompt.
+        kg_perms (dict): Permuted knowledge graphs keyed by permutation id.
+        orig_results (str): Original results used as a style example.
+        packed (bool): Convert several permuted KGs to text per request.
+        on_result (Callable | None): Called with the id and text of each converted permutation.
+
+    Returns:
+        tuple[dict, float]: Results paragraphs keyed by permutation id and total cost.
+    """
+    if packed:
+        return convert_permutations_to_text_packed(
+            kg_creator, llm, sys_prompt, kg_perms, orig_results, on_result=on_result
+        )
+
+    results = {}
+    total_cost = 0.0
+    try:
+        for permutation_i, kg in kg_perms.items():
+            logger.info(f"Converting permutation {permutation_i}...")
+            results[permutation_i], cost = convert_permutation_to_text(
+                kg_creator, llm, sys_prompt, kg, orig_results
+            )
+            total_cost += cost
+            if on_result is not None:
+                on_result(permutation_i, results[permutation_i])
+    except BudgetExceededError:
+        logger.warning("Run budget exhausted, keeping permutations converted so far")
+    return results, total_cost
+
+
+def run_shared(
+    paper_text: str,
+    llm: str = "azure/gpt-4o-2024-08-06",
+    kg_formats: dict[str, str] | None = None,
+    compact_prompts: bool = False,
+) -> dict:
+    """
+    Run the steps whose outputs can be shared by runs with other LLMs.
+
+    Summarizes the methods, creates the knowledge graph, identifies its semantic
+    groups and creates its permutations. Passing the
+    outputs as `previous_outputs` of `run` with any LLM only runs the remaining
+    steps, converting graphs to text, with that LLM; their outputs record this
+    LLM as "extraction_llm".
+
+    Args:
+        paper_text (str): Full text of the paper.
+        llm (str): LLM model extracting the methods, graph and semantic groups.
+        kg_formats (dict | None): Format of the knowledge graphs in each prompt.
+        compact_prompts (bool): Use `prompts.kg_formats.COMPACT_PROMPT_FORMATS`
+            instead of `kg_formats`.
+
+    Returns:
+        dict: The shared outputs, the LLM and their token costs.
+    """
+    if compact_prompts:
+        kg_formats = COMPACT_PROMPT_FORMATS
+    sys_prompt = create_sys_prompts.prompts()
+    kg_creator = create_user_prompts.KnowledgeGraphCreator(paper_text, kg_formats)
+    outputs: dict[str, Any] = {"llm": llm}
+    total_cost: dict[str, float] = {}
+    with profile_stage("methods"):
+        outputs["methods"], total_cost["methods"] = summarize_methods(llm, sys_prompt, paper_text)
+    with profile_stage("knowledge_graph"):
+        outputs["knowledge_graph"], total_cost["res_to_kg"] = create_initial_kg(
+            kg_creator, llm, sys_prompt
+        )
+    outputs["token_cost"] = total_cost
+    if not has_n_experiments(outputs["knowledge_graph"], num_experiments=1):
+        logger.info("Paper has more than 1 experiment, processing is skipped.")
+        return outputs
+
+    with profile_stage("semantic_groups"):
+        outputs["semantic_groups"], total_cost["kg_to_semantic_groups"] = identify_semantic_groups(
+            kg_creator, llm, sys_prompt, outputs["knowledge_graph"]
+        )
+    with profile_stage("knowledge_graph_permutations"):
+        (
+            outputs["knowledge_graph_permutations"],
+            outputs["node_swaps_tracker"],
+            outputs["triple_deviation_pct"],
+        ) = permute_knowledge_graph.create_permutations(
+            outputs["knowledge_graph"], outputs["semantic_groups"]
+        )
+    return outputs
+
+
+def run(
+    paper_text: str,
+    max_num_samples: int = 10,
+    llm: str = "azure/gpt-4o-2024-08-06",
+    packed: bool = False,
+    previous_outputs: dict | None = None,
+    budget: RunBudget | None = None,
+    on_event: Callable[[dict], None] | None = None,
+    compact: bool = False,
+    kg_formats: dict[str, str] | None = None,
+    similarity_threshold: float | None = None,
+    compact_prompts: bool = False,
+) -> dict:
     """
     Process the provided paper text through several NLP steps and return the results.
 
@@ -70,99 +512,251 @@ def run(paper_text: str, max_num_samples: int = 10, llm: str = "azure/gpt-4o-202
       6. Converts the permuted KGs to text.
       7. Aggregates token usage cost metrics.
 
+    When `previous_outputs` of an earlier run with the same LLM are given, every
+    step whose outputs are already present is reused instead of calling the LLM,
+    and only sampled permutations without results are converted to text. Costs of
+    reused steps are carried over, so token costs stay cumulative across runs.
+
+    When a `budget` is given, it is checked before every LLM call. Once exhausted,
+    the run stops early and returns the outputs of the steps completed so far, with
+    the budget usage and the steps that were cut recorded under "budget".
+
+    When `on_event` is given, it is called with a "stage" event holding the
+    outputs and cost of each LLM step as it completes, a "context" event holding
+    the methods and original results before permutations are converted, then a
+    "permutation" event as soon as each permutation text is available, so that
+    evaluators can score permutations while the rest are still being generated.
+
+    When `compact` is set, permutations are stored as id remaps of the original
+    graph rather than full graphs (see `graphs.compact_permutations`).
+
+    `kg_formats` chooses how knowledge graphs are written in the "kg_to_text" and
+    "semantic_groups" prompts. `compact_prompts` stands for
+    `prompts.kg_formats.COMPACT_PROMPT_FORMATS`, which spend fewer tokens per
+    permutation than the default dict repr.
+
+    `previous_outputs` may come from another LLM, e.g. `run_shared`, so that several
+    LLMs convert the same graphs to text; the LLM of the reused steps is recorded
+    under "extraction_llm".
+
+    When `similarity_threshold` is given, permutations whose WL fingerprint is at
+    least that similar to an earlier permutation are dropped before sampling (see
+    `prune_permutations`), so near-duplicates are not converted to text.
+
     Args:
         paper_text (str): Full text of the paper.
         max_num_samples (int): Max number of permutations to sample.
         llm (str): LLM model to use for processing.
+        packed (bool): Convert several permuted KGs to text per request.
+        previous_outputs (dict | None): Outputs of an earlier run to resume from.
+        budget (RunBudget | None): Budget of cost, tokens and wall time of the run.
+        on_event (Callable | None): Called with each event published during the run.
+        compact (bool): Store permutations as id remaps of the original graph.
+        kg_formats (dict | None): Format of the knowledge graphs in each prompt.
+        similarity_threshold (float | None): Similarity from which permutations are
+            dropped as near-duplicates, None to keep them all.
+        compact_prompts (bool): Use `prompts.kg_formats.COMPACT_PROMPT_FORMATS`
+            instead of `kg_formats`.
 
     Returns:
         dict: Dictionary of outputs containing methods summary, knowledge graph,
               semantic groups, conversion results, and token cost details.
     """
+    if compact_prompts:
+        kg_formats = COMPACT_PROMPT_FORMATS
     outputs: dict[str, Any] = {}
     outputs["llm"] = llm
-    total_cost = {}
+    if previous_outputs:
+        extraction_llm = previous_outputs.get("extraction_llm", previous_outputs.get("llm", llm))
+        if extraction_llm != llm:
+            outputs["extraction_llm"] = extraction_llm
+    if kg_formats:
+        outputs["kg_formats"] = kg_formats
+    total_cost: dict[str, float] = {}
+
+    try:
+        with activate_budget(budget):
+            run_steps(
+                outputs,
+                total_cost,
+                paper_text,
+                max_num_samples,
+                llm,
+                packed,
+                previous_outputs or {},
+                on_event or (lambda event: None),
+                kg_formats,
+                similarity_threshold,
+            )
+    except BudgetExceededError:
+        logger.warning("Run budget exhausted, stopping early with partial outputs")
+        total_cost["total"] = sum(total_cost.values())
+        outputs["token_cost"] = total_cost
 
+    if budget is not None:
+        outputs["budget"] = budget.to_dict()
+        if budget.exceeded:
+            # Steps without a cost never ran; if all of them ran, the budget ran
+            # out while converting permutations.
+            cut_steps = [step for step in LLM_STEPS if step not in total_cost]
+            outputs["budget"]["cut_steps"] = cut_steps or ["kg_permutes_to_text"]
+
+    if compact:
+        with profile_stage("compact_permutations"):
+            return compact_outputs(outputs)
+    return outputs
+
+
+def run_steps(
+    outputs: dict,
+    total_cost: dict,
+    paper_text: str,
+    max_num_samples: int,
+    llm: str,
+    packed: bool,
+    previous: dict,
+    on_event: Callable[[dict], None],
+    kg_formats: dict[str, str] | None = None,
+    similarity_threshold: float | None = None,
+) -> None:
+    """
+    Run the pipeline steps, recording outputs and costs as each step completes.
+
+    Args:
+        outputs (dict): Outputs to fill in.
+        total_cost (dict): Token costs to fill in, keyed by step.
+        paper_text (str): Full text of the paper.
+        max_num_samples (int): Max number of permutations to sample.
+        llm (str): LLM model to use for processing.
+        packed (bool): Convert several permuted KGs to text per request.
+        previous (dict): Outputs of an earlier run to resume from, empty if there is none.
+        on_event (Callable): Called with each event published during the run.
+        kg_formats (dict | None): Format of the knowledge graphs in each prompt.
+        similarity_threshold (float | None): Similarity from which permutations are
+            dropped as near-duplicates, None to keep them all.
+    """
     # Create system prompt.
     sys_prompt = create_sys_prompts.prompts()
+    kg_creator = create_user_prompts.KnowledgeGraphCreator(paper_text, kg_formats)
 
     # Summarize methods.
-    logger.info("Summarizing methods for paper...")
-    user_prompt = create_user_prompts.summarize_methods(paper_text)
-    summarize_methods, cost = ask_llm_with_schema(llm, sys_prompt, user_prompt, SummarizeMethods)
-    outputs["methods"] = summarize_methods.methods
-    total_cost["methods"] = cost
+    def run_stage(output_key: str, cost_key: str, step: Callable[[], tuple[Any, float]]) -> None:
+        with profile_stage(output_key):
+            outputs[output_key], total_cost[cost_key] = reuse_or_run(
+                previous, output_key, cost_key, step
+            )
+        on_event(
+            {
+                "event": "stage",
+                "key": output_key,
+                "cost_key": cost_key,
+                "value": outputs[output_key],
+                "cost": total_cost[cost_key],
+            }
+        )
+
+    run_stage("methods", "methods", lambda: summarize_methods(llm, sys_prompt, paper_text))
 
     # Step 1: Create initial knowledge graph conditioned on the full paper.
-    logger.info("Creating initial knowledge graph for paper...")
-    kg_creator = create_user_prompts.KnowledgeGraphCreator(paper_text)
-    user_prompt = kg_creator.create_initial_kg()
-    initial_kg, cost = ask_llm_with_schema(
-        llm,
-        sys_prompt,
-        user_prompt,
-        InitialKG,
+    run_stage(
+        "knowledge_graph", "res_to_kg", lambda: create_initial_kg(kg_creator, llm, sys_prompt)
     )
-    outputs["knowledge_graph"] = initial_kg.to_dict_format()
-    total_cost["res_to_kg"] = cost
 
     # Only proceed if there is exactly one experiment in the knowledge graph.
-    if has_n_experiments(initial_kg, num_experiments=1):
+    if has_n_experiments(outputs["knowledge_graph"], num_experiments=1):
         # Step 2: Convert original KG to text (per experiment).
-        logger.info("Converting knowledge graph to text...")
-        outputs["results"] = {}
-        kg_to_text_cost = 0.0
-        for experiment_i in range(1, len(outputs["knowledge_graph"]) + 1):
-            key = f"experiment_{experiment_i}"
-            user_prompt = kg_creator.convert_kg_to_text_single_experiment(
-                outputs["knowledge_graph"][key]
-            )
-            kg_to_text, cost = ask_llm_with_schema(llm, sys_prompt, user_prompt, KGAsText)
-            kg_to_text_cost += cost
-            outputs["results"][key] = kg_to_text.results
-        total_cost["kg_to_text"] = kg_to_text_cost
+        run_stage(
+            "results",
+            "kg_to_text",
+            lambda: convert_kg_to_text(kg_creator, llm, sys_prompt, outputs["knowledge_graph"]),
+        )
 
         # Step 3: Identify semantic groups.
-        logger.info("Identifying semantic groups...")
-        user_prompt = kg_creator.identify_semantic_groups(outputs["knowledge_graph"])
-        identify_semantic_groups, cost = ask_llm_with_schema(
-            llm, sys_prompt, user_prompt, IdentifiedSemanticGroups
+        run_stage(
+            "semantic_groups",
+            "kg_to_semantic_groups",
+            lambda: identify_semantic_groups(
+                kg_creator, llm, sys_prompt, outputs["knowledge_graph"]
+            ),
         )
-        outputs["semantic_groups"] = identify_semantic_groups.to_dict_format()
-        total_cost["kg_to_semantic_groups"] = cost
 
         # Step 4: Create permuted knowledge graphs.
-        logger.info("Creating permuted knowledge graphs...")
-        (knowledge_graph_permutations, node_swaps_tracker, triple_deviation_pct) = (
-            permute_knowledge_graph.create_permutations(
-                initial_kg.to_dict_format(), identify_semantic_groups.to_dict_format()
+        with profile_stage("knowledge_graph_permutations"):
+            (knowledge_graph_permutations, node_swaps_tracker, triple_deviation_pct) = (
+                reuse_or_create_permutations(
+                    previous, outputs["knowledge_graph"], outputs["semantic_groups"]
+                )
             )
-        )
         outputs["knowledge_graph_permutations"] = knowledge_graph_permutations
         outputs["node_swaps_tracker"] = node_swaps_tracker
         outputs["triple_deviation_pct"] = triple_deviation_pct
+        with profile_stage("near_duplicate_pruning"):
+            prune_permutations(outputs, similarity_threshold, max_num_samples)
+        knowledge_graph_permutations = outputs["knowledge_graph_permutations"]
 
         # Step 5: Convert permuted KGs to text.
         logger.info("Converting permuted knowledge graphs to text...")
+        on_event(
+            {
+                "event": "context",
+                "llm": llm,
+                "methods": outputs["methods"],
+                "results": outputs["results"],
+            }
+        )
         outputs["results_permutations"] = {}
-        kg_permutes_to_text_cost = 0.0
+        kg_permutes_to_text_cost = previous.get("token_cost", {}).get("kg_permutes_to_text", 0.0)
         num_graph_permutations: dict[int | str, int] = {}
+        previous_results_permutations = previous.get("results_permutations", {})
         for experiment_i, kg_perms in knowledge_graph_permutations.items():
-            outputs["results_permutations"][experiment_i] = {}
+            results_permutations_i = dict(previous_results_permutations.get(experiment_i, {}))
             num_graph_permutations[experiment_i] = len(kg_perms)
 
-            for permutation_i, kg in sampling_permutations(kg_perms, max_num_samples):
-                logger.info(f"Converting permutation {permutation_i} for {experiment_i}...")
-                user_prompt = kg_creator.convert_kg_to_text_single_experiment(
-                    kg, orig_results_as_example=outputs["results"][experiment_i]
+            def publish(
+                permutation_i: int | str, text: str, experiment_i: str = experiment_i
+            ) -> None:
+                on_event(
+                    {
+                        "event": "permutation",
+                        "experiment": experiment_i,
+                        "permutation_id": str(permutation_i),
+                        "results": text,
+                    }
+                )
+
+            for permutation_i, text in results_permutations_i.items():
+                publish(permutation_i, text)
+
+            # Only convert sampled permutations which have no results yet.
+            converted = {str(permutation_i) for permutation_i in results_permutations_i}
+            with profile_stage("sampling_permutations"):
+                sampled_perms = {
+                    permutation_i: kg
+                    for permutation_i, kg in sampling_permutations(kg_perms, max_num_samples)
+                    if str(permutation_i) not in converted
+                }
+            if converted:
+                logger.info(
+                    f"Reusing {len(converted)} converted permutations for {experiment_i}, "
+                    f"{len(sampled_perms)} left to convert"
                 )
-                kg_permutes_to_text, cost = ask_llm_with_schema(
-                    llm, sys_prompt, user_prompt, KGAsText
+
+            logger.info(f"Converting permutations for {experiment_i}...")
+            with profile_stage("results_permutations"):
+                results, cost = convert_permutations_to_text(
+                    kg_creator,
+                    llm,
+                    sys_prompt,
+                    sampled_perms,
+                    outputs["results"][experiment_i],
+                    packed,
+                    on_result=publish,
                 )
-                kg_permutes_to_text_cost += cost
-                outputs["results_permutations"][experiment_i][
-                    permutation_i
-                ] = kg_permutes_to_text.results
+            kg_permutes_to_text_cost += cost
+            results_permutations_i.update(results)
+            outputs["results_permutations"][experiment_i] = dict(
+                sorted(results_permutations_i.items(), key=lambda x: int(x[0]))
+            )
 
         # Record number of permutations.
         num_graph_permutations["total"] = sum(num_graph_permutations.values())
@@ -174,5 +768,3 @@ def run(paper_text: str, max_num_samples: int = 10, llm: str = "azure/gpt-4o-202
         outputs["token_cost"] = total_cost
     else:
         logger.info("Paper has more than 1 experiment, processing is skipped.")
-
-    return outputs
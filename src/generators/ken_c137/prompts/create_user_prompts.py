@@ -1,5 +1,7 @@
 """Create user prompts."""
 
+from .kg_formats import KG_FORMATS, format_experiments
+
 
 def summarize_methods(paper_text: str) -> str:
     """Summarize the methods used in the first study/experiment in the paper.
@@ -94,15 +96,38 @@ class KnowledgeGraphCreator:
         1. create_initial_kg: Create a knowledge graph from the full paper
         2. identify_semantic_groups: Group nodes into semantic groups/categories
            and note the level of granularity of each node
+
+    Knowledge graphs given as dicts are serialized in the format chosen for each
+    prompt, "kg_to_text" or "semantic_groups" (see `kg_formats`); strings are
+    used as they are.
     """
 
-    def __init__(self, paper_text: str) -> None:
+    def __init__(self, paper_text: str, kg_formats: dict[str, str] | None = None) -> None:
         """Initialize the KnowledgeGraphCreator.
 
         Args:
             paper_text: The full paper text.
+            kg_formats: Format of the knowledge graphs in each prompt, "dict" by default.
         """
         self.paper_text = paper_text
+        self.kg_formats = kg_formats or {}
+        unknown = set(self.kg_formats.values()) - KG_FORMATS.keys()
+        if unknown:
+            raise ValueError(f"Unknown knowledge graph formats {sorted(unknown)}")
+
+    def format_kg(self, kg: dict | str, prompt: str) -> str:
+        """Serialize a single-experiment knowledge graph in the format of a prompt.
+
+        Args:
+            kg: The knowledge graph, or its serialization.
+            prompt: Name of the prompt, "kg_to_text" or "semantic_groups".
+
+        Returns:
+            The serialized knowledge graph.
+        """
+        if isinstance(kg, str):
+            return kg
+        return KG_FORMATS[self.kg_formats.get(prompt, "dict")](kg)
 
     def create_initial_kg(self) -> str:
         """Create an initial knowledge graph.
@@ -131,15 +156,19 @@ class KnowledgeGraphCreator:
         """  # noqa: E501
         return prompt
 
-    def identify_semantic_groups(self, initial_kg: str) -> str:
+    def identify_semantic_groups(self, initial_kg: dict | str) -> str:
         """Identify semantic groups.
 
         Args:
-            initial_kg: The initial knowledge graph.
+            initial_kg: The initial knowledge graph with experiment_N keys.
 
         Returns:
             A string of the prompt.
         """
+        if isinstance(initial_kg, dict):
+            initial_kg = format_experiments(
+                initial_kg, self.kg_formats.get("semantic_groups", "dict")
+            )
         prompt = f"""
             Now, you are reading a paper, and you have constructed a knowledge graph for the results of the first study/experiment as follows: {initial_kg}.
 
@@ -160,7 +189,7 @@ class KnowledgeGraphCreator:
         return prompt
 
     def convert_kg_to_text_single_experiment(
-        self, kg: str, orig_results_as_example: str | None = None
+        self, kg: dict | str, orig_results_as_example: str | None = None
     ) -> str:
         """Convert a knowledge graph to text.
 
@@ -171,6 +200,7 @@ class KnowledgeGraphCreator:
         Returns:
             A string of the prompt.
         """
+        kg = self.format_kg(kg, "kg_to_text")
         if (
             orig_results_as_example is None
         ):  # Do not use example; this is when converting orig kg to text
@@ -206,3 +236,45 @@ class KnowledgeGraphCreator:
                 Please convert the knowledge graph back to sentences:
             """  # noqa: E501
         return prompt
+
+    def convert_kgs_to_text_packed(
+        self, kgs: dict[str, dict | str], orig_results_as_example: str
+    ) -> str:
+        """Convert several permuted knowledge graphs to text in a single prompt.
+
+        Args:
+            kgs: The knowledge graphs keyed by permutation id.
+            orig_results_as_example: The original results as a string.
+
+        Returns:
+            A string of the prompt.
+        """
+        kg_lines = []
+        for permutation_id, kg in kgs.items():
+            formatted_kg = self.format_kg(kg, "kg_to_text")
+            # Multi-line formats start each graph on its own line.
+            separator = "\n" if "\n" in formatted_kg else " "
+            kg_lines.append(f"Knowledge graph {permutation_id}:{separator}{formatted_kg}")
+        kgs_as_text = "\n".join(kg_lines)
+        prompt = f"""
+            For each of the following knowledge graphs, write a brief paragraph describing the results of main study/experiment.
+            Write each paragraph in standard prose, You are describing the results of a scientific paper to others. Do not refer to the knowledge graph in your answer.
+            Also only describe the results. Do not provide theoretical interpretations of the results.
+            Treat every knowledge graph independently, each paragraph must only describe its own knowledge graph.
+
+            Here are the knowledge graphs:
+            {kgs_as_text}
+
+            Your paragraphs should follow a similar writing style but not its content in this example: {orig_results_as_example}.
+
+            You should return your answer as a json such as:
+            {{
+                "permutations": [
+                    {{"permutation_id": "id of knowledge graph", "results": your summary in a few sentences}},
+                    ...
+                ]
+            }}
+
+            Please convert each knowledge graph back to sentences:
+        """  # noqa: E501
+        return prompt
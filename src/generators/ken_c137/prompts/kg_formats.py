@@ -0,0 +1,89 @@
+"""Serializations of knowledge graphs in prompts.
+
+The "dict" format is the Python repr of the graph, which spends most of its
+tokens on keys, ids and punctuation. "triples" writes one
+`label --relation--> label` line per edge, for prompts which only need the
+content of the graph. "compact" lists every node once with its id, then the
+edges between ids, for prompts whose answer refers to node ids.
+"""
+
+from collections.abc import Callable
+
+
+def kg_as_dict(kg: dict) -> str:
+    """Serialize a knowledge graph as its Python repr.
+
+    Args:
+        kg: Knowledge graph with nodes and edges.
+
+    Returns:
+        The serialized graph.
+    """
+    return str(kg)
+
+
+def kg_as_triples(kg: dict) -> str:
+    """Serialize a knowledge graph as one line per labelled triple.
+
+    Nodes without edges are listed after the triples.
+
+    Args:
+        kg: Knowledge graph with nodes and edges.
+
+    Returns:
+        The serialized graph.
+    """
+    id_to_label = {node["id"]: node["label"] for node in kg["nodes"]}
+    lines = [
+        f"{id_to_label[edge['source']]} --{edge['relation']}--> {id_to_label[edge['target']]}"
+        for edge in kg["edges"]
+    ]
+    connected = {edge["source"] for edge in kg["edges"]} | {edge["target"] for edge in kg["edges"]}
+    isolated = [node["label"] for node in kg["nodes"] if node["id"] not in connected]
+    if isolated:
+        lines.append(f"Unconnected: {'; '.join(isolated)}")
+    return "\n".join(lines)
+
+
+def kg_as_compact(kg: dict) -> str:
+    """Serialize a knowledge graph as its nodes with their ids, then edges between ids.
+
+    Args:
+        kg: Knowledge graph with nodes and edges.
+
+    Returns:
+        The serialized graph.
+    """
+    nodes = "\n".join(f"{node['id']}: {node['label']}" for node in kg["nodes"])
+    edges = "\n".join(
+        f"{edge['source']} --{edge['relation']}--> {edge['target']}" for edge in kg["edges"]
+    )
+    return f"Nodes (id: label):\n{nodes}\nEdges (id --relation--> id):\n{edges}"
+
+
+KG_FORMATS: dict[str, Callable[[dict], str]] = {
+    "dict": kg_as_dict,
+    "triples": kg_as_triples,
+    "compact": kg_as_compact,
+}
+
+# Cheapest format per prompt: conversions to text only need the triples, while
+# semantic groups are answered with node ids.
+COMPACT_PROMPT_FORMATS = {"kg_to_text": "triples", "semantic_groups": "compact"}
+
+
+def format_experiments(knowledge_graph: dict, kg_format: str) -> str:
+    """Serialize a knowledge graph with experiment_N keys.
+
+    Args:
+        knowledge_graph: Knowledge graph of each experiment.
+        kg_format: Name of the format, see `KG_FORMATS`.
+
+    Returns:
+        The serialized graph, one section per experiment in the non-dict formats.
+    """
+    if kg_format == "dict":
+        return kg_as_dict(knowledge_graph)
+    return "\n\n".join(
+        f"{experiment}:\n{KG_FORMATS[kg_format](kg)}" for experiment, kg in knowledge_graph.items()
+    )
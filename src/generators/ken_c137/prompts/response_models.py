@@ -17,6 +17,33 @@ class KGAsText(BaseModel):
     )
 
 
+class PermutationAsText(BaseModel):
+    """Text conversion of a single permuted knowledge graph."""
+
+    permutation_id: str = Field(description="Identifier of the permuted knowledge graph")
+    results: str = Field(
+        description="Brief paragraph describing the results of main study/experiment"
+    )
+
+
+class PackedKGAsText(BaseModel):
+    """Output for convert_kgs_to_text_packed prompt."""
+
+    permutations: list[PermutationAsText] = Field(
+        description="List of results paragraphs, one per permuted knowledge graph"
+    )
+
+    def to_dict_format(self) -> dict[str, str]:
+        """Format PackedKGAsText into a dictionary keyed by permutation id.
+
+        Returns:
+            dict: Results paragraphs keyed by permutation id
+        """
+        return {
+            permutation.permutation_id: permutation.results for permutation in self.permutations
+        }
+
+
 class KGNode(BaseModel):
     """Represents a node in the knowledge graph."""
 
@@ -3,13 +3,244 @@
 import argparse
 import importlib
 import json
+from collections.abc import Callable
 from pathlib import Path
+from types import ModuleType
+from typing import Any
 
-from logger import get_logger
+from corpus import index_output
+from llm.budget import RunBudget
+from logger import get_logger, log_context
+from profiling import StageProfiler, activate_profiler, profile_stage
+
+from .jsonl_outputs import (
+    COMPLETE_EVENT,
+    JsonlWriter,
+    is_complete,
+    is_current,
+    load_partial_outputs,
+    write_json_atomic,
+)
 
 logger = get_logger("generators.main")
 
 
+def load_previous_outputs(output_path: Path) -> dict | None:
+    """Load the outputs of a previous run, preferring a later interrupted streamed run.
+
+    Args:
+        output_path: Path of the generator outputs.
+
+    Returns:
+        The previous outputs, or None if there are none.
+    """
+    log_path = output_path.with_suffix(".jsonl")
+    if is_current(log_path, output_path) and not is_complete(log_path):
+        logger.info(f"Resuming from interrupted run {log_path}")
+        return load_partial_outputs(log_path)
+    if output_path.exists():
+        logger.info(f"Resuming from previous outputs {output_path}")
+        with output_path.open() as f:
+            return json.load(f)
+    return None
+
+
+def log_events(
+    writer: JsonlWriter, on_event: Callable[[dict], None] | None
+) -> Callable[[dict], None]:
+    """Append every generator event to a log before passing it on.
+
+    Args:
+        writer: The log writer.
+        on_event: Optional function also called with each event.
+
+    Returns:
+        The function to pass as the generator's `on_event`.
+    """
+
+    def publish(event: dict) -> None:
+        writer.write(event)
+        if on_event is not None:
+            on_event(event)
+
+    return publish
+
+
+def load_paper_and_generator(doi: str, uid: str) -> tuple[str, ModuleType] | None:
+    """Read a paper and import a generator module.
+
+    Args:
+        doi: DOI of the paper.
+        uid: UID of the generator.
+
+    Returns:
+        The content of the paper and the generator module, or None if either is missing.
+    """
+    paper_path = Path(f"papers/{doi}/original_paper.txt")
+    if not paper_path.exists():
+        logger.error(f"File {paper_path} does not exist")
+        return None
+
+    with paper_path.open("r") as f:
+        paper_content = f.read()
+        logger.info(f"Successfully read file {paper_path}")
+
+    try:
+        module = importlib.import_module(f"generators.{uid}")
+        logger.info(f"Successfully imported module {uid}")
+    except ImportError as e:
+        logger.error(f"Module {uid} does not exist: {e}")
+        return None
+    return paper_content, module
+
+
+def get_output_path(
+    doi: str, uid: str, algo_name: str, llm: str, additional_config: str = ""
+) -> Path:
+    """Get the path of the outputs of a generator run.
+
+    Args:
+        doi: DOI of the paper.
+        uid: UID of the generator.
+        algo_name: Algorithm name.
+        llm: LLM used for processing.
+        additional_config: Optional additional config appended to the output filename.
+
+    Returns:
+        The path, `papers/<doi>/gen_<uid>_<algo_name>_<llm>[_<additional_config>].json`.
+    """
+    output_filename = f"gen_{uid}_{algo_name}_{llm.replace('/', '-')}"
+    if additional_config:
+        output_filename += f"_{additional_config}"
+    output_filename += ".json"
+    return Path(f"papers/{doi}/{output_filename}")
+
+
+def generate(
+    doi: str,
+    uid: str,
+    algo_name: str,
+    llm: str,
+    max_num_samples: int = 10,
+    additional_config: str = "",
+    incremental: bool = False,
+    run_kwargs: dict[str, Any] | None = None,
+    stream_output: bool = False,
+    profiler: StageProfiler | None = None,
+) -> Path | None:
+    """Run a generator on a paper and save its outputs.
+
+    Args:
+        doi: DOI of the paper.
+        uid: UID of the generator.
+        algo_name: Algorithm name.
+        llm: LLM to use for processing.
+        max_num_samples: Maximal number of samples of permutations to generate.
+        additional_config: Optional additional config appended to the output filename.
+        incremental: Reuse existing outputs for the same paper and LLM.
+        run_kwargs: Additional keyword arguments passed to the generator's `run`.
+        stream_output: Append every stage and permutation to a fsynced `.jsonl` log as
+            they are produced, then write the outputs atomically (see `jsonl_outputs`).
+        profiler: Optional profiler of the pipeline stages, whose report is saved
+            next to the outputs as `profile_<outputs filename>`.
+
+    Returns:
+        The path of the saved outputs, or None if the generator could not be run.
+    """
+    run_kwargs = dict(run_kwargs or {})
+    loaded = load_paper_and_generator(doi, uid)
+    if loaded is None:
+        return None
+    paper_content, module = loaded
+    output_path = get_output_path(doi, uid, algo_name, llm, additional_config)
+
+    with activate_profiler(profiler), log_context(run_id=f"{doi}/{output_path.stem}"):
+        saved_path = run_and_save(
+            module,
+            uid,
+            paper_content,
+            max_num_samples,
+            llm,
+            output_path,
+            incremental,
+            run_kwargs,
+            stream_output,
+        )
+    if saved_path is not None and profiler is not None:
+        profiler.save(output_path.parent / f"profile_{output_path.name}")
+    return saved_path
+
+
+def run_and_save(
+    module: ModuleType,
+    uid: str,
+    paper_content: str,
+    max_num_samples: int,
+    llm: str,
+    output_path: Path,
+    incremental: bool,
+    run_kwargs: dict[str, Any],
+    stream_output: bool,
+) -> Path | None:
+    """Run a generator module and save its outputs, see `generate`.
+
+    Args:
+        module: The generator module.
+        uid: UID of the generator.
+        paper_content: The content of the paper.
+        max_num_samples: Maximal number of samples of permutations to generate.
+        llm: LLM to use for processing.
+        output_path: Path of the outputs.
+        incremental: Reuse existing outputs for the same paper and LLM.
+        run_kwargs: Additional keyword arguments passed to the generator's `run`.
+        stream_output: Append every stage and permutation to a fsynced `.jsonl` log.
+
+    Returns:
+        The path of the saved outputs, or None if the generator failed.
+    """
+    previous_outputs = None
+    if incremental:
+        with profile_stage("load_previous_outputs"):
+            previous_outputs = load_previous_outputs(output_path)
+    if previous_outputs is not None:
+        run_kwargs["previous_outputs"] = previous_outputs
+
+    if not stream_output:
+        try:
+            outputs = module.run(paper_content, max_num_samples, llm, **run_kwargs)
+            logger.info(f"Successfully ran module {uid}")
+        except Exception:
+            logger.exception(f"Error running module {uid}")
+            return None
+
+        with profile_stage("save_outputs"), output_path.open("w") as f:
+            json.dump(outputs, f, indent=4)
+            logger.info(f"Successfully saved file {output_path}")
+        # The log of an earlier streamed run no longer matches the outputs.
+        output_path.with_suffix(".jsonl").unlink(missing_ok=True)
+        index_output(output_path)
+        return output_path
+
+    # Keep appending to the log of an interrupted run we are resuming from.
+    log_path = output_path.with_suffix(".jsonl")
+    writer = JsonlWriter(log_path, append=previous_outputs is not None and log_path.exists())
+    run_kwargs["on_event"] = log_events(writer, run_kwargs.get("on_event"))
+    try:
+        outputs = module.run(paper_content, max_num_samples, llm, **run_kwargs)
+        logger.info(f"Successfully ran module {uid}")
+        with profile_stage("save_outputs"):
+            write_json_atomic(outputs, output_path)
+        writer.write({"event": COMPLETE_EVENT})
+        logger.info(f"Successfully saved file {output_path}")
+    except Exception:
+        logger.exception(f"Error running module {uid}, completed stages are kept in {log_path}")
+        return None
+    finally:
+        writer.close()
+    index_output(output_path)
+    return output_path
+
+
 def main() -> None:
     """Main function for running generators."""
     parser = argparse.ArgumentParser()
@@ -25,6 +256,67 @@ def main() -> None:
     parser.add_argument(
         "--llm", type=str, default="azure/gpt-4o-2024-08-06", help="LLM to use for processing"
     )
+    parser.add_argument(
+        "--packed",
+        action="store_true",
+        help="Convert several permutations to text per LLM request",
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Store permutations as id remaps of the original knowledge graph",
+    )
+    parser.add_argument(
+        "--compact-prompts",
+        action="store_true",
+        help="Write knowledge graphs in prompts as triples instead of dicts, to save tokens",
+    )
+    parser.add_argument(
+        "--similarity-threshold",
+        type=float,
+        default=None,
+        help="Drop permutations at least this similar to another one before sampling, e.g. 0.5",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Reuse existing outputs for the same paper and LLM, only converting new permutations",
+    )
+    parser.add_argument(
+        "--max-cost", type=float, default=None, help="Maximal cost of the run in dollars"
+    )
+    parser.add_argument(
+        "--max-tokens", type=int, default=None, help="Maximal number of LLM tokens of the run"
+    )
+    parser.add_argument(
+        "--max-seconds", type=float, default=None, help="Maximal wall-clock time of the run"
+    )
+    parser.add_argument(
+        "--stream-output",
+        action="store_true",
+        help="Append every stage and permutation to a fsynced .jsonl log as they are produced",
+    )
+    parser.add_argument(
+        "--stream-eval",
+        type=str,
+        default="",
+        help="Comma-separated evaluators scoring permutations while they are generated",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Time each pipeline stage and save a profile report next to the outputs",
+    )
+    parser.add_argument(
+        "--profile-hotspots",
+        action="store_true",
+        help="With --profile, run cProfile per stage and report its top functions",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="With --profile, trace allocations per stage and report their peak",
+    )
     parser.add_argument(
         "--additional-config",
         type=str,
@@ -34,45 +326,37 @@ def main() -> None:
 
     args = parser.parse_args()
 
-    doi = args.doi
-    uid = args.gen_uid
-    algo_name = args.algo_name
-    max_num_samples = args.max_num_samples
-    llm = args.llm
-    additional_config = args.additional_config
+    run_kwargs: dict[str, Any] = {"packed": True} if args.packed else {}
+    if args.compact:
+        run_kwargs["compact"] = True
+    if args.compact_prompts:
+        run_kwargs["compact_prompts"] = True
+    if args.similarity_threshold is not None:
+        run_kwargs["similarity_threshold"] = args.similarity_threshold
+    if any(limit is not None for limit in (args.max_cost, args.max_tokens, args.max_seconds)):
+        run_kwargs["budget"] = RunBudget(args.max_cost, args.max_tokens, args.max_seconds)
 
-    paper_path = Path(f"papers/{doi}/original_paper.txt")
-    if not paper_path.exists():
-        logger.error(f"File {paper_path} does not exist")
-        return
+    streaming = None
+    if args.stream_eval:
+        from evaluators.streaming import StreamingEvaluation
 
-    with paper_path.open("r") as f:
-        paper_content = f.read()
-        logger.info(f"Successfully read file {paper_path}")
+        streaming = StreamingEvaluation(args.doi, args.stream_eval.split(","))
+        run_kwargs["on_event"] = streaming.publish
 
-    try:
-        module = importlib.import_module(f"generators.{uid}")
-        logger.info(f"Successfully imported module {uid}")
-    except ImportError as e:
-        logger.error(f"Module {uid} does not exist: {e}")
-        return
-
-    try:
-        outputs = module.run(paper_content, max_num_samples, llm)
-        logger.info(f"Successfully ran module {uid}")
-    except Exception:
-        logger.exception(f"Error running module {uid}")
-        return
-
-    output_filename = f"gen_{uid}_{algo_name}_{llm.replace('/', '-')}"
-    if additional_config:
-        output_filename += f"_{additional_config}"
-    output_filename += ".json"
-    output_path = Path(f"papers/{doi}/{output_filename}")
-
-    with output_path.open("w") as f:
-        json.dump(outputs, f, indent=4)
-        logger.info(f"Successfully saved file {output_path}")
+    output_path = generate(
+        args.doi,
+        args.gen_uid,
+        args.algo_name,
+        args.llm,
+        args.max_num_samples,
+        args.additional_config,
+        args.incremental,
+        run_kwargs,
+        args.stream_output,
+        StageProfiler(args.profile_hotspots, args.profile_memory) if args.profile else None,
+    )
+    if streaming is not None:
+        streaming.finish(output_path)
 
 
 if __name__ == "__main__":
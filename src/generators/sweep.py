@@ -0,0 +1,266 @@
+"""Sweeps of a generator over several LLMs and configs of a paper.
+
+Comparing LLMs with `generators.main` reruns every step of the generator per
+LLM, although the methods, knowledge graph, semantic groups and permutations do
+not depend on the LLM converting graphs to text. A sweep computes these once per
+extraction LLM with the generator's `run_shared`, then runs every combination of
+target LLM and config concurrently from them, so only the remaining steps are
+run per combination. One output is saved per combination, named as by
+`generators.main` with the config and, when it differs from the target LLM, the
+extraction LLM appended; each output records its costs including the shared
+steps. Generators without `run_shared` run every combination from scratch.
+
+    python -m generators.sweep --doi <doi> --gen-uid ken_c137 --algo-name algo1
+        --llms azure/gpt-4o-2024-08-06 openai/gpt-4o-mini
+        --extraction-llms azure/gpt-4o-2024-08-06
+        --config default='{}' --config packed='{"packed": true, "similarity_threshold": 0.5}'
+"""
+
+import argparse
+import json
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import ModuleType
+from typing import Any
+
+from logger import get_logger, log_context
+
+from .main import get_output_path, load_paper_and_generator, run_and_save
+
+logger = get_logger("generators.sweep")
+
+# Name of the config whose outputs are named as those of `generators.main`.
+DEFAULT_CONFIG = "default"
+# Keyword arguments of `run` which the shared outputs depend on, passed to `run_shared`.
+SHARED_KWARGS = ("kg_formats", "compact_prompts")
+
+
+@dataclass
+class Combination:
+    """A run of a sweep: an extraction LLM, a target LLM and a config."""
+
+    extraction_llm: str
+    llm: str
+    config_name: str
+    run_kwargs: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def additional_config(self) -> str:
+        """The suffix of the output filename identifying the config and extraction LLM."""
+        parts = [] if self.config_name == DEFAULT_CONFIG else [self.config_name]
+        if self.extraction_llm != self.llm:
+            parts.append(f"kg-{self.extraction_llm.replace('/', '-')}")
+        return "_".join(parts)
+
+    @property
+    def shared_kwargs(self) -> dict[str, Any]:
+        """The keyword arguments of `run_shared` given by the config."""
+        return {key: self.run_kwargs[key] for key in SHARED_KWARGS if key in self.run_kwargs}
+
+    @property
+    def shared_key(self) -> tuple[str, str]:
+        """The extraction LLM and shared keyword arguments, which the shared outputs depend on."""
+        return self.extraction_llm, json.dumps(self.shared_kwargs, sort_keys=True)
+
+
+def parse_config(config: str) -> tuple[str, dict[str, Any]]:
+    """Parse a config given on the command line.
+
+    Args:
+        config: The config, `<name>=<JSON object of run keyword arguments>`.
+
+    Returns:
+        The name of the config and its keyword arguments of the generator's `run`.
+
+    Raises:
+        ValueError: If the config is not a name and a JSON object.
+    """
+    name, separator, kwargs_json = config.partition("=")
+    run_kwargs = json.loads(kwargs_json or "{}")
+    if not separator or not name or not isinstance(run_kwargs, dict):
+        raise ValueError(f"Config {config!r} is not <name>=<JSON object>")
+    return name, run_kwargs
+
+
+def combinations_of(
+    llms: list[str], extraction_llms: list[str], configs: dict[str, dict[str, Any]]
+) -> list[Combination]:
+    """List the combinations of a sweep.
+
+    Args:
+        llms: The target LLMs.
+        extraction_llms: The extraction LLMs, the first target LLM if empty.
+        configs: Keyword arguments of the generator's `run` by config name.
+
+    Returns:
+        Every combination of extraction LLM, target LLM and config.
+    """
+    return [
+        Combination(extraction_llm, llm, config_name, run_kwargs)
+        for extraction_llm in extraction_llms or llms[:1]
+        for llm in llms
+        for config_name, run_kwargs in (configs or {DEFAULT_CONFIG: {}}).items()
+    ]
+
+
+def run_shared(
+    module: ModuleType, paper_content: str, extraction_llm: str, shared_kwargs: dict[str, Any]
+) -> dict | None:
+    """Run the shared steps of a generator.
+
+    Args:
+        module: The generator module, with a `run_shared` function.
+        paper_content: The content of the paper.
+        extraction_llm: LLM running the shared steps.
+        shared_kwargs: Keyword arguments of `run_shared`, see `SHARED_KWARGS`.
+
+    Returns:
+        The shared outputs, or None if the steps failed.
+    """
+    with log_context(run_id=f"shared/{extraction_llm}"):
+        try:
+            return module.run_shared(paper_content, extraction_llm, **shared_kwargs)
+        except Exception:
+            logger.exception(f"Error running the shared steps with {extraction_llm}")
+            return None
+
+
+def sweep(
+    doi: str,
+    uid: str,
+    algo_name: str,
+    combinations: list[Combination],
+    max_num_samples: int = 10,
+    incremental: bool = False,
+    stream_output: bool = False,
+    max_workers: int | None = None,
+) -> dict[Path, Path | None]:
+    """Run a generator on a paper for every combination of a sweep.
+
+    Args:
+        doi: DOI of the paper.
+        uid: UID of the generator.
+        algo_name: Algorithm name.
+        combinations: The combinations, see `combinations_of`.
+        max_num_samples: Maximal number of samples of permutations to generate.
+        incremental: Reuse existing outputs of each combination.
+        stream_output: Append every stage and permutation to a fsynced `.jsonl` log.
+        max_workers: Maximal number of combinations run at once, all of them if None.
+
+    Returns:
+        The path of the saved outputs, or None if the run failed, by output path.
+    """
+    loaded = load_paper_and_generator(doi, uid)
+    if loaded is None:
+        return {}
+    paper_content, module = loaded
+    output_paths = [
+        get_output_path(doi, uid, algo_name, combination.llm, combination.additional_config)
+        for combination in combinations
+    ]
+
+    # Shared steps are only run for combinations which are not already complete.
+    shared_keys = {
+        combination.shared_key: combination.shared_kwargs
+        for combination, output_path in zip(combinations, output_paths, strict=True)
+        if not (incremental and output_path.exists())
+    }
+    shared: dict[tuple[str, str], dict | None] = {}
+    with ThreadPoolExecutor(max_workers=max_workers or len(combinations)) as executor:
+        if hasattr(module, "run_shared"):
+            logger.info(f"Running the shared steps of {len(shared_keys)} extraction LLMs")
+            shared = dict(
+                zip(
+                    shared_keys,
+                    executor.map(
+                        lambda key: run_shared(module, paper_content, key[0], shared_keys[key]),
+                        shared_keys,
+                    ),
+                    strict=True,
+                )
+            )
+        else:
+            logger.info(f"Generator {uid} has no shared steps, running combinations in full")
+
+        def run_combination(combination: Combination, output_path: Path) -> Path | None:
+            run_kwargs = dict(combination.run_kwargs)
+            if shared.get(combination.shared_key) is not None:
+                run_kwargs["previous_outputs"] = shared[combination.shared_key]
+            with log_context(run_id=f"{doi}/{output_path.stem}"):
+                return run_and_save(
+                    module,
+                    uid,
+                    paper_content,
+                    max_num_samples,
+                    combination.llm,
+                    output_path,
+                    incremental,
+                    run_kwargs,
+                    stream_output,
+                )
+
+        logger.info(f"Running {len(combinations)} combinations")
+        saved_paths = executor.map(run_combination, combinations, output_paths)
+        return dict(zip(output_paths, saved_paths, strict=True))
+
+
+def main() -> None:
+    """Main function for sweeping generators over LLMs and configs."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--doi", type=str, required=True, help="DOI of the paper")
+    parser.add_argument("--gen-uid", type=str, required=True, help="UID of the generator")
+    parser.add_argument("--algo-name", type=str, required=True, help="Algorithm name")
+    parser.add_argument(
+        "--llms", type=str, nargs="+", required=True, help="LLMs converting graphs to text"
+    )
+    parser.add_argument(
+        "--extraction-llms",
+        type=str,
+        nargs="*",
+        default=[],
+        help="LLMs extracting the methods, graph and semantic groups, the first of --llms if none",
+    )
+    parser.add_argument(
+        "--config",
+        type=str,
+        action="append",
+        default=[],
+        help="Config as <name>=<JSON run keyword arguments>, e.g. packed='{\"packed\": true}'",
+    )
+    parser.add_argument(
+        "--max-num-samples",
+        type=int,
+        default=10,
+        help="Maximal number of samples of permutations to generate",
+    )
+    parser.add_argument(
+        "--max-workers", type=int, default=None, help="Maximal number of combinations run at once"
+    )
+    parser.add_argument(
+        "--incremental", action="store_true", help="Reuse existing outputs of each combination"
+    )
+    parser.add_argument(
+        "--stream-output",
+        action="store_true",
+        help="Append every stage and permutation to a fsynced .jsonl log as they are produced",
+    )
+    args = parser.parse_args()
+
+    configs = dict(parse_config(config) for config in args.config)
+    results = sweep(
+        args.doi,
+        args.gen_uid,
+        args.algo_name,
+        combinations_of(args.llms, args.extraction_llms, configs),
+        args.max_num_samples,
+        args.incremental,
+        args.stream_output,
+        args.max_workers,
+    )
+    for output_path, saved_path in results.items():
+        logger.info(f"{output_path}: {'saved' if saved_path is not None else 'failed'}")
+
+
+if __name__ == "__main__":
+    main()
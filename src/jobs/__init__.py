@@ -0,0 +1,6 @@
+"""Durable queue of generation jobs shared by worker processes."""
+
+from .job_queue import JobQueue
+from .worker import run_worker
+
+__all__ = ["JobQueue", "run_worker"]
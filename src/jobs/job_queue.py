@@ -0,0 +1,384 @@
+"""SQLite queue of generation jobs shared by worker processes.
+
+Jobs are the generation jobs of `daemon` (`{"kind": "generate", "doi": ...}`),
+stored once per paper, generator, algorithm, LLM and config, i.e. per output
+file: jobs for the same outputs with other options are rejected while the first
+one is queued or running, and can replace it once finished. A worker claims a
+job by taking a lease on it for a visibility timeout and renews the lease with
+heartbeats while the job runs. Jobs whose lease expired, e.g. because their
+worker crashed, are claimed again by the next worker. Failed jobs are retried
+after a delay doubling with every attempt, and jobs which used up their attempts
+are dead-lettered until requeued. Claims run in `BEGIN IMMEDIATE` transactions,
+so workers in several processes, or on machines sharing the database file on a
+filesystem with working locks, never claim the same job. Leases are compared
+with the wall clock, which must be roughly in sync across machines.
+"""
+
+import json
+import os
+import sqlite3
+import time
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from types import TracebackType
+
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_QUEUE_PATH = Path(os.getenv("ALT_CORE_CACHE_DIR", ".cache")) / "jobs.sqlite"
+# Seconds a claimed job stays invisible to other workers without a heartbeat.
+DEFAULT_VISIBILITY_TIMEOUT = 300.0
+# Attempts of a job, including reclaims after an expired lease, before it is dead-lettered.
+DEFAULT_MAX_ATTEMPTS = 3
+# Delay before the first retry of a failed job, doubled with every attempt.
+DEFAULT_RETRY_DELAY = 60.0
+
+QUEUED = "queued"
+LEASED = "leased"
+DONE = "done"
+DEAD = "dead"
+STATES = (QUEUED, LEASED, DONE, DEAD)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    job_key TEXT NOT NULL UNIQUE,
+    job TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    last_error TEXT,
+    output_path TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, available_at);
+"""
+
+
+def job_key(job: dict) -> str:
+    """Identify the outputs a generation job produces.
+
+    Args:
+        job: The job.
+
+    Returns:
+        The paper, generator, algorithm, LLM and config of the job.
+    """
+    fields = ("doi", "gen_uid", "algo_name", "llm", "additional_config")
+    return "/".join(str(job.get(name, "")) for name in fields)
+
+
+class JobQueue:
+    """Durable queue of generation jobs with leases."""
+
+    def __init__(self, path: Path = DEFAULT_QUEUE_PATH) -> None:
+        """Open the queue, creating it if needed.
+
+        Args:
+            path: Path of the SQLite database.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Transactions are explicit, so that claims can take the write lock upfront.
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self) -> "JobQueue":
+        """Enter the context.
+
+        Returns:
+            The queue.
+        """
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """Close the queue when leaving the context.
+
+        Args:
+            exc_type: Type of the exception raised in the context, if any.
+            exc: Exception raised in the context, if any.
+            traceback: Traceback of the exception, if any.
+        """
+        self.close()
+
+    def close(self) -> None:
+        """Close the queue."""
+        self.connection.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run statements in a transaction taking the write lock upfront.
+
+        Yields:
+            The connection.
+        """
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.connection
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+
+    def _update(self, sql: str, params: tuple) -> int:
+        """Run an update in its own transaction.
+
+        Args:
+            sql: The SQL statement.
+            params: Parameters of the statement.
+
+        Returns:
+            The number of updated jobs.
+        """
+        with self._transaction() as connection:
+            return connection.execute(sql, params).rowcount
+
+    def enqueue(
+        self,
+        jobs: list[dict],
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        requeue_finished: bool = False,
+    ) -> int:
+        """Add jobs to the queue, ignoring those already in it.
+
+        Jobs are identified by the outputs they produce (see `job_key`). A job whose
+        options differ from those of the job in the queue for the same outputs is
+        rejected with a warning, unless it replaces a finished job.
+
+        Args:
+            jobs: The generation jobs.
+            max_attempts: Attempts of each job before it is dead-lettered.
+            requeue_finished: Replace done and dead-lettered jobs for the same outputs
+                with the new jobs, with a new set of attempts.
+
+        Returns:
+            The number of jobs added or requeued.
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            outcomes = Counter(
+                self._enqueue_one(connection, job, max_attempts, requeue_finished, now)
+                for job in jobs
+            )
+        logger.info(
+            f"Enqueued {outcomes['added']} jobs, requeued {outcomes['requeued']} finished jobs, "
+            f"{outcomes['unchanged']} were already queued and {outcomes['conflicting']} conflict "
+            "with queued jobs"
+        )
+        return outcomes["added"] + outcomes["requeued"]
+
+    def _enqueue_one(
+        self,
+        connection: sqlite3.Connection,
+        job: dict,
+        max_attempts: int,
+        requeue_finished: bool,
+        now: float,
+    ) -> str:
+        """Add a job to the queue, see `enqueue`.
+
+        Args:
+            connection: The connection, in a transaction.
+            job: The generation job.
+            max_attempts: Attempts of the job before it is dead-lettered.
+            requeue_finished: Replace a done or dead-lettered job for the same outputs.
+            now: The current time.
+
+        Returns:
+            "added", "requeued", "unchanged" if the job is already in the queue, or
+            "conflicting" if a job with other options is.
+        """
+        key = job_key(job)
+        row = connection.execute("SELECT state, job FROM jobs WHERE job_key = ?", (key,)).fetchone()
+        if row is None:
+            connection.execute(
+                "INSERT INTO jobs (job_key, job, state, max_attempts, available_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, json.dumps(job), QUEUED, max_attempts, now, now),
+            )
+            return "added"
+        if requeue_finished and row["state"] in (DONE, DEAD):
+            connection.execute(
+                "UPDATE jobs SET job = ?, state = ?, attempts = 0, max_attempts = ?, "
+                "available_at = ?, lease_owner = NULL, lease_expires = NULL, last_error = NULL, "
+                "output_path = NULL, updated_at = ? WHERE job_key = ?",
+                (json.dumps(job), QUEUED, max_attempts, now, now, key),
+            )
+            return "requeued"
+        if json.loads(row["job"]) != job:
+            logger.warning(f"Job {key} is already {row['state']} with other options, not enqueued")
+            return "conflicting"
+        return "unchanged"
+
+    def claim(
+        self, owner: str, visibility_timeout: float = DEFAULT_VISIBILITY_TIMEOUT
+    ) -> tuple[int, dict] | None:
+        """Lease the next available job.
+
+        Jobs whose lease expired are dead-lettered if they used up their attempts,
+        and can be claimed again otherwise.
+
+        Args:
+            owner: Identifier of the claiming worker.
+            visibility_timeout: Seconds before the lease expires without a heartbeat.
+
+        Returns:
+            The id and the job, or None if no job is available.
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            connection.execute(
+                "UPDATE jobs SET state = ?, last_error = 'Lease expired', lease_owner = NULL, "
+                "updated_at = ? "
+                "WHERE state = ? AND lease_expires <= ? AND attempts >= max_attempts",
+                (DEAD, now, LEASED, now),
+            )
+            row = connection.execute(
+                "SELECT id, job FROM jobs WHERE (state = ? AND available_at <= ?) "
+                "OR (state = ? AND lease_expires <= ?) ORDER BY id LIMIT 1",
+                (QUEUED, now, LEASED, now),
+            ).fetchone()
+            if row is not None:
+                connection.execute(
+                    "UPDATE jobs SET state = ?, attempts = attempts + 1, lease_owner = ?, "
+                    "lease_expires = ?, updated_at = ? WHERE id = ?",
+                    (LEASED, owner, now + visibility_timeout, now, row["id"]),
+                )
+        return None if row is None else (row["id"], json.loads(row["job"]))
+
+    def heartbeat(
+        self, job_id: int, owner: str, visibility_timeout: float = DEFAULT_VISIBILITY_TIMEOUT
+    ) -> bool:
+        """Extend the lease of a running job.
+
+        Args:
+            job_id: Id of the job.
+            owner: Identifier of the worker running it.
+            visibility_timeout: Seconds from now before the lease expires.
+
+        Returns:
+            False if the worker lost the lease, e.g. because it expired and the job was
+            claimed by another worker.
+        """
+        now = time.time()
+        return (
+            self._update(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? "
+                "WHERE id = ? AND state = ? AND lease_owner = ?",
+                (now + visibility_timeout, now, job_id, LEASED, owner),
+            )
+            == 1
+        )
+
+    def complete(self, job_id: int, owner: str, output_path: str) -> bool:
+        """Mark a job as done.
+
+        Args:
+            job_id: Id of the job.
+            owner: Identifier of the worker which ran it.
+            output_path: Path of the saved outputs.
+
+        Returns:
+            False if the worker had lost the lease.
+        """
+        return (
+            self._update(
+                "UPDATE jobs SET state = ?, output_path = ?, lease_owner = NULL, "
+                "last_error = NULL, updated_at = ? WHERE id = ? AND state = ? AND lease_owner = ?",
+                (DONE, output_path, time.time(), job_id, LEASED, owner),
+            )
+            == 1
+        )
+
+    def fail(
+        self, job_id: int, owner: str, error: str, retry_delay: float = DEFAULT_RETRY_DELAY
+    ) -> bool:
+        """Record a failed attempt, retrying the job later or dead-lettering it.
+
+        Args:
+            job_id: Id of the job.
+            owner: Identifier of the worker which ran it.
+            error: Description of the failure.
+            retry_delay: Delay before the first retry, doubled with every attempt.
+
+        Returns:
+            False if the worker had lost the lease.
+        """
+        now = time.time()
+        return (
+            self._update(
+                "UPDATE jobs SET state = CASE WHEN attempts >= max_attempts THEN ? ELSE ? END, "
+                "available_at = ? + ? * (1 << (attempts - 1)), last_error = ?, "
+                "lease_owner = NULL, updated_at = ? WHERE id = ? AND state = ? AND lease_owner = ?",
+                (DEAD, QUEUED, now, retry_delay, error, now, job_id, LEASED, owner),
+            )
+            == 1
+        )
+
+    def release(self, job_id: int, owner: str) -> bool:
+        """Give a job back without counting the attempt, e.g. when a worker stops.
+
+        Args:
+            job_id: Id of the job.
+            owner: Identifier of the worker running it.
+
+        Returns:
+            False if the worker had lost the lease.
+        """
+        now = time.time()
+        return (
+            self._update(
+                "UPDATE jobs SET state = ?, attempts = attempts - 1, available_at = ?, "
+                "lease_owner = NULL, updated_at = ? WHERE id = ? AND state = ? AND lease_owner = ?",
+                (QUEUED, now, now, job_id, LEASED, owner),
+            )
+            == 1
+        )
+
+    def requeue_dead(self) -> int:
+        """Give dead-lettered jobs a new set of attempts.
+
+        Returns:
+            The number of requeued jobs.
+        """
+        now = time.time()
+        return self._update(
+            "UPDATE jobs SET state = ?, attempts = 0, available_at = ?, updated_at = ? "
+            "WHERE state = ?",
+            (QUEUED, now, now, DEAD),
+        )
+
+    def counts(self) -> dict[str, int]:
+        """Count the jobs in each state.
+
+        Returns:
+            The number of jobs by state.
+        """
+        counts = dict.fromkeys(STATES, 0)
+        for row in self.connection.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state"):
+            counts[row[0]] = row[1]
+        return counts
+
+    def jobs(self, state: str) -> list[sqlite3.Row]:
+        """List the jobs in a state.
+
+        Args:
+            state: The state, one of `STATES`.
+
+        Returns:
+            The rows of the jobs, by id.
+        """
+        return self.connection.execute(
+            "SELECT * FROM jobs WHERE state = ? ORDER BY id", (state,)
+        ).fetchall()
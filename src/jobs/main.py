@@ -0,0 +1,198 @@
+"""Command line of the generation job queue.
+
+Enqueue a generation job for every paper under `papers/` and LLM, start workers
+(on this machine, or on others sharing the queue file), and follow the queue:
+
+    python -m jobs.main enqueue --gen-uid ken_c137 --algo-name algo1 --llm azure/gpt-4o-2024-08-06
+    python -m jobs.main work --workers 4
+    python -m jobs.main status
+    python -m jobs.main requeue-dead
+"""
+
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from generators.main import get_output_path
+from logger import get_logger
+
+from .job_queue import (
+    DEAD,
+    DEFAULT_MAX_ATTEMPTS,
+    DEFAULT_QUEUE_PATH,
+    DEFAULT_RETRY_DELAY,
+    DEFAULT_VISIBILITY_TIMEOUT,
+    LEASED,
+    JobQueue,
+)
+from .worker import DEFAULT_POLL_SECONDS, run_worker
+
+logger = get_logger("jobs.main")
+
+# Options of generation jobs, as sent to the daemon, copied from the command line.
+JOB_OPTIONS = ("packed", "compact", "compact_prompts", "similarity_threshold")
+
+
+def jobs_for_papers(
+    gen_uid: str,
+    algo_name: str,
+    llms: list[str],
+    options: dict,
+    papers_dir: Path = Path("papers"),
+    skip_existing: bool = True,
+) -> list[dict]:
+    """List a generation job per paper and LLM.
+
+    Args:
+        gen_uid: UID of the generator.
+        algo_name: Algorithm name.
+        llms: LLMs to run the generator with.
+        options: Further fields of the jobs, e.g. "max_num_samples" or "packed".
+        papers_dir: Directory holding one directory per paper.
+        skip_existing: Leave out jobs whose outputs already exist.
+
+    Returns:
+        The jobs.
+    """
+    jobs = []
+    for paper_path in sorted(papers_dir.glob("*/original_paper.txt")):
+        doi = paper_path.parent.name
+        for llm in llms:
+            output_path = get_output_path(
+                doi, gen_uid, algo_name, llm, options.get("additional_config", "")
+            )
+            if skip_existing and (paper_path.parent / output_path.name).exists():
+                continue
+            jobs.append(
+                {
+                    "kind": "generate",
+                    "doi": doi,
+                    "gen_uid": gen_uid,
+                    "algo_name": algo_name,
+                    "llm": llm,
+                    **options,
+                }
+            )
+    return jobs
+
+
+def print_status(queue: JobQueue) -> None:
+    """Print the number of jobs in each state, leased jobs and dead-lettered jobs.
+
+    Args:
+        queue: The queue.
+    """
+    print(", ".join(f"{count} {state}" for state, count in queue.counts().items()))
+    now = time.time()
+    for row in queue.jobs(LEASED):
+        print(
+            f"leased {row['id']} {row['job_key']}: attempt {row['attempts']} by "
+            f"{row['lease_owner']}, lease expires in {row['lease_expires'] - now:.0f}s"
+        )
+    for row in queue.jobs(DEAD):
+        print(f"dead {row['id']} {row['job_key']}: {row['last_error']}")
+
+
+def main() -> None:
+    """Main function of the job queue command line."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--queue", type=Path, default=DEFAULT_QUEUE_PATH, help="Path of the queue database"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    enqueue_parser = subparsers.add_parser("enqueue", help="Enqueue a job per paper and LLM")
+    enqueue_parser.add_argument("--gen-uid", type=str, required=True, help="UID of the generator")
+    enqueue_parser.add_argument("--algo-name", type=str, required=True, help="Algorithm name")
+    enqueue_parser.add_argument("--llm", type=str, nargs="+", required=True, help="LLMs to run")
+    enqueue_parser.add_argument(
+        "--max-num-samples", type=int, default=10, help="Max number of permutations to convert"
+    )
+    enqueue_parser.add_argument("--packed", action="store_true", help="Pack permutations")
+    enqueue_parser.add_argument("--compact", action="store_true", help="Store id remaps")
+    enqueue_parser.add_argument(
+        "--compact-prompts", action="store_true", help="Write graphs in prompts as triples"
+    )
+    enqueue_parser.add_argument(
+        "--similarity-threshold", type=float, default=None, help="Drop near-duplicate permutations"
+    )
+    enqueue_parser.add_argument(
+        "--additional-config", type=str, default="", help="Optional additional config"
+    )
+    enqueue_parser.add_argument(
+        "--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS, help="Attempts per job"
+    )
+    enqueue_parser.add_argument(
+        "--include-existing", action="store_true", help="Enqueue papers with existing outputs"
+    )
+
+    work_parser = subparsers.add_parser("work", help="Run jobs until stopped")
+    work_parser.add_argument("--workers", type=int, default=1, help="Number of worker processes")
+    work_parser.add_argument(
+        "--visibility-timeout",
+        type=float,
+        default=DEFAULT_VISIBILITY_TIMEOUT,
+        help="Seconds before the job of a silent worker is reclaimed",
+    )
+    work_parser.add_argument(
+        "--retry-delay",
+        type=float,
+        default=DEFAULT_RETRY_DELAY,
+        help="Seconds before the first retry of a failed job, doubled per attempt",
+    )
+    work_parser.add_argument(
+        "--poll-seconds", type=float, default=DEFAULT_POLL_SECONDS, help="Idle polling interval"
+    )
+    work_parser.add_argument(
+        "--exit-when-idle", action="store_true", help="Stop once no job is available"
+    )
+
+    subparsers.add_parser("status", help="Show the jobs of the queue")
+    subparsers.add_parser("requeue-dead", help="Give dead-lettered jobs new attempts")
+    args = parser.parse_args()
+
+    if args.command == "enqueue":
+        options = {"max_num_samples": args.max_num_samples}
+        if args.additional_config:
+            options["additional_config"] = args.additional_config
+        for option in JOB_OPTIONS:
+            if getattr(args, option) not in (None, False):
+                options[option] = getattr(args, option)
+        jobs = jobs_for_papers(
+            args.gen_uid,
+            args.algo_name,
+            args.llm,
+            options,
+            skip_existing=not args.include_existing,
+        )
+        # Jobs with existing outputs were left out unless --include-existing, so the
+        # finished jobs left for the same outputs are run again.
+        with JobQueue(args.queue) as queue:
+            queue.enqueue(jobs, args.max_attempts, requeue_finished=True)
+    elif args.command == "work":
+        worker_args = (
+            args.queue,
+            None,
+            args.visibility_timeout,
+            args.retry_delay,
+            args.poll_seconds,
+            args.exit_when_idle,
+        )
+        if args.workers == 1:
+            run_worker(*worker_args)
+        else:
+            with ProcessPoolExecutor(max_workers=args.workers) as executor:
+                futures = [executor.submit(run_worker, *worker_args) for _ in range(args.workers)]
+                for future in futures:
+                    future.result()
+    elif args.command == "status":
+        with JobQueue(args.queue) as queue:
+            print_status(queue)
+    else:
+        with JobQueue(args.queue) as queue:
+            logger.info(f"Requeued {queue.requeue_dead()} dead-lettered jobs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Workers running the generation jobs of a `JobQueue`.
+
+A worker claims one job at a time and runs it with `daemon.server.run_job`, i.e.
+through `generators.main.generate` and the generator's `run`. Jobs always run
+with `incremental` and `stream_output`, so a job reclaimed after its worker
+crashed resumes from the stages and permutations already logged. A background
+thread renews the lease while the job runs. A worker stopped with Ctrl-C gives
+its job back without counting the attempt.
+"""
+
+import os
+import socket
+import threading
+import time
+from pathlib import Path
+
+from daemon.server import run_job
+from logger import get_logger, log_context
+
+from .job_queue import (
+    DEFAULT_QUEUE_PATH,
+    DEFAULT_RETRY_DELAY,
+    DEFAULT_VISIBILITY_TIMEOUT,
+    JobQueue,
+)
+
+logger = get_logger(__name__)
+
+# Seconds between two claims when no job is available.
+DEFAULT_POLL_SECONDS = 5.0
+# Heartbeats per visibility timeout, so a late heartbeat does not lose the lease.
+HEARTBEATS_PER_TIMEOUT = 3
+
+
+def send_heartbeats(
+    queue_path: Path, job_id: int, owner: str, visibility_timeout: float, stop: threading.Event
+) -> None:
+    """Renew the lease of a job until stopped.
+
+    Args:
+        queue_path: Path of the queue database.
+        job_id: Id of the job.
+        owner: Identifier of the worker running it.
+        visibility_timeout: Seconds a lease lasts.
+        stop: Set when the job has finished.
+    """
+    # SQLite connections belong to the thread which opened them.
+    with JobQueue(queue_path) as queue:
+        while not stop.wait(visibility_timeout / HEARTBEATS_PER_TIMEOUT):
+            if not queue.heartbeat(job_id, owner, visibility_timeout):
+                logger.warning(f"Lost the lease of job {job_id}, another worker may run it")
+                return
+
+
+def run_claimed_job(
+    queue: JobQueue,
+    queue_path: Path,
+    job_id: int,
+    job: dict,
+    owner: str,
+    visibility_timeout: float = DEFAULT_VISIBILITY_TIMEOUT,
+    retry_delay: float = DEFAULT_RETRY_DELAY,
+) -> bool:
+    """Run a claimed job and record its outcome.
+
+    Args:
+        queue: The queue.
+        queue_path: Path of the queue database, opened again by the heartbeat thread.
+        job_id: Id of the job.
+        job: The job.
+        owner: Identifier of the worker.
+        visibility_timeout: Seconds a lease lasts.
+        retry_delay: Delay before the first retry of a failed job.
+
+    Returns:
+        True if the job succeeded.
+    """
+    stop = threading.Event()
+    heartbeats = threading.Thread(
+        target=send_heartbeats,
+        args=(queue_path, job_id, owner, visibility_timeout, stop),
+        daemon=True,
+    )
+    heartbeats.start()
+    output_path = None
+    error = "Generator failed, see the worker logs"
+    try:
+        try:
+            output_path = run_job({**job, "incremental": True, "stream_output": True})
+        finally:
+            stop.set()
+            heartbeats.join()
+    except Exception as e:
+        logger.exception(f"Job {job_id} failed")
+        error = repr(e)
+    except BaseException:
+        queue.release(job_id, owner)
+        raise
+
+    if output_path is None:
+        queue.fail(job_id, owner, error, retry_delay)
+        return False
+    if not queue.complete(job_id, owner, str(output_path)):
+        logger.warning(f"Job {job_id} completed after losing its lease")
+    return True
+
+
+def run_worker(
+    queue_path: Path = DEFAULT_QUEUE_PATH,
+    owner: str | None = None,
+    visibility_timeout: float = DEFAULT_VISIBILITY_TIMEOUT,
+    retry_delay: float = DEFAULT_RETRY_DELAY,
+    poll_seconds: float = DEFAULT_POLL_SECONDS,
+    exit_when_idle: bool = False,
+) -> dict[str, int]:
+    """Run jobs of the queue until stopped.
+
+    Args:
+        queue_path: Path of the queue database.
+        owner: Identifier of the worker, `<host>:<pid>` if None.
+        visibility_timeout: Seconds a lease lasts without a heartbeat.
+        retry_delay: Delay before the first retry of a failed job.
+        poll_seconds: Seconds between two claims when no job is available.
+        exit_when_idle: Return once no job is available instead of polling.
+
+    Returns:
+        The number of succeeded and failed jobs.
+    """
+    owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+    stats = {"succeeded": 0, "failed": 0}
+    with JobQueue(queue_path) as queue, log_context(worker=owner):
+        logger.info(f"Worker {owner} started")
+        while True:
+            claimed = queue.claim(owner, visibility_timeout)
+            if claimed is None:
+                if exit_when_idle:
+                    break
+                time.sleep(poll_seconds)
+                continue
+            job_id, job = claimed
+            logger.info(f"Running job {job_id}: {job['doi']} with {job['llm']}")
+            succeeded = run_claimed_job(
+                queue, queue_path, job_id, job, owner, visibility_timeout, retry_delay
+            )
+            stats["succeeded" if succeeded else "failed"] += 1
+    logger.info(
+        f"Worker {owner} finished: {stats['succeeded']} succeeded, {stats['failed']} failed"
+    )
+    return stats
@@ -0,0 +1,140 @@
+"""Run-level budgets on LLM cost, tokens and wall-clock time."""
+
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# Expected number of completion tokens of a single request, used to estimate its cost.
+EXPECTED_COMPLETION_TOKENS = 1000
+
+_active_budget: ContextVar["RunBudget | None"] = ContextVar("active_budget", default=None)
+
+
+class BudgetExceededError(RuntimeError):
+    """Raised when an LLM call would exceed the run budget."""
+
+
+class RunBudget:
+    """Budget of a single run, checked before every LLM call."""
+
+    def __init__(
+        self,
+        max_cost: float | None = None,
+        max_tokens: int | None = None,
+        max_seconds: float | None = None,
+    ) -> None:
+        """Initialize the budget.
+
+        Args:
+            max_cost: Maximal cost of the run in dollars.
+            max_tokens: Maximal number of prompt and completion tokens of the run.
+            max_seconds: Maximal wall-clock time of the run in seconds.
+        """
+        self.max_cost = max_cost
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+        self.spent_cost = 0.0
+        self.spent_tokens = 0
+        self.start_time = time.time()
+        self.exceeded: str | None = None
+
+    def elapsed_seconds(self) -> float:
+        """Get the wall-clock time since the budget was created.
+
+        Returns:
+            The elapsed time in seconds.
+        """
+        return time.time() - self.start_time
+
+    def check(self, model: str, prompt_tokens: int) -> None:
+        """Check that a request fits in the remaining budget.
+
+        Args:
+            model: The model to use.
+            prompt_tokens: The number of tokens of the prompt.
+
+        Raises:
+            BudgetExceededError: If the request would exceed the budget.
+        """
+        from litellm import cost_per_token
+
+        estimated_tokens = prompt_tokens + EXPECTED_COMPLETION_TOKENS
+        try:
+            prompt_cost, completion_cost = cost_per_token(
+                model=model,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=EXPECTED_COMPLETION_TOKENS,
+            )
+            estimated_cost = prompt_cost + completion_cost
+        except Exception:
+            logger.debug(f"No pricing known for {model}, estimating cost as 0")
+            estimated_cost = 0.0
+
+        if self.max_seconds is not None and self.elapsed_seconds() > self.max_seconds:
+            self.exceeded = f"wall time exceeded {self.max_seconds}s"
+        elif self.max_tokens is not None and self.spent_tokens + estimated_tokens > self.max_tokens:
+            self.exceeded = f"tokens would exceed {self.max_tokens}"
+        elif self.max_cost is not None and self.spent_cost + estimated_cost > self.max_cost:
+            self.exceeded = f"cost would exceed ${self.max_cost}"
+        else:
+            return
+
+        logger.warning(f"Run budget exhausted: {self.exceeded}")
+        raise BudgetExceededError(self.exceeded)
+
+    def record(self, tokens: int, cost: float) -> None:
+        """Record the usage of a completed request.
+
+        Args:
+            tokens: The number of prompt and completion tokens used.
+            cost: The cost of the request.
+        """
+        self.spent_tokens += tokens
+        self.spent_cost += cost
+
+    def to_dict(self) -> dict:
+        """Summarize the budget and its usage.
+
+        Returns:
+            The limits, the usage and the reason the budget was exceeded, if it was.
+        """
+        return {
+            "max_cost": self.max_cost,
+            "max_tokens": self.max_tokens,
+            "max_seconds": self.max_seconds,
+            "spent_cost": self.spent_cost,
+            "spent_tokens": self.spent_tokens,
+            "elapsed_seconds": self.elapsed_seconds(),
+            "exceeded": self.exceeded,
+        }
+
+
+@contextmanager
+def activate_budget(budget: RunBudget | None) -> Iterator[None]:
+    """Make a budget apply to all LLM calls made within the context.
+
+    Args:
+        budget: The budget to activate, or None for no budget.
+
+    Yields:
+        None.
+    """
+    token = _active_budget.set(budget)
+    try:
+        yield
+    finally:
+        _active_budget.reset(token)
+
+
+def get_active_budget() -> RunBudget | None:
+    """Get the budget applying to LLM calls in the current context.
+
+    Returns:
+        The active budget, or None.
+    """
+    return _active_budget.get()
@@ -1,23 +1,43 @@
 """LLM caller module."""
 
 import asyncio
-import os
+import functools
+import threading
 import time
+from collections import deque
+from collections.abc import Awaitable, Callable
 from typing import TypeVar
 
-from dotenv import load_dotenv
-from litellm import (
-    acompletion,
-    completion,
-    supports_response_schema,
-    token_counter,
-)
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 
 from logger import get_logger
 
+from .budget import get_active_budget
+from .clients import get_shared_clients
+from .coalescing import request_key, single_flight
+from .config import get_config, supports_schema
+from .repair import REPAIR_SYS_PROMPT, parse_locally, repair_prompt
+from .telemetry import get_telemetry
+
 logger = get_logger(__name__)
 T = TypeVar("T", bound=BaseModel)
+R = TypeVar("R")
+
+# Interval at which callers waiting for a request slot check again.
+SLOT_POLL_SECONDS = 0.05
+# Delay before the first retry of a 429 response which did not say how long to wait,
+# doubled on each further retry.
+DEFAULT_THROTTLE_PAUSE = 1.0
+# Retries of a request rejected with HTTP 429 when adaptive concurrency is enabled.
+MAX_THROTTLE_RETRIES = 5
+# Fraction of the configured tokens per minute given back per round of successful requests.
+TPM_INCREASE_FRACTION = 0.05
+# Lowest tokens per minute, as a fraction of the configured ones.
+MIN_TPM_FRACTION = 0.1
+# Weight of the latest latency in the moving average of each call name.
+LATENCY_SMOOTHING = 0.2
+# Latencies of a call name seen before its inflation is judged.
+MIN_LATENCY_SAMPLES = 5
 
 
 class MinuteRateLimiter:
@@ -32,6 +52,18 @@ class MinuteRateLimiter:
         self.tokens_per_minute = tokens_per_minute
         self.tokens_available = tokens_per_minute
         self.last_refill_time = time.time()
+        # Guards the bucket when several threads share the limiter, e.g. daemon jobs.
+        self._lock = threading.Lock()
+
+    def set_tokens_per_minute(self, tokens_per_minute: int) -> None:
+        """Change the rate, keeping the tokens available within the new rate.
+
+        Args:
+            tokens_per_minute: The number of tokens per minute.
+        """
+        with self._lock:
+            self.tokens_per_minute = tokens_per_minute
+            self.tokens_available = min(self.tokens_available, tokens_per_minute)
 
     def _try_acquire(self, tokens: int) -> bool:
         """Try to acquire tokens.
@@ -42,22 +74,25 @@ class MinuteRateLimiter:
         Returns:
             True if tokens were acquired, False otherwise.
         """
-        now = time.time()
-        minutes_passed = (now - self.last_refill_time) / 60.0
-
-        # Refill tokens based on time passed
-        self.tokens_available = int(
-            min(
-                self.tokens_per_minute,
-                self.tokens_available + minutes_passed * self.tokens_per_minute,
+        with self._lock:
+            now = time.time()
+            minutes_passed = (now - self.last_refill_time) / 60.0
+
+            # Refill tokens based on time passed
+            self.tokens_available = int(
+                min(
+                    self.tokens_per_minute,
+                    self.tokens_available + minutes_passed * self.tokens_per_minute,
+                )
             )
-        )
-        self.last_refill_time = now
+            self.last_refill_time = now
 
-        if self.tokens_available >= tokens:
-            self.tokens_available -= tokens
-            return True
-        return False
+            # A request larger than the bucket is let through once the bucket is full,
+            # leaving the bucket in debt, rather than waiting forever.
+            if self.tokens_available >= min(tokens, self.tokens_per_minute):
+                self.tokens_available -= tokens
+                return True
+            return False
 
     def acquire(self, tokens: int) -> None:
         """Acquire tokens synchronously.
@@ -65,8 +100,13 @@ class MinuteRateLimiter:
         Args:
             tokens: The number of tokens to acquire.
         """
+        start = time.perf_counter()
+        waited = False
         while not self._try_acquire(tokens):
+            waited = True
             time.sleep(1)
+        if waited:
+            get_telemetry().record_rate_limit_wait(time.perf_counter() - start)
 
     async def async_acquire(self, tokens: int) -> None:
         """Acquire tokens asynchronously.
@@ -74,12 +114,451 @@ class MinuteRateLimiter:
         Args:
             tokens: The number of tokens to acquire.
         """
+        start = time.perf_counter()
+        waited = False
         while not self._try_acquire(tokens):
+            waited = True
             await asyncio.sleep(1)
+        if waited:
+            get_telemetry().record_rate_limit_wait(time.perf_counter() - start)
+
+
+@functools.cache
+def get_rate_limiter() -> MinuteRateLimiter:
+    """Get the rate limiter shared by all LLM calls of the process.
+
+    Returns:
+        The rate limiter.
+    """
+    return MinuteRateLimiter(tokens_per_minute=get_config().max_tokens_per_minute)
+
+
+class AdaptiveConcurrency:
+    """AIMD controller of the requests in flight and of the tokens per minute of the rate limiter.
+
+    Every successful request raises the in-flight limit by 1 / limit, i.e. by about
+    one request per round of requests, and the tokens per minute by a fraction of
+    the configured ones. A moving average latency inflated well above the lowest
+    one seen for its call name cuts the in-flight limit by `decrease_factor`, and
+    so does a request throttled with HTTP 429. When the provider says it
+    throttled on tokens, the tokens per minute are cut as well, to
+    `decrease_factor` times the tokens actually sent over the last minute, as
+    cutting a configured rate the run never reached would not slow it down,
+    and never below the largest prompt sent. Limits are cut at most once per
+    cooldown, so a burst of rejections counts once; the `retry-after` delay of a
+    429 extends that cooldown.
+    """
+
+    def __init__(
+        self,
+        rate_limiter: MinuteRateLimiter,
+        max_concurrency: int,
+        min_concurrency: int = 1,
+        decrease_factor: float = 0.5,
+        latency_inflation: float = 2.0,
+    ) -> None:
+        """Initialize the controller at its maximal limits.
+
+        Args:
+            rate_limiter: The rate limiter whose tokens per minute are adapted.
+            max_concurrency: Maximal number of requests in flight.
+            min_concurrency: Minimal number of requests in flight.
+            decrease_factor: Factor applied to the limits when the provider pushes back.
+            latency_inflation: Ratio to the lowest latency treated as a provider under load.
+        """
+        self.rate_limiter = rate_limiter
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.decrease_factor = decrease_factor
+        self.latency_inflation = latency_inflation
+        self.max_tokens_per_minute = rate_limiter.tokens_per_minute
+        self.limit = float(max_concurrency)
+        self.tokens_per_minute = float(rate_limiter.tokens_per_minute)
+        self.in_flight = 0
+        self.throttles = 0
+        self.decreases = 0
+        self.wait_seconds = 0.0
+        self.cooldown_until = 0.0
+        self.start_time = time.monotonic()
+        self._sent: deque[tuple[float, int]] = deque()
+        self._sent_tokens = 0
+        self.max_prompt_tokens = 0
+        self._latency_average: dict[str, float] = {}
+        self._latency_samples: dict[str, int] = {}
+        self._latency_baseline: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _snapshot(self) -> dict[str, float]:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "tokens_per_minute": int(self.tokens_per_minute),
+            "throttles": self.throttles,
+            "decreases": self.decreases,
+            "wait_seconds": self.wait_seconds,
+        }
+
+    def state(self) -> dict[str, float]:
+        """Get the current limits and counters of the controller.
+
+        Returns:
+            The in-flight limit, requests in flight, tokens per minute, number of
+            429 responses, number of decreases and time callers waited for a slot.
+        """
+        with self._lock:
+            return self._snapshot()
+
+    def _try_enter(self, tokens: int) -> bool:
+        """Try to take a request slot.
+
+        Args:
+            tokens: The number of tokens of the prompt.
+
+        Returns:
+            True if a slot was taken, False otherwise.
+        """
+        with self._lock:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            self._sent.append((time.monotonic(), tokens))
+            self._sent_tokens += tokens
+            self.max_prompt_tokens = max(self.max_prompt_tokens, tokens)
+            get_telemetry().record_concurrency(self._snapshot())
+            return True
+
+    def _sent_per_minute(self, now: float) -> float:
+        """Get the tokens sent over the last minute, or since the start if more recent.
+
+        Args:
+            now: The current monotonic time.
+
+        Returns:
+            The tokens per minute.
+        """
+        while self._sent and self._sent[0][0] < now - 60:
+            self._sent_tokens -= self._sent.popleft()[1]
+        return self._sent_tokens * 60 / max(1.0, min(60.0, now - self.start_time))
+
+    def _record_wait(self, seconds: float) -> None:
+        with self._lock:
+            self.wait_seconds += seconds
+
+    def enter(self, tokens: int) -> None:
+        """Take a request slot synchronously.
+
+        Args:
+            tokens: The number of tokens of the prompt.
+        """
+        start = time.perf_counter()
+        while not self._try_enter(tokens):
+            time.sleep(SLOT_POLL_SECONDS)
+        self._record_wait(time.perf_counter() - start)
+
+    async def async_enter(self, tokens: int) -> None:
+        """Take a request slot asynchronously.
+
+        Args:
+            tokens: The number of tokens of the prompt.
+        """
+        start = time.perf_counter()
+        while not self._try_enter(tokens):
+            await asyncio.sleep(SLOT_POLL_SECONDS)
+        self._record_wait(time.perf_counter() - start)
+
+    def release(
+        self,
+        name: str,
+        seconds: float,
+        outcome: str = "ok",
+        retry_after: float | None = None,
+        tokens_limited: bool = False,
+    ) -> None:
+        """Free the slot of a finished request and adapt the limits to its outcome.
+
+        Args:
+            name: Name of the call, e.g. its response schema.
+            seconds: Latency of the request.
+            outcome: "ok" if it succeeded, "throttled" if rejected with HTTP 429,
+                "failed" for any other error, which leaves the limits unchanged.
+            retry_after: Delay asked for by the provider before the next request.
+            tokens_limited: Whether the provider throttled on tokens rather than requests.
+        """
+        with self._lock:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if outcome == "throttled":
+                self.throttles += 1
+                cooldown = max(retry_after or 0.0, seconds)
+                if self._decrease(now, cooldown, "the provider throttled") and tokens_limited:
+                    self._decrease_tokens_per_minute(now)
+            elif outcome == "ok":
+                if self._latency_inflated(name, seconds):
+                    self._decrease(now, seconds, f"{name} latency is inflated")
+                else:
+                    self._increase()
+            get_telemetry().record_concurrency(self._snapshot())
+
+    def _latency_inflated(self, name: str, seconds: float) -> bool:
+        """Update the moving average latency of a call name and compare it to its lowest.
+
+        Args:
+            name: Name of the call.
+            seconds: Latency of the request.
+
+        Returns:
+            True if the average is inflated beyond `latency_inflation` times the lowest.
+        """
+        average = self._latency_average.get(name, seconds)
+        average += LATENCY_SMOOTHING * (seconds - average)
+        self._latency_average[name] = average
+        self._latency_samples[name] = self._latency_samples.get(name, 0) + 1
+        if self._latency_samples[name] < MIN_LATENCY_SAMPLES:
+            return False
+        baseline = min(self._latency_baseline.get(name, average), average)
+        self._latency_baseline[name] = baseline
+        return average > self.latency_inflation * baseline
+
+    def _increase(self) -> None:
+        self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+        if self.tokens_per_minute < self.max_tokens_per_minute:
+            self.tokens_per_minute = min(
+                float(self.max_tokens_per_minute),
+                self.tokens_per_minute
+                + self.max_tokens_per_minute * TPM_INCREASE_FRACTION / self.limit,
+            )
+            self.rate_limiter.set_tokens_per_minute(int(self.tokens_per_minute))
+
+    def _decrease(self, now: float, cooldown: float, reason: str) -> bool:
+        """Cut the in-flight limit, unless limits were cut during the last cooldown.
+
+        Args:
+            now: The current monotonic time.
+            cooldown: Time during which further cuts are ignored, e.g. the latency of
+                the request, so requests sent before this cut do not cut again.
+            reason: Why the limits are cut, for the log.
+
+        Returns:
+            True if the limit was cut.
+        """
+        if now < self.cooldown_until:
+            return False
+        self.cooldown_until = now + cooldown
+        self.decreases += 1
+        self.limit = max(float(self.min_concurrency), self.limit * self.decrease_factor)
+        logger.info(f"Lowered LLM concurrency to {int(self.limit)} requests, {reason}")
+        return True
+
+    def _decrease_tokens_per_minute(self, now: float) -> None:
+        """Cut the tokens per minute below the rate actually sent.
+
+        The rate stays at least the largest prompt sent, so such prompts still fit
+        in the rate limiter's bucket.
+
+        Args:
+            now: The current monotonic time.
+        """
+        lowest = min(
+            float(self.max_tokens_per_minute),
+            max(self.max_tokens_per_minute * MIN_TPM_FRACTION, self.max_prompt_tokens),
+        )
+        self.tokens_per_minute = max(
+            lowest,
+            self.decrease_factor * min(self.tokens_per_minute, self._sent_per_minute(now)),
+        )
+        self.rate_limiter.set_tokens_per_minute(int(self.tokens_per_minute))
+        logger.info(f"Lowered LLM rate to {int(self.tokens_per_minute)} tokens per minute")
+
+
+@functools.cache
+def get_concurrency_controller() -> AdaptiveConcurrency | None:
+    """Get the adaptive concurrency controller shared by all LLM calls of the process.
+
+    Returns:
+        The controller, or None if adaptive concurrency is disabled.
+    """
+    config = get_config()
+    if not config.adaptive_concurrency:
+        return None
+    return AdaptiveConcurrency(get_rate_limiter(), config.max_concurrent_requests)
+
+
+def retry_after_seconds(error: Exception) -> float | None:
+    """Get the delay a provider asked for in the headers of an error response.
+
+    Args:
+        error: The error raised by the request.
+
+    Returns:
+        The delay in seconds, or None if the response gave none.
+    """
+    headers = getattr(error, "litellm_response_headers", None)
+    if headers is None:
+        headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms") is not None:
+            return float(headers["retry-after-ms"]) / 1000
+        return float(headers["retry-after"])
+    except (KeyError, ValueError):
+        # Missing, or an HTTP date.
+        return None
+
+
+def _sdk_max_retries() -> int | None:
+    """Get the retries left to the provider SDK.
+
+    Returns:
+        0 when the adaptive controller retries throttled requests itself, so it sees
+        every rejection, None for the SDK default otherwise.
+    """
+    return None if get_concurrency_controller() is None else 0
+
 
+def _retry_throttled(
+    controller: AdaptiveConcurrency, name: str, seconds: float, error: Exception, attempt: int
+) -> float | None:
+    """Release the slot of a failed request and decide whether to retry it.
 
-load_dotenv()
-rate_limiter = MinuteRateLimiter(tokens_per_minute=int(os.getenv("MAX_TOKENS_PER_MINUTE", 100000)))
+    Args:
+        controller: The adaptive concurrency controller.
+        name: Name of the call.
+        seconds: Latency of the request.
+        error: The error raised by the request.
+        attempt: Number of the failed attempt, from 1.
+
+    Returns:
+        The delay before retrying, the one asked for by the provider if any, or None
+        if the request was not throttled or has no retries left.
+    """
+    throttled = getattr(error, "status_code", None) == 429
+    retry_after = retry_after_seconds(error)
+    # Providers name the limit hit in the message, e.g. "tokens per min (TPM)".
+    tokens_limited = throttled and "token" in str(error).lower()
+    controller.release(
+        name, seconds, "throttled" if throttled else "failed", retry_after, tokens_limited
+    )
+    if not throttled or attempt > MAX_THROTTLE_RETRIES:
+        return None
+    delay = DEFAULT_THROTTLE_PAUSE * 2 ** (attempt - 1) if retry_after is None else retry_after
+    logger.warning(
+        f"{name} request throttled, retrying in {delay:.1f}s ({attempt}/{MAX_THROTTLE_RETRIES})"
+    )
+    return delay
+
+
+def _call_with_limits(name: str, prompt_tokens: int, call: Callable[[], R]) -> R:
+    """Make a request under the rate limiter and, if enabled, the adaptive controller.
+
+    Args:
+        name: Name of the call, e.g. its response schema.
+        prompt_tokens: The number of tokens of the prompt.
+        call: Sends the request.
+
+    Returns:
+        The response.
+    """
+    get_rate_limiter().acquire(prompt_tokens)
+    controller = get_concurrency_controller()
+    if controller is None:
+        with get_telemetry().track_call(name):
+            return call()
+    # Rejected requests do not count against the provider's rate limits, so
+    # retries take no new rate limiter tokens.
+    attempt = 0
+    while True:
+        controller.enter(prompt_tokens)
+        start = time.perf_counter()
+        try:
+            with get_telemetry().track_call(name):
+                response = call()
+        except Exception as e:
+            attempt += 1
+            delay = _retry_throttled(controller, name, time.perf_counter() - start, e, attempt)
+            if delay is None:
+                raise
+        else:
+            controller.release(name, time.perf_counter() - start)
+            return response
+        time.sleep(delay)
+
+
+async def _acall_with_limits(name: str, prompt_tokens: int, call: Callable[[], Awaitable[R]]) -> R:
+    """Make a request asynchronously, as in `_call_with_limits`.
+
+    Args:
+        name: Name of the call, e.g. its response schema.
+        prompt_tokens: The number of tokens of the prompt.
+        call: Sends the request.
+
+    Returns:
+        The response.
+    """
+    await get_rate_limiter().async_acquire(prompt_tokens)
+    logger.info("Rate limit tokens acquired")
+    controller = get_concurrency_controller()
+    if controller is None:
+        with get_telemetry().track_call(name):
+            return await call()
+    attempt = 0
+    while True:
+        await controller.async_enter(prompt_tokens)
+        start = time.perf_counter()
+        try:
+            with get_telemetry().track_call(name):
+                response = await call()
+        except asyncio.CancelledError:
+            controller.release(name, time.perf_counter() - start, "failed")
+            raise
+        except Exception as e:
+            attempt += 1
+            delay = _retry_throttled(controller, name, time.perf_counter() - start, e, attempt)
+            if delay is None:
+                raise
+        else:
+            controller.release(name, time.perf_counter() - start)
+            return response
+        await asyncio.sleep(delay)
+
+
+def _check_budget(model: str, prompt_tokens: int) -> None:
+    """Check a request against the active run budget, if any.
+
+    Args:
+        model: The model to use.
+        prompt_tokens: The number of tokens of the prompt.
+    """
+    budget = get_active_budget()
+    if budget is not None:
+        budget.check(model, prompt_tokens)
+
+
+def _record_usage(tokens: int, cost: float | None) -> None:
+    """Record the usage of a request in the active run budget, if any.
+
+    Args:
+        tokens: The number of prompt and completion tokens used.
+        cost: The cost of the request.
+    """
+    budget = get_active_budget()
+    if budget is not None:
+        budget.record(tokens, cost or 0.0)
+
+
+def count_tokens(model: str, text: str) -> int:
+    """Count the tokens of a text for the given model.
+
+    Args:
+        model: The model to use.
+        text: The text to count tokens for.
+
+    Returns:
+        The number of tokens.
+    """
+    from litellm import token_counter
+
+    return token_counter(model, text=text)
 
 
 def ask_llm(
@@ -101,24 +580,36 @@ def ask_llm(
     Returns:
         The response from the LLM and the cost of the request.
     """
+    from litellm import completion, token_counter
+
     logger.info(f"Calling {model} with prompt")
-    load_dotenv()
+    get_config()  # Loads provider credentials into the environment once
 
     messages = [
         {"role": "system", "content": sys_prompt},
         {"role": "user", "content": user_prompt},
     ]
 
+    prompt_tokens = token_counter(model, messages=messages)
+    _check_budget(model, prompt_tokens)
+
     try:
-        rate_limiter.acquire(token_counter(model, messages=messages))
-        response = completion(
-            model=model,
-            messages=messages,
-            top_p=top_p,
-            temperature=temperature,
+        response = _call_with_limits(
+            "text",
+            prompt_tokens,
+            lambda: completion(
+                model=model,
+                messages=messages,
+                top_p=top_p,
+                temperature=temperature,
+                max_retries=_sdk_max_retries(),
+                client=get_shared_clients().client(model, _sdk_max_retries()),
+            ),
         )
         logger.debug("Received successful response")
-        return response.model_dump_json(indent=2), response._hidden_params["response_cost"]
+        cost = response._hidden_params["response_cost"]
+        _record_usage(response.usage.total_tokens, cost)
+        return response.model_dump_json(indent=2), cost
     except Exception:
         logger.exception(f"Communication error with {model}")
         raise
@@ -131,9 +622,14 @@ def ask_llm_with_schema(
     output_class: type[T],
     top_p: float = 1,
     temperature: float = 0.5,
+    repair: bool = True,
 ) -> tuple[T, float]:
     """Ask the LLM enforcing the response adheres to a schema.
 
+    Invalid responses are repaired locally when possible, otherwise with a short
+    follow-up request holding only the invalid output and its validation errors
+    (see `repair`), instead of sending the whole prompt again.
+
     Args:
         model: The model to use.
         sys_prompt: The system prompt.
@@ -141,14 +637,17 @@ def ask_llm_with_schema(
         output_class: The output class.
         top_p: The top p value.
         temperature: The temperature value.
+        repair: Send a repair request for responses which cannot be repaired locally.
 
     Returns:
         The response from the LLM and the cost of the request.
     """
+    from litellm import completion, token_counter
+
     logger.info(f"Calling for {model} with schema")
-    load_dotenv()
+    get_config()  # Loads provider credentials into the environment once
 
-    if not supports_response_schema(model=model):
+    if not supports_schema(model):
         msg = f"Model {model} does not support schemas, use the `ask_llm` function instead"
         logger.error(msg)
         raise ValueError(msg)
@@ -158,22 +657,53 @@ def ask_llm_with_schema(
         {"role": "user", "content": user_prompt},
     ]
 
+    prompt_tokens = token_counter(model, messages=messages)
+    _check_budget(model, prompt_tokens)
+
     try:
-        rate_limiter.acquire(token_counter(model, messages=messages))
-        response = completion(
-            model=model,
-            messages=messages,
-            top_p=top_p,
-            temperature=temperature,
-            response_format=output_class,
+        response = _call_with_limits(
+            output_class.__name__,
+            prompt_tokens,
+            lambda: completion(
+                model=model,
+                messages=messages,
+                top_p=top_p,
+                temperature=temperature,
+                response_format=output_class,
+                max_retries=_sdk_max_retries(),
+                client=get_shared_clients().client(model, _sdk_max_retries()),
+            ),
         )
         logger.debug("Received successful response")
         content = response.choices[0].message.content
-        return output_class.model_validate_json(content), response._hidden_params["response_cost"]
+        cost = response._hidden_params["response_cost"]
+        _record_usage(response.usage.total_tokens, cost)
     except Exception:
         logger.exception(f"Communication error with {model}")
         raise
 
+    try:
+        return parse_locally(content, output_class), cost
+    except ValidationError as e:
+        if not repair:
+            raise
+        logger.warning(f"Invalid {output_class.__name__} response, sending a repair request")
+        try:
+            repaired, repair_cost = ask_llm_with_schema(
+                model,
+                REPAIR_SYS_PROMPT,
+                repair_prompt(content, e),
+                output_class,
+                top_p,
+                temperature,
+                repair=False,
+            )
+        except ValidationError:
+            get_telemetry().record_repair("failed")
+            raise
+        get_telemetry().record_repair("request")
+        return repaired, cost + repair_cost
+
 
 async def ask_llm_async(
     model: str,
@@ -184,6 +714,9 @@ async def ask_llm_async(
 ) -> tuple[str, float]:
     """Ask the LLM asynchronously.
 
+    Identical requests in flight in the same event loop share one call, see
+    `llm.coalescing`; its cost is returned to the first of them only.
+
     Args:
         model: The model to use.
         sys_prompt: The system prompt.
@@ -194,25 +727,60 @@ async def ask_llm_async(
     Returns:
         The response from the LLM and the cost of the request.
     """
+    key = request_key("text", model, sys_prompt, user_prompt, top_p, temperature)
+    return await single_flight(
+        key, lambda: _ask_llm_async(model, sys_prompt, user_prompt, top_p, temperature)
+    )
+
+
+async def _ask_llm_async(
+    model: str,
+    sys_prompt: str,
+    user_prompt: str,
+    top_p: float,
+    temperature: float,
+) -> tuple[str, float]:
+    """Ask the LLM asynchronously, without coalescing.
+
+    Args:
+        model: The model to use.
+        sys_prompt: The system prompt.
+        user_prompt: The user prompt.
+        top_p: The top p value.
+        temperature: The temperature value.
+
+    Returns:
+        The response from the LLM and the cost of the request.
+    """
+    from litellm import acompletion, token_counter
+
     logger.info(f"Calling {model} with prompt")
-    load_dotenv()
+    get_config()  # Loads provider credentials into the environment once
 
     messages = [
         {"role": "system", "content": sys_prompt},
         {"role": "user", "content": user_prompt},
     ]
-    await rate_limiter.async_acquire(token_counter(model, messages=messages))
-    logger.info("Rate limit tokens acquired")
+    prompt_tokens = token_counter(model, messages=messages)
+    _check_budget(model, prompt_tokens)
 
     try:
-        response = await acompletion(
-            model=model,
-            messages=messages,
-            top_p=top_p,
-            temperature=temperature,
+        response = await _acall_with_limits(
+            "text",
+            prompt_tokens,
+            lambda: acompletion(
+                model=model,
+                messages=messages,
+                top_p=top_p,
+                temperature=temperature,
+                max_retries=_sdk_max_retries(),
+                client=get_shared_clients().async_client(model, _sdk_max_retries()),
+            ),
         )
         logger.debug("Received successful response")
-        return response.model_dump_json(indent=2), response._hidden_params["response_cost"]
+        cost = response._hidden_params["response_cost"]
+        _record_usage(response.usage.total_tokens, cost)
+        return response.model_dump_json(indent=2), cost
     except Exception:
         logger.exception(f"Communication error with {model}")
         raise
@@ -225,9 +793,55 @@ async def ask_llm_async_with_schema(
     output_class: type[T],
     top_p: float = 1,
     temperature: float = 0.5,
+    repair: bool = True,
 ) -> tuple[str | T, float]:
     """Ask the LLM asynchronously with schema.
 
+    Invalid responses are repaired as in `ask_llm_with_schema`. Identical requests
+    in flight in the same event loop share one call and receive the same validated
+    response, see `llm.coalescing`; its cost is returned to the first of them only.
+
+    Args:
+        model: The model to use.
+        sys_prompt: The system prompt.
+        user_prompt: The user prompt.
+        output_class: The output class.
+        top_p: The top p value.
+        temperature: The temperature value.
+        repair: Send a repair request for responses which cannot be repaired locally.
+
+    Returns:
+        The response from the LLM and the cost of the request.
+    """
+    key = request_key(
+        output_class.__module__,
+        output_class.__qualname__,
+        model,
+        sys_prompt,
+        user_prompt,
+        top_p,
+        temperature,
+        repair,
+    )
+    return await single_flight(
+        key,
+        lambda: _ask_llm_async_with_schema(
+            model, sys_prompt, user_prompt, output_class, top_p, temperature, repair
+        ),
+    )
+
+
+async def _ask_llm_async_with_schema(
+    model: str,
+    sys_prompt: str,
+    user_prompt: str,
+    output_class: type[T],
+    top_p: float,
+    temperature: float,
+    repair: bool,
+) -> tuple[str | T, float]:
+    """Ask the LLM asynchronously with schema, without coalescing.
+
     Args:
         model: The model to use.
         sys_prompt: The system prompt.
@@ -235,14 +849,17 @@ async def ask_llm_async_with_schema(
         output_class: The output class.
         top_p: The top p value.
         temperature: The temperature value.
+        repair: Send a repair request for responses which cannot be repaired locally.
 
     Returns:
         The response from the LLM and the cost of the request.
     """
+    from litellm import acompletion, token_counter
+
     logger.info(f"Calling for {model} with schema")
-    load_dotenv()
+    get_config()  # Loads provider credentials into the environment once
 
-    if not supports_response_schema(model=model):
+    if not supports_schema(model):
         msg = f"Model {model} does not support schemas, use the `ask_llm_async` function instead"
         logger.error(msg)
         raise ValueError(msg)
@@ -251,20 +868,49 @@ async def ask_llm_async_with_schema(
         {"role": "system", "content": sys_prompt},
         {"role": "user", "content": user_prompt},
     ]
-    await rate_limiter.async_acquire(token_counter(model, messages=messages))
-    logger.info("Rate limit tokens acquired")
+    prompt_tokens = token_counter(model, messages=messages)
+    _check_budget(model, prompt_tokens)
 
     try:
-        response = await acompletion(
-            model=model,
-            messages=messages,
-            top_p=top_p,
-            temperature=temperature,
-            response_format=output_class,
+        response = await _acall_with_limits(
+            output_class.__name__,
+            prompt_tokens,
+            lambda: acompletion(
+                model=model,
+                messages=messages,
+                top_p=top_p,
+                temperature=temperature,
+                response_format=output_class,
+                max_retries=_sdk_max_retries(),
+                client=get_shared_clients().async_client(model, _sdk_max_retries()),
+            ),
         )
         logger.debug("Received successful response")
         content = response.choices[0].message.content
-        return output_class.model_validate_json(content), response._hidden_params["response_cost"]
+        cost = response._hidden_params["response_cost"]
+        _record_usage(response.usage.total_tokens, cost)
     except Exception:
         logger.exception(f"Communication error with {model}")
         raise
+
+    try:
+        return parse_locally(content, output_class), cost
+    except ValidationError as e:
+        if not repair:
+            raise
+        logger.warning(f"Invalid {output_class.__name__} response, sending a repair request")
+        try:
+            repaired, repair_cost = await ask_llm_async_with_schema(
+                model,
+                REPAIR_SYS_PROMPT,
+                repair_prompt(content, e),
+                output_class,
+                top_p,
+                temperature,
+                repair=False,
+            )
+        except ValidationError:
+            get_telemetry().record_repair("failed")
+            raise
+        get_telemetry().record_repair("request")
+        return repaired, cost + repair_cost
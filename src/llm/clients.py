@@ -0,0 +1,274 @@
+"""Long-lived HTTP clients shared by all LLM calls of the process.
+
+Left to itself, litellm builds an SDK client, with its own connection pool, for
+each combination of credentials, timeout and retries and rebuilds it every
+hour, builds a new Azure client for every call, and reuses async clients
+across event loops and forked workers. The caller passes clients from here
+instead: one SDK client per provider endpoint, on an HTTP client with
+keep-alive, a bounded pool and HTTP/2 when the `h2` package is installed.
+Async clients are bound to the event loop they were created in, so every loop
+gets its own, closed before the loop ends when it is run with `run_async`;
+sync clients are closed at exit. Requests sent and connections opened are
+counted in `llm.telemetry`. Providers other than OpenAI and Azure OpenAI keep
+litellm's own client handling.
+"""
+
+import asyncio
+import atexit
+import functools
+import importlib.util
+import os
+import threading
+import weakref
+from collections.abc import Coroutine
+from typing import TYPE_CHECKING, Any, TypeVar
+
+from logger import get_logger
+
+from .config import get_config
+from .telemetry import get_telemetry
+
+if TYPE_CHECKING:
+    # Imported when first used, as litellm is, to keep CLI startup fast.
+    from openai import AsyncOpenAI, OpenAI
+
+logger = get_logger(__name__)
+R = TypeVar("R")
+
+# Providers whose SDK clients are shared, by litellm provider name.
+SHARED_CLIENT_PROVIDERS = ("openai", "azure")
+# Retries of the provider SDK when litellm is not told otherwise.
+DEFAULT_SDK_MAX_RETRIES = 2
+# Event of the httpcore trace extension marking a new connection.
+CONNECT_EVENT = "connection.connect_tcp.complete"
+
+
+def _trace(event_name: str, info: dict) -> None:
+    if event_name == CONNECT_EVENT:
+        get_telemetry().record_http_connection()
+
+
+async def _atrace(event_name: str, info: dict) -> None:
+    _trace(event_name, info)
+
+
+def _count_request(request: object) -> None:
+    get_telemetry().record_http_request()
+    request.extensions["trace"] = _trace  # type: ignore[attr-defined]
+
+
+async def _acount_request(request: object) -> None:
+    get_telemetry().record_http_request()
+    request.extensions["trace"] = _atrace  # type: ignore[attr-defined]
+
+
+def _provider_of(model: str) -> str:
+    """Get the litellm provider of a model.
+
+    Args:
+        model: The model, e.g. "azure/gpt-4o-2024-08-06".
+
+    Returns:
+        The provider, e.g. "azure".
+    """
+    from litellm import get_llm_provider
+
+    return get_llm_provider(model)[1]
+
+
+class SharedClients:
+    """SDK clients of the providers, each on a pooled keep-alive HTTP client."""
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 60.0,
+    ) -> None:
+        """Initialize the clients, created on first use.
+
+        Args:
+            max_connections: Maximal number of connections of each client.
+            max_keepalive_connections: Maximal number of idle connections kept open.
+            keepalive_expiry: Seconds after which idle connections are closed.
+        """
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = importlib.util.find_spec("h2") is not None
+        self._clients: dict[tuple[str, int], OpenAI] = {}
+        self._async_clients: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, dict[tuple[str, int], AsyncOpenAI]
+        ] = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _http_client_kwargs(self) -> dict:
+        """Get the pool settings of the HTTP clients.
+
+        Returns:
+            Keyword arguments of the SDK's default HTTP clients.
+        """
+        # Recent SDKs ship their own fork of httpx, so the limits are built with
+        # the class of the SDK's default ones.
+        from openai._constants import DEFAULT_CONNECTION_LIMITS
+
+        limits = type(DEFAULT_CONNECTION_LIMITS)(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+        return {"limits": limits, "http2": self.http2}
+
+    def _key(self, model: str, max_retries: int | None) -> tuple[str, int] | None:
+        """Get the key of the client of a model.
+
+        Args:
+            model: The model.
+            max_retries: Retries of the SDK, None for its default.
+
+        Returns:
+            The provider and retries, or None if the provider is left to litellm.
+        """
+        provider = _provider_of(model)
+        if provider not in SHARED_CLIENT_PROVIDERS:
+            return None
+        return provider, DEFAULT_SDK_MAX_RETRIES if max_retries is None else max_retries
+
+    def _sdk_kwargs(self, provider: str) -> dict | None:
+        """Get the endpoint and credentials of the SDK client of a provider.
+
+        Unset or empty variables fall back as in litellm: the Azure API version to
+        `litellm.AZURE_DEFAULT_API_VERSION`, and a missing Azure endpoint leaves the
+        provider to litellm, which reports it.
+
+        Args:
+            provider: The provider, one of `SHARED_CLIENT_PROVIDERS`.
+
+        Returns:
+            Keyword arguments of the SDK client, or None to leave the provider to litellm.
+        """
+        import litellm
+
+        get_config()  # Loads provider credentials into the environment once
+        if provider == "azure":
+            if not os.getenv("AZURE_API_BASE"):
+                return None
+            return {
+                "api_key": os.getenv("AZURE_API_KEY"),
+                "azure_endpoint": os.getenv("AZURE_API_BASE"),
+                "api_version": os.getenv("AZURE_API_VERSION") or litellm.AZURE_DEFAULT_API_VERSION,
+            }
+        return {
+            "api_key": os.getenv("OPENAI_API_KEY"),
+            "base_url": os.getenv("OPENAI_API_BASE") or os.getenv("OPENAI_BASE_URL"),
+        }
+
+    def client(self, model: str, max_retries: int | None = None) -> "OpenAI | None":
+        """Get the shared sync client of the provider of a model.
+
+        Args:
+            model: The model.
+            max_retries: Retries of the SDK, None for its default.
+
+        Returns:
+            The client, or None to leave the provider to litellm.
+        """
+        from openai import AzureOpenAI, DefaultHttpxClient, OpenAI
+
+        key = self._key(model, max_retries)
+        if key is None:
+            return None
+        sdk_kwargs = self._sdk_kwargs(key[0])
+        if sdk_kwargs is None:
+            return None
+        with self._lock:
+            if key not in self._clients:
+                http_client = DefaultHttpxClient(
+                    **self._http_client_kwargs(), event_hooks={"request": [_count_request]}
+                )
+                client_class = AzureOpenAI if key[0] == "azure" else OpenAI
+                self._clients[key] = client_class(
+                    **sdk_kwargs, max_retries=key[1], http_client=http_client
+                )
+            return self._clients[key]
+
+    def async_client(self, model: str, max_retries: int | None = None) -> "AsyncOpenAI | None":
+        """Get the async client of the provider of a model for the running event loop.
+
+        Args:
+            model: The model.
+            max_retries: Retries of the SDK, None for its default.
+
+        Returns:
+            The client, or None to leave the provider to litellm.
+        """
+        from openai import AsyncAzureOpenAI, AsyncOpenAI, DefaultAsyncHttpxClient
+
+        key = self._key(model, max_retries)
+        if key is None:
+            return None
+        sdk_kwargs = self._sdk_kwargs(key[0])
+        if sdk_kwargs is None:
+            return None
+        with self._lock:
+            clients = self._async_clients.setdefault(asyncio.get_running_loop(), {})
+            if key not in clients:
+                http_client = DefaultAsyncHttpxClient(
+                    **self._http_client_kwargs(), event_hooks={"request": [_acount_request]}
+                )
+                client_class = AsyncAzureOpenAI if key[0] == "azure" else AsyncOpenAI
+                clients[key] = client_class(
+                    **sdk_kwargs, max_retries=key[1], http_client=http_client
+                )
+            return clients[key]
+
+    def close(self) -> None:
+        """Close the sync clients and their connections."""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            client.close()
+
+    async def aclose(self) -> None:
+        """Close the async clients of the running event loop and their connections."""
+        with self._lock:
+            clients = self._async_clients.pop(asyncio.get_running_loop(), {})
+        for client in clients.values():
+            await client.close()
+
+
+@functools.cache
+def get_shared_clients() -> SharedClients:
+    """Get the clients shared by all LLM calls of the process.
+
+    Returns:
+        The shared clients.
+    """
+    clients = SharedClients()
+    atexit.register(clients.close)
+    return clients
+
+
+def run_async(coroutine: Coroutine[Any, Any, R]) -> R:
+    """Run a coroutine in a new event loop, closing its LLM clients before the loop ends.
+
+    Args:
+        coroutine: The coroutine, e.g. making async LLM calls.
+
+    Returns:
+        The result of the coroutine.
+    """
+
+    async def run_and_close() -> R:
+        try:
+            return await coroutine
+        finally:
+            await get_shared_clients().aclose()
+
+    return asyncio.run(run_and_close())
+
+
+# Forked workers, e.g. of batch evaluation, must not write to the connections of
+# their parent; they create clients of their own.
+os.register_at_fork(after_in_child=get_shared_clients.cache_clear)
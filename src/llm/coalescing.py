@@ -0,0 +1,91 @@
+"""Single-flight coalescing of identical concurrent requests.
+
+Papers judged or generated concurrently can send byte-identical requests at
+the same time (same model, parameters, prompts and schema), and caches only
+help once the first one has completed. `single_flight` lets the first of them
+make the request while the others, in the same event loop, wait for its
+result: they all get the same response, the cost is returned once, to the
+caller which made the request, and the others count as coalesced in
+`llm.telemetry`. Requests are shielded, so a cancelled caller does not cancel
+a request others wait for.
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+import weakref
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
+
+from .telemetry import get_telemetry
+
+R = TypeVar("R")
+
+_in_flight: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, asyncio.Future]] = (
+    weakref.WeakKeyDictionary()
+)
+_lock = threading.Lock()
+
+
+def request_key(*parts: object) -> str:
+    """Build the key identifying a request.
+
+    Args:
+        *parts: Everything the response depends on, e.g. model, parameters and prompts.
+
+    Returns:
+        The key.
+    """
+    return hashlib.sha256(json.dumps(parts, default=str).encode()).hexdigest()
+
+
+def _requests_of_running_loop() -> dict[str, asyncio.Future]:
+    """Get the requests in flight in the running event loop.
+
+    Returns:
+        The requests keyed by request key.
+    """
+    with _lock:
+        return _in_flight.setdefault(asyncio.get_running_loop(), {})
+
+
+def _forget(requests: dict[str, asyncio.Future], key: str, task: asyncio.Future) -> None:
+    """Remove a finished request from those in flight.
+
+    Args:
+        requests: The requests in flight.
+        key: The key of the request.
+        task: The finished request.
+    """
+    if requests.get(key) is task:
+        del requests[key]
+    # Retrieve the exception, which its callers raise, so it is not reported as
+    # never retrieved when all of them were cancelled.
+    if not task.cancelled():
+        task.exception()
+
+
+async def single_flight(
+    key: str, request: Callable[[], Awaitable[tuple[R, float]]]
+) -> tuple[R, float]:
+    """Make a request, or wait for the identical one in flight.
+
+    Args:
+        key: The key of the request, see `request_key`.
+        request: Makes the request, returning the response and its cost.
+
+    Returns:
+        The response, and its cost for the caller which made the request or 0 for
+        the callers it was coalesced with.
+    """
+    requests = _requests_of_running_loop()
+    task = requests.get(key)
+    if task is not None:
+        get_telemetry().record_coalesced()
+        response, _ = await asyncio.shield(task)
+        return response, 0.0
+    task = asyncio.ensure_future(request())
+    requests[key] = task
+    task.add_done_callback(lambda done: _forget(requests, key, done))
+    return await asyncio.shield(task)
@@ -0,0 +1,49 @@
+"""Configuration of the LLM module, resolved once per process."""
+
+import functools
+import os
+from dataclasses import dataclass
+
+from dotenv import load_dotenv
+
+
+@dataclass(frozen=True)
+class LLMConfig:
+    """Configuration of the LLM module."""
+
+    max_tokens_per_minute: int
+    adaptive_concurrency: bool = False
+    max_concurrent_requests: int = 16
+
+
+@functools.cache
+def get_config() -> LLMConfig:
+    """Load the configuration from the environment and the `.env` file.
+
+    The `.env` file is only read on the first call, later calls return the same object.
+    Provider credentials are left in the environment, where litellm reads them.
+
+    Returns:
+        The configuration.
+    """
+    load_dotenv()
+    return LLMConfig(
+        max_tokens_per_minute=int(os.getenv("MAX_TOKENS_PER_MINUTE", 100000)),
+        adaptive_concurrency=os.getenv("ADAPTIVE_CONCURRENCY", "0") == "1",
+        max_concurrent_requests=int(os.getenv("MAX_CONCURRENT_REQUESTS", 16)),
+    )
+
+
+@functools.cache
+def supports_schema(model: str) -> bool:
+    """Check whether a model supports response schemas.
+
+    Args:
+        model: The model to check.
+
+    Returns:
+        True if the model supports response schemas, False otherwise.
+    """
+    from litellm import supports_response_schema
+
+    return supports_response_schema(model=model)
@@ -0,0 +1,45 @@
+"""Packing of several prompt items into a single LLM request."""
+
+from collections.abc import Hashable
+from typing import TypeVar
+
+K = TypeVar("K", bound=Hashable)
+
+
+def pack_by_token_budget(
+    item_tokens: dict[K, int],
+    token_budget: int,
+    overhead_tokens: int = 0,
+    max_pack_size: int | None = None,
+) -> list[list[K]]:
+    """Greedily pack items into groups that fit a token budget.
+
+    Items are packed in their original order. An item that does not fit the
+    budget on its own is placed in a pack by itself, so callers can still
+    send it as a single request.
+
+    Args:
+        item_tokens: Number of tokens each item adds to a request, keyed by item.
+        token_budget: Maximum number of tokens per packed request.
+        overhead_tokens: Tokens shared by every request (system prompt, instructions).
+        max_pack_size: Optional maximum number of items per pack.
+
+    Returns:
+        The packs as lists of item keys.
+    """
+    packs: list[list[K]] = []
+    current: list[K] = []
+    current_tokens = overhead_tokens
+
+    for key, tokens in item_tokens.items():
+        is_full = max_pack_size is not None and len(current) >= max_pack_size
+        if current and (is_full or current_tokens + tokens > token_budget):
+            packs.append(current)
+            current = []
+            current_tokens = overhead_tokens
+        current.append(key)
+        current_tokens += tokens
+
+    if current:
+        packs.append(current)
+    return packs
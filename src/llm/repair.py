@@ -0,0 +1,260 @@
+"""Local repair of structured responses which fail schema validation.
+
+Responses are sometimes cut off by the completion token limit, carry trailing
+commas or follow the shape of the JSON examples in the prompts rather than the
+response schema (e.g. `semantic_groups` keyed by experiment instead of a list
+of `experiment_semantic_groups`). `parse_locally` fixes these without calling
+the LLM again; what it cannot fix is sent back to the LLM with `repair_prompt`,
+which holds only the invalid output and its validation errors.
+"""
+
+import json
+import re
+import types
+import typing
+from typing import TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+from logger import get_logger
+
+from .telemetry import get_telemetry
+
+logger = get_logger(__name__)
+T = TypeVar("T", bound=BaseModel)
+
+REPAIR_SYS_PROMPT = (
+    "You fix JSON outputs which do not match their schema. Keep the content of the output, "
+    "only change what is needed for it to validate."
+)
+
+# Keys used by the prompt examples instead of the names of schema fields.
+FIELD_ALIASES = {"experiment_semantic_groups": ("semantic_groups",)}
+
+# Number of characters of the invalid output kept in a repair prompt.
+MAX_REPAIR_OUTPUT_CHARS = 20000
+
+_FENCE_PATTERN = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+_TRAILING_COMMA_PATTERN = re.compile(r",(\s*[}\]])")
+
+
+def _scan(text: str) -> tuple[list[tuple[str, int]], int]:
+    """Find the containers and the string left open at the end of a JSON text.
+
+    Args:
+        text: The JSON text.
+
+    Returns:
+        The opening character and position of the open containers, innermost last,
+        and the position of the unfinished string, or -1 if the text does not end
+        inside a string.
+    """
+    containers: list[tuple[str, int]] = []
+    string_start = -1
+    escaped = False
+    for i, char in enumerate(text):
+        if string_start >= 0:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                string_start = -1
+        elif char == '"':
+            string_start = i
+        elif char in "{[":
+            containers.append((char, i))
+        elif char in "}]" and containers:
+            containers.pop()
+    return containers, string_start
+
+
+def close_truncated(text: str) -> str:
+    """Complete a JSON text cut off before its end, keeping only its complete items.
+
+    The item of the innermost open list which was being written when the text was
+    cut off is dropped, whether it is an object or an unfinished string, so that
+    no truncated content passes for complete. The open containers are then closed.
+    Texts cut off outside of any list cannot be completed.
+
+    Args:
+        text: The truncated JSON text.
+
+    Returns:
+        The completed text, or the text itself if it could not be completed.
+    """
+    containers, string_start = _scan(text)
+    list_depth = max((i for i, (char, _) in enumerate(containers) if char == "["), default=-1)
+    if list_depth < 0:
+        return text
+    if list_depth + 1 < len(containers):
+        # Drop the unfinished object, with the objects and strings open inside it.
+        candidate = text[: containers[list_depth + 1][1]]
+    elif string_start >= 0:
+        candidate = text[:string_start]
+    else:
+        candidate = text
+    # Drop an unfinished number or literal.
+    candidate = candidate.rstrip()
+    if candidate and candidate[-1] not in ',["}]':
+        candidate = candidate[: max(candidate.rfind(","), containers[list_depth][1] + 1)]
+    completed = candidate.rstrip().rstrip(",") + "".join(
+        "]" if char == "[" else "}" for char, _ in reversed(containers[: list_depth + 1])
+    )
+    try:
+        json.loads(completed)
+    except json.JSONDecodeError:
+        return text
+    return completed
+
+
+def repair_json(text: str) -> str:
+    """Fix the syntax of a JSON text: code fences, leading prose, trailing commas, truncation.
+
+    Args:
+        text: The JSON text.
+
+    Returns:
+        The repaired text, which may still be invalid.
+    """
+    text = _FENCE_PATTERN.sub("", text)
+    start = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=0)
+    text = _TRAILING_COMMA_PATTERN.sub(r"\1", text[start:])
+    try:
+        json.loads(text)
+        return text
+    except json.JSONDecodeError:
+        return close_truncated(text)
+
+
+def _model_of(annotation: object) -> type[BaseModel] | None:
+    """Get the model of a field annotated with a model, or a list or optional of one.
+
+    Args:
+        annotation: The annotation of the field.
+
+    Returns:
+        The model, or None.
+    """
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation
+    if isinstance(annotation, types.UnionType) or typing.get_origin(annotation) in (
+        list,
+        typing.Union,
+    ):
+        for arg in typing.get_args(annotation):
+            model = _model_of(arg)
+            if model is not None:
+                return model
+    return None
+
+
+def _named_items(mapping: dict, model: type[BaseModel]) -> list:
+    """Turn a mapping keyed by name into the list of items a schema expects.
+
+    `{"experiment_1": {"nodes": ...}}` becomes `[{"experiment_name": "experiment_1",
+    "nodes": ...}]`; when the value is not an item itself, e.g. a list of nodes,
+    it becomes the item's other field.
+
+    Args:
+        mapping: The mapping.
+        model: The model of the items.
+
+    Returns:
+        The items, or the mapping as a single item if the model has no name field.
+    """
+    fields = model.model_fields
+    name_field = next((name for name in fields if name.endswith("_name")), None)
+    if name_field is None:
+        return [mapping]
+    other_fields = [name for name in fields if name != name_field]
+    items = []
+    for key, value in mapping.items():
+        if isinstance(value, dict) and value.keys() & fields.keys():
+            items.append({name_field: key, **value})
+        elif len(other_fields) == 1:
+            items.append({name_field: key, other_fields[0]: value})
+        else:
+            items.append(value)
+    return items
+
+
+def normalize_to_schema(data: object, model: type[BaseModel]) -> object:
+    """Reshape data to the schema of a model: field aliases and mappings given for lists.
+
+    Args:
+        data: The parsed JSON data.
+        model: The model the data should validate against.
+
+    Returns:
+        The reshaped data.
+    """
+    if not isinstance(data, dict):
+        return data
+    data = dict(data)
+    for name, field in model.model_fields.items():
+        if name not in data:
+            alias = next((alias for alias in FIELD_ALIASES.get(name, ()) if alias in data), None)
+            if alias is None:
+                continue
+            data[name] = data.pop(alias)
+        item_model = _model_of(field.annotation)
+        if item_model is None:
+            continue
+        value = data[name]
+        if typing.get_origin(field.annotation) is list and isinstance(value, dict):
+            value = _named_items(value, item_model)
+        if isinstance(value, list):
+            data[name] = [normalize_to_schema(item, item_model) for item in value]
+        else:
+            data[name] = normalize_to_schema(value, item_model)
+    return data
+
+
+def parse_locally(content: str, output_class: type[T]) -> T:
+    """Validate a response, repairing its syntax and shape locally if needed.
+
+    Args:
+        content: The content of the response.
+        output_class: The output class.
+
+    Returns:
+        The validated response.
+
+    Raises:
+        ValidationError: If the response cannot be repaired locally.
+    """
+    try:
+        return output_class.model_validate_json(content)
+    except ValidationError as e:
+        error = e
+    try:
+        data = json.loads(repair_json(content))
+        parsed = output_class.model_validate(normalize_to_schema(data, output_class))
+    except (json.JSONDecodeError, ValidationError):
+        raise error from None
+    logger.warning(f"Repaired invalid {output_class.__name__} response locally")
+    get_telemetry().record_repair("local")
+    return parsed
+
+
+def repair_prompt(content: str, error: ValidationError) -> str:
+    """Build the prompt asking the LLM to fix an invalid output.
+
+    Args:
+        content: The invalid output.
+        error: Its validation error.
+
+    Returns:
+        The prompt.
+    """
+    errors = "\n".join(
+        f"- {'.'.join(str(part) for part in detail['loc']) or '(root)'}: {detail['msg']}"
+        for detail in error.errors()
+    )
+    return (
+        "This JSON output does not validate against its schema.\n\n"
+        f"Output:\n{content[:MAX_REPAIR_OUTPUT_CHARS]}\n\n"
+        f"Validation errors:\n{errors}\n\n"
+        "Return the corrected JSON output."
+    )
@@ -0,0 +1,219 @@
+"""Process-wide telemetry of LLM calls.
+
+Records the latency and outcome of every request, keyed by the response schema
+(which identifies the pipeline stage), and the time spent waiting on the rate
+limiter, so throughput and concurrency behaviour can be measured without
+instrumenting the callers. The adaptive concurrency controller of
+`llm.caller`, when enabled, publishes its current limits here as well.
+
+Totals are shared by every run of the process. The time spent in the calls of
+a single run, or a stage of it, is measured with `time_calls`, which only counts
+calls made from its own context, so concurrent runs are not charged each
+other's calls.
+"""
+
+import functools
+import math
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Get a percentile of values with the nearest-rank method.
+
+    Args:
+        values: The values.
+        q: The percentile, between 0 and 100.
+
+    Returns:
+        The percentile, or 0 if there are no values.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+class CallTimer:
+    """Time spent in the LLM calls made within a `time_calls` context."""
+
+    def __init__(self) -> None:
+        """Initialize the timer at zero."""
+        self.seconds = 0.0
+
+
+# Timers of the enclosing `time_calls` contexts, innermost last.
+_call_timers: ContextVar[tuple[CallTimer, ...]] = ContextVar("call_timers", default=())
+
+
+@contextmanager
+def time_calls() -> Iterator[CallTimer]:
+    """Time the LLM calls made within the context.
+
+    Calls made from tasks started within the context count as well, as they
+    inherit it, while calls of other threads and runs do not.
+
+    Yields:
+        The timer, whose total is final once the context exits.
+    """
+    timer = CallTimer()
+    token = _call_timers.set((*_call_timers.get(), timer))
+    try:
+        yield timer
+    finally:
+        _call_timers.reset(token)
+
+
+class Telemetry:
+    """Latencies and errors of LLM calls, and rate limiter waits."""
+
+    def __init__(self) -> None:
+        """Initialize empty telemetry."""
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget everything recorded so far and restart the clock."""
+        with self._lock:
+            self.start_time = time.perf_counter()
+            self.latencies: dict[str, list[float]] = {}
+            self.errors: dict[str, int] = {}
+            # Time spent in calls, including failed ones.
+            self.call_seconds = 0.0
+            self.rate_limit_wait_seconds = 0.0
+            self.repairs = {"local": 0, "request": 0, "failed": 0}
+            self.concurrency: dict[str, float] = {}
+            self.http_requests = 0
+            self.http_connections = 0
+            self.coalesced_requests = 0
+
+    def record_call(self, name: str, seconds: float, ok: bool = True) -> None:
+        """Record a completed or failed call.
+
+        Args:
+            name: Name of the call, e.g. its response schema.
+            seconds: Latency of the call.
+            ok: Whether the call succeeded.
+        """
+        with self._lock:
+            self.call_seconds += seconds
+            for timer in _call_timers.get():
+                timer.seconds += seconds
+            if ok:
+                self.latencies.setdefault(name, []).append(seconds)
+            else:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def record_rate_limit_wait(self, seconds: float) -> None:
+        """Record time spent waiting for rate limiter tokens.
+
+        Args:
+            seconds: The waiting time.
+        """
+        with self._lock:
+            self.rate_limit_wait_seconds += seconds
+
+    def record_repair(self, outcome: str) -> None:
+        """Record the repair of a response which failed schema validation.
+
+        Args:
+            outcome: "local" if repaired without calling the LLM, "request" if repaired
+                with a short repair request, "failed" if it could not be repaired.
+        """
+        with self._lock:
+            self.repairs[outcome] += 1
+
+    def record_http_request(self) -> None:
+        """Record an HTTP request sent by a shared client of `llm.clients`."""
+        with self._lock:
+            self.http_requests += 1
+
+    def record_http_connection(self) -> None:
+        """Record a connection opened by a shared client of `llm.clients`."""
+        with self._lock:
+            self.http_connections += 1
+
+    def record_coalesced(self) -> None:
+        """Record a request which waited for an identical one in flight, see `llm.coalescing`."""
+        with self._lock:
+            self.coalesced_requests += 1
+
+    def record_concurrency(self, state: dict[str, float]) -> None:
+        """Record the current state of the adaptive concurrency controller.
+
+        Args:
+            state: Its limits and counters, see `AdaptiveConcurrency.state`.
+        """
+        with self._lock:
+            self.concurrency = dict(state)
+
+    @contextmanager
+    def track_call(self, name: str) -> Iterator[None]:
+        """Record the latency and outcome of the call made within the context.
+
+        Args:
+            name: Name of the call, e.g. its response schema.
+
+        Yields:
+            None.
+        """
+        start = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.record_call(name, time.perf_counter() - start, ok)
+
+    def summary(self) -> dict:
+        """Summarize the telemetry since the last reset.
+
+        Returns:
+            Call and error counts, calls per second, rate limiter waiting time,
+            repairs of invalid responses (each one a full request avoided), requests
+            coalesced with an identical one in flight, the
+            state of the adaptive concurrency controller (empty when it is disabled),
+            HTTP requests and the connections they opened or reused, and
+            per-call-name latency statistics.
+        """
+        with self._lock:
+            elapsed = time.perf_counter() - self.start_time
+            num_calls = sum(len(latencies) for latencies in self.latencies.values())
+            return {
+                "elapsed_seconds": elapsed,
+                "calls": num_calls,
+                "errors": sum(self.errors.values()),
+                "calls_per_second": num_calls / elapsed if elapsed else 0.0,
+                "rate_limit_wait_seconds": self.rate_limit_wait_seconds,
+                "repairs": dict(self.repairs),
+                "full_requests_avoided": self.repairs["local"] + self.repairs["request"],
+                "coalesced_requests": self.coalesced_requests,
+                "concurrency": dict(self.concurrency),
+                "http": {
+                    "requests": self.http_requests,
+                    "connections_opened": self.http_connections,
+                    "connections_reused": max(0, self.http_requests - self.http_connections),
+                },
+                "stages": {
+                    name: {
+                        "calls": len(latencies),
+                        "errors": self.errors.get(name, 0),
+                        "mean_seconds": sum(latencies) / len(latencies),
+                        "p95_seconds": percentile(latencies, 95),
+                    }
+                    for name, latencies in self.latencies.items()
+                },
+            }
+
+
+@functools.cache
+def get_telemetry() -> Telemetry:
+    """Get the telemetry shared by all LLM calls of the process.
+
+    Returns:
+        The telemetry.
+    """
+    return Telemetry()
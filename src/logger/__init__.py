@@ -1,9 +1,42 @@
-"""Logging configuration for alt-core."""
+"""Logging configuration for alt-core.
 
+Records go to stdout, as text or, with `LOG_FORMAT=json`, as one JSON object
+per line including the fields of the enclosing `log_context` (e.g. run id and
+stage). With `LOG_QUEUE=1`, records are written by a background thread so
+logging never blocks the caller, e.g. async LLM calls.
+"""
+
+import functools
 import logging
 import os
 import sys
 
+from .handlers import ContextFilter, JsonFormatter, NonBlockingHandler, log_context
+
+__all__ = ["add_handler", "get_logger", "log_context", "remove_handler"]
+
+# Loggers created by `get_logger` and handlers shared by all of them.
+_loggers: list[logging.Logger] = []
+_shared_handlers: list[logging.Handler] = []
+_context_filter = ContextFilter()
+
+
+@functools.cache
+def _console_handler() -> logging.Handler:
+    handler = logging.StreamHandler(sys.stdout)
+    if os.getenv("LOG_FORMAT", "text").lower() == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(
+            logging.Formatter(
+                "%(asctime)s - %(levelname)s - %(name)s - %(message)s",
+                datefmt="%Y-%m-%d %H:%M:%S",
+            )
+        )
+    if os.getenv("LOG_QUEUE", "0") == "1":
+        return NonBlockingHandler(handler)
+    return handler
+
 
 def get_logger(name: str, level: str | None = None) -> logging.Logger:
     """Get a logger with the given name.
@@ -19,17 +52,10 @@ def get_logger(name: str, level: str | None = None) -> logging.Logger:
     logger = logging.getLogger(name)
 
     if not logger.handlers:
-        # Create console handler
-        handler = logging.StreamHandler(sys.stdout)
-
-        # Create formatter
-        formatter = logging.Formatter(
-            "%(asctime)s - %(levelname)s - %(name)s - %(message)s", datefmt="%Y-%m-%d %H:%M:%S"
-        )
-
-        # Set up handler
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
+        logger.addHandler(_console_handler())
+        logger.addFilter(_context_filter)
+        for shared_handler in _shared_handlers:
+            logger.addHandler(shared_handler)
 
         # Set level from environment variable or parameter, default to INFO
         log_level = str(level or os.getenv("LOG_LEVEL", "INFO")).upper()
@@ -37,5 +63,28 @@ def get_logger(name: str, level: str | None = None) -> logging.Logger:
 
         # Prevent propagation to root logger
         logger.propagate = False
+        _loggers.append(logger)
 
     return logger
+
+
+def add_handler(handler: logging.Handler) -> None:
+    """Add a handler to every logger, including loggers created later.
+
+    Args:
+        handler: The handler to add.
+    """
+    _shared_handlers.append(handler)
+    for logger in _loggers:
+        logger.addHandler(handler)
+
+
+def remove_handler(handler: logging.Handler) -> None:
+    """Remove a handler added with `add_handler`.
+
+    Args:
+        handler: The handler to remove.
+    """
+    _shared_handlers.remove(handler)
+    for logger in _loggers:
+        logger.removeHandler(handler)
@@ -0,0 +1,146 @@
+"""Structured records, logging context and a non-blocking handler."""
+
+import json
+import logging
+import os
+import queue
+import weakref
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Attributes every record has; anything else was added as context or `extra`.
+_RECORD_ATTRIBUTES = {
+    *logging.LogRecord("", logging.INFO, "", 0, "", None, None).__dict__,
+    "message",
+    "asctime",
+}
+
+_log_context: ContextVar[dict[str, object] | None] = ContextVar("log_context", default=None)
+
+# Non-blocking handlers which are not closed yet, see `_restart_in_child`.
+_open_handlers: "weakref.WeakSet[NonBlockingHandler]" = weakref.WeakSet()
+
+
+@contextmanager
+def log_context(**fields: object) -> Iterator[None]:
+    """Attach fields, e.g. a run id or a stage, to every record logged within the context.
+
+    Args:
+        **fields: The fields, added to the fields of enclosing contexts.
+
+    Yields:
+        None.
+    """
+    token = _log_context.set({**(_log_context.get() or {}), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Adds the fields of the current `log_context` to records."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Add the context fields to a record.
+
+        Args:
+            record: The record.
+
+        Returns:
+            True, records are never dropped.
+        """
+        for key, value in (_log_context.get() or {}).items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line, including context fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Format a record.
+
+        Args:
+            record: The record.
+
+        Returns:
+            The JSON line.
+        """
+        entry = {
+            "time": self.formatTime(record, DATE_FORMAT),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(
+            (key, value) for key, value in record.__dict__.items() if key not in _RECORD_ATTRIBUTES
+        )
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class NonBlockingHandler(QueueHandler):
+    """Hands records to a background thread which writes them with the wrapped handlers.
+
+    Arguments are merged into the message by the caller, so later changes to the
+    logged objects do not show up in it, while formatting and writing records is
+    left to the background thread.
+    """
+
+    def __init__(self, *handlers: logging.Handler) -> None:
+        """Initialize the handler and start its background thread.
+
+        Args:
+            *handlers: The handlers writing the records.
+        """
+        super().__init__(queue.SimpleQueue())
+        self.handlers = handlers
+        self._start_listener()
+        _open_handlers.add(self)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Merge the arguments into the message, leaving the rest to the background thread.
+
+        Args:
+            record: The record.
+
+        Returns:
+            The record to queue.
+        """
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def _start_listener(self) -> None:
+        self.listener = QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+        self.listener.start()
+
+    def _restart_in_child(self) -> None:
+        self.queue = queue.SimpleQueue()
+        self._start_listener()
+
+    def close(self) -> None:
+        """Write the queued records, then stop the background thread and the handlers."""
+        _open_handlers.discard(self)
+        if self.listener._thread is not None:
+            self.listener.stop()
+        for handler in self.handlers:
+            handler.close()
+        super().close()
+
+
+def _restart_in_child() -> None:
+    """Restart the background threads of the open handlers, as threads do not survive a fork."""
+    for handler in list(_open_handlers):
+        handler._restart_in_child()
+
+
+# Registered once, e.g. for the workers of batch evaluation.
+os.register_at_fork(after_in_child=_restart_in_child)
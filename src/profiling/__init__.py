@@ -0,0 +1,5 @@
+"""Profiling of pipeline stages."""
+
+from .stages import StageProfiler, activate_profiler, profile_stage
+
+__all__ = ["StageProfiler", "activate_profiler", "profile_stage"]
@@ -0,0 +1,194 @@
+"""Timing spans around pipeline stages, with optional cProfile and tracemalloc.
+
+A `StageProfiler` is activated for a run with `activate_profiler`, then code
+wraps its stages in `profile_stage`, which does nothing when no profiler is
+active. Each stage records its wall-clock time, the CPU time of the thread
+running it and the time spent in LLM calls made from the stage's own context
+(see `llm.telemetry.time_calls`), which tells local work such as permutation
+enumeration, validation and JSON dumping apart from waiting on the provider,
+even while other runs share the process. Hotspots and peak memory are only collected for
+the outermost stage, as cProfile and tracemalloc cannot be nested.
+"""
+
+import cProfile
+import json
+import pstats
+import time
+import tracemalloc
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from llm.telemetry import time_calls
+from logger import get_logger, log_context
+
+logger = get_logger(__name__)
+
+_active_profiler: ContextVar["StageProfiler | None"] = ContextVar("active_profiler", default=None)
+
+
+class StageProfiler:
+    """Time, CPU, LLM time, hotspots and peak memory of the stages of a run."""
+
+    def __init__(
+        self, hotspots: bool = False, memory: bool = False, num_hotspots: int = 15
+    ) -> None:
+        """Initialize the profiler.
+
+        Args:
+            hotspots: Run cProfile during each stage and report its top functions.
+            memory: Trace allocations during each stage and report its peak memory.
+            num_hotspots: Number of functions reported per stage.
+        """
+        self.hotspots = hotspots
+        self.memory = memory
+        self.num_hotspots = num_hotspots
+        self.start_time = time.perf_counter()
+        self.stages: dict[str, dict] = {}
+        self._profiles: dict[str, cProfile.Profile] = {}
+        self._depth = 0
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Profile the code run within the context as a stage.
+
+        Entering a stage with the same name again adds to its totals.
+
+        Args:
+            name: Name of the stage.
+
+        Yields:
+            None.
+        """
+        outermost = self._depth == 0
+        profile = self._start_hotspots(name) if self.hotspots and outermost else None
+        traced = self.memory and outermost and not tracemalloc.is_tracing()
+        if traced:
+            tracemalloc.start()
+        cpu_start = time.thread_time()
+        wall_start = time.perf_counter()
+        self._depth += 1
+        try:
+            with time_calls() as llm_timer:
+                yield
+        finally:
+            self._depth -= 1
+            stats = self.stages.setdefault(
+                name, {"calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0, "llm_seconds": 0.0}
+            )
+            stats["calls"] += 1
+            stats["wall_seconds"] += time.perf_counter() - wall_start
+            stats["cpu_seconds"] += time.thread_time() - cpu_start
+            stats["llm_seconds"] += llm_timer.seconds
+            if profile is not None:
+                profile.disable()
+            if traced:
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                stats["peak_memory_bytes"] = max(stats.get("peak_memory_bytes", 0), peak)
+
+    def _start_hotspots(self, name: str) -> cProfile.Profile | None:
+        profile = self._profiles.setdefault(name, cProfile.Profile())
+        try:
+            profile.enable()
+        except ValueError:
+            # Only one profiler can run at a time, e.g. with concurrent runs.
+            logger.warning(f"Another profiler is active, no hotspots for stage {name}")
+            return None
+        return profile
+
+    def top_functions(self, name: str) -> list[dict]:
+        """Get the functions of a stage with the highest own time.
+
+        Args:
+            name: Name of the stage.
+
+        Returns:
+            The location, number of calls, own time and cumulative time of each function.
+        """
+        if name not in self._profiles:
+            return []
+        # Keyed by (file, line, function), values are (primitive calls, calls, own
+        # time, cumulative time, callers).
+        functions = pstats.Stats(self._profiles[name]).stats  # type: ignore[attr-defined]
+        top = sorted(functions.items(), key=lambda item: item[1][2], reverse=True)
+        return [
+            {
+                "function": f"{filename}:{line}({function})",
+                "calls": num_calls,
+                "own_seconds": own_seconds,
+                "cumulative_seconds": cumulative_seconds,
+            }
+            for (filename, line, function), (_, num_calls, own_seconds, cumulative_seconds, _) in (
+                top[: self.num_hotspots]
+            )
+        ]
+
+    def report(self) -> dict:
+        """Build the profile report of the stages run so far.
+
+        Returns:
+            The total wall-clock time and the statistics of each stage, in the order
+            the stages were first entered.
+        """
+        stages = {}
+        for name, stats in self.stages.items():
+            stages[name] = dict(stats)
+            if self.hotspots:
+                stages[name]["hotspots"] = self.top_functions(name)
+        return {"wall_seconds": time.perf_counter() - self.start_time, "stages": stages}
+
+    def save(self, path: Path) -> None:
+        """Save the profile report and log a summary of it.
+
+        Args:
+            path: Path of the report.
+        """
+        report = self.report()
+        with path.open("w") as f:
+            json.dump(report, f, indent=4)
+        for name, stats in report["stages"].items():
+            logger.info(
+                f"Stage {name}: {stats['wall_seconds']:.3f}s wall, "
+                f"{stats['cpu_seconds']:.3f}s CPU, {stats['llm_seconds']:.3f}s in LLM calls"
+            )
+        logger.info(f"Saved profile {path}")
+
+
+@contextmanager
+def activate_profiler(profiler: StageProfiler | None) -> Iterator[None]:
+    """Make a profiler record the stages run within the context.
+
+    Args:
+        profiler: The profiler to activate, or None for no profiling.
+
+    Yields:
+        None.
+    """
+    token = _active_profiler.set(profiler)
+    try:
+        yield
+    finally:
+        _active_profiler.reset(token)
+
+
+@contextmanager
+def profile_stage(name: str) -> Iterator[None]:
+    """Profile a stage with the active profiler, if there is one.
+
+    Records logged within the stage carry its name in their `stage` field.
+
+    Args:
+        name: Name of the stage.
+
+    Yields:
+        None.
+    """
+    profiler = _active_profiler.get()
+    with log_context(stage=name):
+        if profiler is None:
+            yield
+            return
+        with profiler.stage(name):
+            yield
@@ -0,0 +1,106 @@
+"""Tests for the adaptive concurrency controller of LLM calls."""
+
+import pytest
+
+from src.llm import caller
+from src.llm.caller import AdaptiveConcurrency, MinuteRateLimiter, retry_after_seconds
+
+
+class ThrottledError(Exception):
+    """Stands in for a provider's 429 error."""
+
+    status_code = 429
+
+    def __init__(self, message: str, retry_after: str) -> None:
+        """Initialize the error.
+
+        Args:
+            message: The error message.
+            retry_after: The `retry-after` header of the response.
+        """
+        super().__init__(message)
+        self.litellm_response_headers = {"retry-after": retry_after}
+
+
+def test_throttles_cut_limits_once_per_cooldown() -> None:
+    """A burst of 429s halves the in-flight limit once; tokens are only cut on token limits."""
+    rate_limiter = MinuteRateLimiter(tokens_per_minute=100_000)
+    controller = AdaptiveConcurrency(rate_limiter, max_concurrency=8)
+    for _ in range(3):
+        controller.enter(tokens=1000)
+    controller.release("InitialKG", 0.1, "throttled", retry_after=30.0)
+    controller.release("InitialKG", 0.1, "throttled", retry_after=30.0, tokens_limited=True)
+    state = controller.state()
+    assert state["limit"] == 4
+    assert state["throttles"] == 2
+    assert state["decreases"] == 1
+    assert state["tokens_per_minute"] == 100_000
+
+    # A minute later, the 3000 tokens sent are the rate of the last minute, cut to
+    # half and floored at a tenth of the configured rate.
+    controller.cooldown_until = 0.0
+    controller.start_time -= 60
+    controller.release("InitialKG", 0.1, "throttled", tokens_limited=True)
+    assert rate_limiter.tokens_per_minute == 10_000
+    assert controller.state()["in_flight"] == 0
+
+
+def test_rate_never_drops_below_the_largest_prompt() -> None:
+    """Token cuts stop at the largest prompt, which the limiter admits once its bucket is full."""
+    rate_limiter = MinuteRateLimiter(tokens_per_minute=100_000)
+    controller = AdaptiveConcurrency(rate_limiter, max_concurrency=8)
+    controller.enter(tokens=20_000)
+    controller.start_time -= 60
+    controller.release("InitialKG", 0.1, "throttled", tokens_limited=True)
+    assert rate_limiter.tokens_per_minute == 20_000
+
+    # A prompt larger than the bucket goes through once the bucket is full, then
+    # waits for the debt to be refilled.
+    rate_limiter = MinuteRateLimiter(tokens_per_minute=10_000)
+    assert rate_limiter._try_acquire(20_000)
+    assert not rate_limiter._try_acquire(1)
+
+
+def test_successes_raise_limit_up_to_its_maximum() -> None:
+    """Each success adds 1 / limit, so a round of successful requests adds about one."""
+    controller = AdaptiveConcurrency(MinuteRateLimiter(100_000), max_concurrency=4)
+    controller.limit = 2.0
+    for _ in range(2):
+        controller.enter(tokens=10)
+        controller.release("KGAsText", 0.1)
+    assert controller.limit == pytest.approx(2 + 1 / 2 + 1 / 2.5)
+    for _ in range(20):
+        controller.enter(tokens=10)
+        controller.release("KGAsText", 0.1)
+    assert controller.limit == 4.0
+
+
+def test_retry_after_header_is_parsed() -> None:
+    """Delays in seconds or milliseconds are read, HTTP dates are ignored."""
+    assert retry_after_seconds(ThrottledError("Rate limit reached", "2")) == 2.0
+    error = ThrottledError("Rate limit reached", "Wed, 21 Oct 2026 07:28:00 GMT")
+    assert retry_after_seconds(error) is None
+    error.litellm_response_headers = {"retry-after-ms": "250"}
+    assert retry_after_seconds(error) == 0.25
+    assert retry_after_seconds(ValueError()) is None
+
+
+def test_throttled_calls_are_retried(monkeypatch: pytest.MonkeyPatch) -> None:
+    """A 429 is retried after its delay and counted by the controller; other errors are not."""
+    controller = AdaptiveConcurrency(MinuteRateLimiter(100_000), max_concurrency=4)
+    monkeypatch.setattr(caller, "get_concurrency_controller", lambda: controller)
+    monkeypatch.setattr(caller, "get_rate_limiter", lambda: MinuteRateLimiter(100_000))
+    responses: list[object] = [ThrottledError("Rate limit reached", "0"), "response"]
+
+    def call() -> object:
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    assert caller._call_with_limits("KGAsText", 10, call) == "response"
+    assert controller.state()["throttles"] == 1
+
+    with pytest.raises(ValueError):
+        caller._call_with_limits("KGAsText", 10, lambda: int("invalid"))
+    assert controller.state()["in_flight"] == 0
@@ -0,0 +1,28 @@
+"""Tests for run-level LLM budgets."""
+
+import pytest
+
+from src.llm.budget import BudgetExceededError, RunBudget
+
+
+def test_budget_allows_requests_within_limits() -> None:
+    """Requests fitting the remaining budget pass the check."""
+    budget = RunBudget(max_tokens=10_000)
+    budget.check("openai/gpt-4o-2024-08-06", prompt_tokens=1_000)
+    assert budget.exceeded is None
+
+
+def test_budget_stops_requests_exceeding_tokens() -> None:
+    """A request that would exceed the token limit is refused and recorded."""
+    budget = RunBudget(max_tokens=10_000)
+    budget.record(tokens=9_000, cost=0.0)
+    with pytest.raises(BudgetExceededError):
+        budget.check("openai/gpt-4o-2024-08-06", prompt_tokens=1_000)
+    assert budget.to_dict()["exceeded"] is not None
+
+
+def test_budget_stops_requests_after_deadline() -> None:
+    """No request is allowed once the wall-clock limit has passed."""
+    budget = RunBudget(max_seconds=0)
+    with pytest.raises(BudgetExceededError):
+        budget.check("openai/gpt-4o-2024-08-06", prompt_tokens=1)
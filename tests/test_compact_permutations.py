@@ -0,0 +1,49 @@
+"""Tests for the compact storage of knowledge graph permutations."""
+
+from src.generators.ken_c137.graphs.compact_permutations import (
+    compact_outputs,
+    expand_outputs,
+    load_permutations,
+)
+from src.generators.ken_c137.graphs.permute_knowledge_graph import create_permutations
+
+
+def test_compact_permutations_round_trip() -> None:
+    """Permutations rebuilt from their id remaps equal the generated graphs."""
+    graph = {
+        "nodes": [
+            {"id": 1, "label": "Participant"},
+            {"id": 2, "label": "Unique Pattern"},
+            {"id": 3, "label": "Shared Pattern"},
+            {"id": 4, "label": "Non-Chosen Pattern"},
+        ],
+        "edges": [
+            {"source": 1, "target": 2, "relation": "prefers"},
+            {"source": 2, "target": 3, "relation": "over"},
+            {"source": 3, "target": 4, "relation": "over"},
+        ],
+    }
+    semantic_groups = {
+        "experiment_1": {
+            "Patterns": [
+                {"id": 2, "label": "Unique Pattern", "level": 1},
+                {"id": 3, "label": "Shared Pattern", "level": 1},
+                {"id": 4, "label": "Non-Chosen Pattern", "level": 1},
+            ]
+        }
+    }
+    permutations, _, _ = create_permutations({"experiment_1": graph}, semantic_groups)
+    outputs = {
+        "knowledge_graph": {"experiment_1": graph},
+        "knowledge_graph_permutations": permutations,
+    }
+
+    compacted = compact_outputs(outputs)
+    assert compacted["permutation_format"] == "remap"
+    lazy = load_permutations(compacted)["experiment_1"]
+    assert len(lazy) == len(permutations["experiment_1"]) == 5
+    for permutation_i, permuted_graph in permutations["experiment_1"].items():
+        assert lazy[str(permutation_i)] == permuted_graph
+    assert expand_outputs(compacted)["knowledge_graph_permutations"] == {
+        "experiment_1": {str(i): g for i, g in permutations["experiment_1"].items()}
+    }
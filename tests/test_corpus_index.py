@@ -0,0 +1,67 @@
+"""Tests for the corpus index."""
+
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from src.corpus.index import CorpusIndex
+
+
+def write_json(path: Path, data: dict, mtime: float) -> None:
+    """Write a JSON file with a given modification time."""
+    path.write_text(json.dumps(data))
+    os.utime(path, (mtime, mtime))
+
+
+def test_refresh_only_reindexes_changed_outputs(tmp_path: Path) -> None:
+    """New and modified outputs are indexed, unchanged ones skipped, deleted ones removed."""
+    paper_dir = tmp_path / "papers" / "10.1000:example"
+    paper_dir.mkdir(parents=True)
+    gen_path = paper_dir / "gen_ken_c137_algo1_gpt-4o.json"
+    gen_outputs = {
+        "llm": "gpt-4o",
+        "results_permutations": {"experiment_1": {"2": "text"}},
+        "triple_deviation_pct": {"experiment_1": {"2": 0.6, "3": 0.2}},
+        "token_cost": {"methods": 0.1, "kg_permutes_to_text": 0.2, "total": 0.3},
+    }
+    write_json(gen_path, gen_outputs, mtime=1.0)
+    eval_path = paper_dir / "eval_lexsim_c001_gen_ken_c137_algo1_gpt-4o.json"
+    write_json(eval_path, {"summary": {"num_passed": 1}}, mtime=1.0)
+
+    with CorpusIndex(tmp_path / "index.sqlite") as index:
+        assert index.refresh(tmp_path / "papers") == {"indexed": 2, "removed": 0, "unchanged": 0}
+        assert index.counts() == (1, 1, 1)
+        rows = index.query(
+            "SELECT permutation_id, has_results FROM permutations WHERE deviation > 0.5"
+        )
+        assert [tuple(row) for row in rows] == [("2", 1)]
+
+        write_json(gen_path, {**gen_outputs, "token_cost": {"total": 0.5}}, mtime=2.0)
+        eval_path.unlink()
+        assert index.refresh(tmp_path / "papers") == {"indexed": 1, "removed": 1, "unchanged": 0}
+        assert index.query("SELECT total_cost FROM gen_runs")[0][0] == 0.5
+        assert index.counts() == (1, 1, 0)
+
+
+def test_paths_spelled_differently_are_the_same_output(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Outputs indexed with relative paths are not indexed again under absolute ones."""
+    monkeypatch.chdir(tmp_path)
+    paper_dir = Path("papers") / "10.1000:example"
+    paper_dir.mkdir(parents=True)
+    gen_path = paper_dir / "gen_ken_c137_algo1_gpt-4o.json"
+    write_json(gen_path, {"llm": "gpt-4o", "token_cost": {"total": 0.3}}, mtime=1.0)
+
+    with CorpusIndex(tmp_path / "index.sqlite") as index:
+        index.index_file(gen_path)
+        assert index.refresh(tmp_path / "papers") == {"indexed": 0, "removed": 0, "unchanged": 1}
+
+        # Entries of an index written before paths were resolved are replaced.
+        with index.connection:
+            index.connection.execute("UPDATE files SET path = ?", (str(gen_path),))
+            index.connection.execute("UPDATE gen_runs SET path = ?", (str(gen_path),))
+        assert index.refresh(tmp_path / "papers") == {"indexed": 1, "removed": 1, "unchanged": 0}
+        assert index.counts() == (1, 1, 0)
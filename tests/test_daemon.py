@@ -0,0 +1,208 @@
+"""Tests for the daemon running generation and evaluation jobs."""
+
+import asyncio
+import contextlib
+import threading
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+
+from src.daemon import server
+from src.daemon.client import submit
+from src.daemon.protocol import decode, encode
+from src.llm.caller import MinuteRateLimiter
+
+
+def test_messages_round_trip_as_lines() -> None:
+    """Messages are encoded as single lines of JSON and decoded back."""
+    message = {"event": "log", "message": "Converting permutation 2\nof 3"}
+    encoded = encode(message)
+    assert encoded.endswith(b"\n")
+    assert encoded.count(b"\n") == 1
+    assert decode(encoded) == message
+
+
+def test_run_job_maps_options_to_run_arguments(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Generation options become the generator's run arguments, other kinds are dispatched."""
+    calls: list[tuple] = []
+    monkeypatch.setattr(server, "generate", lambda *args: calls.append(args) or Path("gen.json"))
+    monkeypatch.setattr(server, "evaluate", lambda *args: calls.append(args) or Path("eval.json"))
+
+    job = {
+        "kind": "generate",
+        "doi": "10.1000:example",
+        "gen_uid": "ken_c137",
+        "algo_name": "algo1",
+        "llm": "gpt-4o",
+        "packed": True,
+        "compact": True,
+        "compact_prompts": True,
+        "similarity_threshold": 0.5,
+        "max_cost": 1.5,
+        "incremental": True,
+        "stream_output": True,
+    }
+    assert server.run_job(job) == Path("gen.json")
+    doi, uid, algo_name, llm, max_num_samples, config, incremental, run_kwargs, stream = calls[0]
+    assert (doi, uid, algo_name, llm, max_num_samples, config) == (
+        "10.1000:example",
+        "ken_c137",
+        "algo1",
+        "gpt-4o",
+        10,
+        "",
+    )
+    assert incremental and stream
+    assert run_kwargs["packed"] and run_kwargs["compact"]
+    assert run_kwargs["compact_prompts"]
+    assert run_kwargs["similarity_threshold"] == 0.5
+    assert run_kwargs["budget"].max_cost == 1.5
+
+    assert server.run_job({**job, "packed": False, "compact_prompts": False})
+    assert calls[1][7] == {
+        "compact": True,
+        "similarity_threshold": 0.5,
+        "budget": calls[1][7]["budget"],
+    }
+
+    evaluate_job = {"kind": "evaluate", "doi": "d", "eval_uid": "lexsim_c001"}
+    assert server.run_job({**evaluate_job, "gen_outputs_path": "gen.json"}) == Path("eval.json")
+    assert calls[2] == ("d", "lexsim_c001", Path("gen.json"))
+    with pytest.raises(ValueError, match="Unknown job kind"):
+        server.run_job({"kind": "train"})
+
+
+def test_job_logs_are_captured_per_thread(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Only the logs of the job's thread are published, and the handler is removed after."""
+
+    def run_job(job: dict) -> Path:
+        server.logger.info(f"Running {job['doi']}")
+        other = threading.Thread(target=server.logger.info, args=("Another job",))
+        other.start()
+        other.join()
+        return Path("gen.json")
+
+    monkeypatch.setattr(server, "run_job", run_job)
+    events: list[dict] = []
+    server.run_job_with_progress({"doi": "10.1000:example"}, events.append)
+    assert [event["event"] for event in events] == ["log", "done"]
+    assert events[0]["message"].endswith("Running 10.1000:example")
+    assert events[1]["output_path"] == "gen.json"
+
+    server.logger.info("After the job")
+    assert len(events) == 2
+
+    monkeypatch.setattr(server, "run_job", lambda job: None)
+    server.run_job_with_progress({}, events.append)
+    assert events[-1] == {"event": "error", "message": "Job failed, see the daemon logs"}
+
+
+@pytest.fixture
+def socket_path(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[str]:
+    """Run a daemon on a temporary socket whose jobs log a line and succeed.
+
+    Yields:
+        The path of the socket.
+    """
+
+    def run_job(job: dict) -> Path:
+        server.logger.info(f"Generating {job['doi']}")
+        return Path(f"papers/{job['doi']}/gen.json")
+
+    monkeypatch.setattr(server, "run_job", run_job)
+    monkeypatch.setattr(server, "get_rate_limiter", lambda: MinuteRateLimiter(1000))
+    path = str(tmp_path / "daemon.sock")
+    daemon = server.Daemon(workers=2)
+    loop = asyncio.new_event_loop()
+    task = loop.create_task(daemon.serve_forever(path))
+
+    def serve() -> None:
+        with contextlib.suppress(asyncio.CancelledError):
+            loop.run_until_complete(task)
+
+    thread = threading.Thread(target=serve)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while not Path(path).exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    yield path
+    loop.call_soon_threadsafe(task.cancel)
+    thread.join()
+    loop.close()
+    daemon.executor.shutdown()
+
+
+def test_client_streams_job_events_from_the_daemon(socket_path: str) -> None:
+    """A client gets the logs of its job, then its final event; status needs no job."""
+    events = list(submit({"kind": "generate", "doi": "10.1000:example"}, socket_path))
+    assert [event["event"] for event in events] == ["log", "done"]
+    assert "Generating 10.1000:example" in events[0]["message"]
+    assert events[1]["output_path"] == "papers/10.1000:example/gen.json"
+
+    (status,) = submit({"kind": "status"}, socket_path)
+    assert status == {
+        "event": "done",
+        "workers": 2,
+        "running_jobs": 0,
+        "tokens_per_minute": 1000,
+        "tokens_available": 1000,
+    }
+
+
+class DisconnectedWriter:
+    """Stream writer of a client which disconnected once the job had started."""
+
+    def __init__(self) -> None:
+        """Initialize the writer."""
+        self.writes: list[bytes] = []
+
+    def write(self, data: bytes) -> None:
+        """Record written data.
+
+        Args:
+            data: The data.
+        """
+        self.writes.append(data)
+
+    async def drain(self) -> None:
+        """Fail as the client is gone.
+
+        Raises:
+            ConnectionResetError: Always.
+        """
+        raise ConnectionResetError("Client disconnected")
+
+    def close(self) -> None:
+        """Close the writer."""
+
+
+def test_jobs_of_disconnected_clients_still_count(monkeypatch: pytest.MonkeyPatch) -> None:
+    """A job keeps counting as running after its client is gone, and publishes no more."""
+    release = threading.Event()
+
+    def run_job(job: dict) -> Path:
+        server.logger.info("Started")
+        release.wait(5)
+        server.logger.info("Finishing")
+        return Path("gen.json")
+
+    monkeypatch.setattr(server, "run_job", run_job)
+    daemon = server.Daemon(workers=1)
+    reader = asyncio.StreamReader()
+    reader.feed_data(encode({"kind": "generate", "doi": "10.1000:example"}))
+    writer = DisconnectedWriter()
+
+    async def disconnect_mid_job() -> None:
+        await daemon.handle_client(reader, writer)  # type: ignore[arg-type]
+        assert daemon.running_jobs == 1
+        release.set()
+        deadline = time.monotonic() + 5
+        while daemon.running_jobs and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(disconnect_mid_job())
+    daemon.executor.shutdown()
+    assert daemon.running_jobs == 0
+    assert len(writer.writes) == 1
@@ -0,0 +1,66 @@
+"""Tests for the batch mode of the evaluators command line."""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from src.evaluators import main
+
+
+def write_gen_outputs(path: Path, content: str) -> None:
+    """Write generator outputs older than any evaluator's code.
+
+    Args:
+        path: Path of the generator outputs.
+        content: Content of the file.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+    os.utime(path, (0, 0))
+
+
+def test_fresh_evaluations_are_newer_than_outputs_and_code(tmp_path: Path) -> None:
+    """Evaluations are only fresh when newer than the generator outputs and evaluator."""
+    gen_path = tmp_path / "gen_ken_c137_algo1_gpt-4o.json"
+    eval_path = tmp_path / "eval_lexsim_c001_gen_ken_c137_algo1_gpt-4o.json"
+    write_gen_outputs(gen_path, "{}")
+    assert not main.is_fresh(eval_path, gen_path, module_mtime=0)
+    eval_path.write_text("{}")
+    os.utime(eval_path, (10, 10))
+    assert main.is_fresh(eval_path, gen_path, module_mtime=5)
+    assert not main.is_fresh(eval_path, gen_path, module_mtime=20)
+    os.utime(gen_path, (30, 30))
+    assert not main.is_fresh(eval_path, gen_path, module_mtime=5)
+
+
+def test_batch_records_failures_and_skips_fresh_pairs(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Bad outputs and unknown evaluators fail their pairs only, fresh pairs are skipped."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main, "ProcessPoolExecutor", ThreadPoolExecutor)
+    good_path = Path("papers/10.1000:good/gen_ken_c137_algo1_gpt-4o.json")
+    bad_path = Path("papers/10.1000:bad/gen_ken_c137_algo1_gpt-4o.json")
+    write_gen_outputs(good_path, "{}")
+    write_gen_outputs(bad_path, "{")
+
+    def evaluate(doi: str, uid: str, gen_outputs_path: Path) -> Path:
+        json.loads(gen_outputs_path.read_text())
+        eval_path = gen_outputs_path.parent / f"eval_{uid}_{gen_outputs_path.name}"
+        eval_path.write_text("{}")
+        return eval_path
+
+    monkeypatch.setattr(main, "evaluate", evaluate)
+    stats = main.evaluate_batch(["lexsim_c001", "missing_c000"], workers=2)
+    assert {uid: (s["evaluated"], s["failed"], s["skipped"]) for uid, s in stats.items()} == {
+        "lexsim_c001": (1, 1, 0),
+        "missing_c000": (0, 2, 0),
+    }
+
+    stats = main.evaluate_batch(["lexsim_c001"], workers=2)
+    assert (stats["lexsim_c001"]["evaluated"], stats["lexsim_c001"]["skipped"]) == (0, 1)
+    stats = main.evaluate_batch(["lexsim_c001"], workers=2, force=True)
+    assert (stats["lexsim_c001"]["evaluated"], stats["lexsim_c001"]["skipped"]) == (1, 0)
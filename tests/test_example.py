@@ -1,9 +0,0 @@
-"""Test example."""
-
-import src.evaluators
-import src.generators
-
-
-def test_example() -> None:
-    """Test example."""
-    assert True
@@ -0,0 +1,77 @@
+"""Tests for the near-duplicate pruning of knowledge graph permutations."""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from src.generators.ken_c137.graphs.graph_fingerprints import (
+    prune_near_duplicates,
+    weighted_jaccard,
+    wl_fingerprint,
+)
+from src.generators.ken_c137.graphs.permute_knowledge_graph import (
+    apply_permutation,
+    create_permutations,
+)
+from src.generators.ken_c137.kg_pipeline import prune_permutations
+
+# A chain of 20 nodes.
+KG = {
+    "nodes": [{"id": i, "label": f"Variable {i}"} for i in range(1, 21)],
+    "edges": [{"source": i, "target": i + 1, "relation": "causes"} for i in range(1, 20)],
+}
+# Swapping the last two nodes only changes the end of the chain, unlike swapping
+# nodes across it.
+PERMUTATIONS = {
+    2: apply_permutation(KG, (19, 20), (20, 19)),
+    3: apply_permutation(KG, (18, 20), (20, 18)),
+    4: apply_permutation(KG, (2, 12), (12, 2)),
+}
+
+
+def test_similarity_reflects_changed_neighbourhoods() -> None:
+    """Permutations changing the same end of the graph are more similar than others."""
+    first, second, third = (wl_fingerprint(kg) for kg in PERMUTATIONS.values())
+    assert weighted_jaccard(first, first) == 1.0
+    assert weighted_jaccard(first, second) > weighted_jaccard(first, third)
+
+
+def test_near_duplicates_are_pruned() -> None:
+    """The first of near-duplicate permutations is kept, the threshold is validated."""
+    kept, near_duplicates = prune_near_duplicates(PERMUTATIONS, threshold=0.6)
+    assert list(kept) == [2, 4]
+    assert near_duplicates == {3: 2}
+    assert len(prune_near_duplicates(PERMUTATIONS, threshold=1.0)[0]) == 3
+    with pytest.raises(ValueError, match="Similarity threshold"):
+        prune_near_duplicates(PERMUTATIONS, threshold=0.0)
+
+
+def test_pruning_reports_llm_calls_saved() -> None:
+    """Only permutations which would have been sampled count as saved calls."""
+    outputs = {
+        "knowledge_graph_permutations": {"experiment_1": dict(PERMUTATIONS)},
+        "node_swaps_tracker": {"experiment_1": dict.fromkeys(PERMUTATIONS, [])},
+        "triple_deviation_pct": {"experiment_1": dict.fromkeys(PERMUTATIONS, 0.1)},
+    }
+    prune_permutations(outputs, similarity_threshold=0.6, max_num_samples=3)
+    assert outputs["near_duplicate_pruning"]["llm_calls_saved"] == 1
+    assert list(outputs["node_swaps_tracker"]["experiment_1"]) == [2, 4]
+
+    prune_permutations(outputs, similarity_threshold=None, max_num_samples=3)
+    assert outputs["near_duplicate_pruning"]["llm_calls_saved"] == 1
+
+
+def test_threshold_calibrated_on_the_sample_paper() -> None:
+    """Permutations of the sample paper sharing 8 of their 10 triples are near-duplicates."""
+    gen_path = (
+        Path(__file__).parents[1]
+        / "papers/10.1016:j.cognition.2020.104244/gen_ken_c137_algo1_gpt-4o-2024-08-06.json"
+    )
+    with gen_path.open() as f:
+        outputs = json.load(f)
+    kg_perms = create_permutations(outputs["knowledge_graph"], outputs["semantic_groups"])[0]
+    kept, near_duplicates = prune_near_duplicates(kg_perms["experiment_1"], threshold=0.5)
+    assert len(kept) == 3
+    assert len(near_duplicates) == 2
+    assert len(prune_near_duplicates(kg_perms["experiment_1"], threshold=0.6)[0]) == 5
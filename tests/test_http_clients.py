@@ -0,0 +1,107 @@
+"""Tests for the HTTP clients shared by LLM calls."""
+
+import asyncio
+
+import litellm
+import pytest
+
+from src.llm.clients import SharedClients, run_async
+from src.llm.telemetry import Telemetry
+
+
+@pytest.fixture(autouse=True)
+def credentials(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Provide placeholder credentials; no request is sent."""
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("AZURE_API_KEY", "sk-test")
+    monkeypatch.setenv("AZURE_API_BASE", "https://example.openai.azure.com")
+    monkeypatch.setenv("AZURE_API_VERSION", "2024-08-01-preview")
+
+
+def test_sync_clients_are_shared_per_provider() -> None:
+    """Models of a provider share its client; other providers are left to litellm."""
+    clients = SharedClients()
+    client = clients.client("openai/gpt-4o-2024-08-06")
+    assert client is not None
+    assert clients.client("gpt-4o-mini") is client
+    assert clients.client("openai/gpt-4o-2024-08-06", max_retries=0) is not client
+    assert clients.client("azure/gpt-4o-2024-08-06") is not client
+    assert clients.client("anthropic/claude-3-5-sonnet-20240620") is None
+    clients.close()
+    assert client.is_closed()
+
+
+@pytest.mark.parametrize("api_version", [None, ""])
+def test_azure_api_version_falls_back_to_litellm_default(
+    monkeypatch: pytest.MonkeyPatch, api_version: str | None
+) -> None:
+    """Unset or empty API versions, as in `.env.example`, use litellm's default version."""
+    if api_version is None:
+        monkeypatch.delenv("AZURE_API_VERSION")
+    else:
+        monkeypatch.setenv("AZURE_API_VERSION", api_version)
+    clients = SharedClients()
+    client = clients.client("azure/gpt-4o-2024-08-06")
+    assert client is not None
+    assert client._custom_query == {"api-version": litellm.AZURE_DEFAULT_API_VERSION}
+
+    async def get_async_client() -> object:
+        async_client = clients.async_client("azure/gpt-4o-2024-08-06")
+        await clients.aclose()
+        return async_client
+
+    async_client = asyncio.run(get_async_client())
+    assert async_client._custom_query == {"api-version": litellm.AZURE_DEFAULT_API_VERSION}
+    clients.close()
+
+
+@pytest.mark.parametrize("api_base", [None, ""])
+def test_azure_without_endpoint_is_left_to_litellm(
+    monkeypatch: pytest.MonkeyPatch, api_base: str | None
+) -> None:
+    """No shared client is built without an Azure endpoint, litellm reports it instead."""
+    if api_base is None:
+        monkeypatch.delenv("AZURE_API_BASE")
+    else:
+        monkeypatch.setenv("AZURE_API_BASE", api_base)
+    assert SharedClients().client("azure/gpt-4o-2024-08-06") is None
+
+
+def test_async_clients_are_bound_to_their_loop() -> None:
+    """Each event loop gets its own client, closed before the loop ends by `run_async`."""
+    clients = SharedClients()
+
+    async def get_client() -> object:
+        client = clients.async_client("openai/gpt-4o-2024-08-06")
+        assert clients.async_client("openai/gpt-4o-2024-08-06") is client
+        await clients.aclose()
+        return client
+
+    first = asyncio.run(get_client())
+    second = asyncio.run(get_client())
+    assert first is not second
+    assert first.is_closed()
+
+
+def test_run_async_closes_loop_clients(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Clients created within `run_async` are closed when it returns."""
+    clients = SharedClients()
+    monkeypatch.setattr("src.llm.clients.get_shared_clients", lambda: clients)
+
+    async def get_client() -> object:
+        return clients.async_client("openai/gpt-4o-2024-08-06")
+
+    assert run_async(get_client()).is_closed()
+
+
+def test_summary_counts_reused_connections() -> None:
+    """Requests beyond the connections opened were sent on reused connections."""
+    telemetry = Telemetry()
+    for _ in range(3):
+        telemetry.record_http_request()
+    telemetry.record_http_connection()
+    assert telemetry.summary()["http"] == {
+        "requests": 3,
+        "connections_opened": 1,
+        "connections_reused": 2,
+    }
@@ -0,0 +1,125 @@
+"""Tests for the durable queue of generation jobs."""
+
+import json
+import threading
+from pathlib import Path
+
+import pytest
+
+from src.jobs import worker
+from src.jobs.job_queue import JobQueue
+
+
+def generation_jobs(count: int) -> list[dict]:
+    """Build generation jobs for distinct papers.
+
+    Args:
+        count: Number of jobs.
+
+    Returns:
+        The jobs.
+    """
+    return [
+        {
+            "kind": "generate",
+            "doi": f"10.1000:{i}",
+            "gen_uid": "ken_c137",
+            "algo_name": "algo1",
+            "llm": "azure/gpt-4o-2024-08-06",
+        }
+        for i in range(count)
+    ]
+
+
+def test_expired_leases_are_reclaimed_then_dead_lettered(tmp_path: Path) -> None:
+    """A crashed worker's job goes to the next worker, until its attempts are used up."""
+    with JobQueue(tmp_path / "jobs.sqlite") as queue:
+        assert queue.enqueue(generation_jobs(1), max_attempts=2) == 1
+        assert queue.enqueue(generation_jobs(1)) == 0
+
+        job_id, _ = queue.claim("crashed", visibility_timeout=0)
+        assert queue.claim("second", visibility_timeout=0) == (job_id, generation_jobs(1)[0])
+        assert not queue.heartbeat(job_id, "crashed")
+        assert not queue.complete(job_id, "crashed", "papers/out.json")
+
+        assert queue.claim("third") is None
+        assert queue.counts() == {"queued": 0, "leased": 0, "done": 0, "dead": 1}
+        assert queue.jobs("dead")[0]["last_error"] == "Lease expired"
+
+        assert queue.requeue_dead() == 1
+        assert queue.claim("fourth") is not None
+
+
+def test_finished_jobs_are_requeued_on_request(tmp_path: Path) -> None:
+    """Done jobs are only enqueued again when asked, jobs with other options are rejected."""
+    with JobQueue(tmp_path / "jobs.sqlite") as queue:
+        queue.enqueue(generation_jobs(1))
+        job_id, _ = queue.claim("worker")
+        assert queue.complete(job_id, "worker", "papers/out.json")
+        assert queue.enqueue(generation_jobs(1)) == 0
+
+        packed_job = {**generation_jobs(1)[0], "packed": True}
+        assert queue.enqueue([packed_job], requeue_finished=True) == 1
+        assert queue.counts()["queued"] == 1
+        assert queue.claim("worker") == (job_id, packed_job)
+        assert queue.enqueue(generation_jobs(1), requeue_finished=True) == 0
+        assert json.loads(queue.jobs("leased")[0]["job"]) == packed_job
+
+
+def test_failed_jobs_are_retried_after_a_delay(tmp_path: Path) -> None:
+    """Failures make jobs wait for their retry, a release does not count as an attempt."""
+    with JobQueue(tmp_path / "jobs.sqlite") as queue:
+        queue.enqueue(generation_jobs(1), max_attempts=2)
+        job_id, _ = queue.claim("worker")
+        assert queue.fail(job_id, "worker", "RateLimitError()", retry_delay=60)
+        assert queue.claim("worker") is None
+
+        queue.connection.execute("UPDATE jobs SET available_at = 0")
+        job_id, _ = queue.claim("worker")
+        assert queue.release(job_id, "worker")
+        job_id, _ = queue.claim("worker")
+        assert queue.jobs("leased")[0]["attempts"] == 2
+        assert queue.fail(job_id, "worker", "RateLimitError()")
+        assert queue.counts()["dead"] == 1
+
+
+def test_concurrent_workers_never_claim_the_same_job(tmp_path: Path) -> None:
+    """Each job is claimed once by workers claiming at the same time."""
+    path = tmp_path / "jobs.sqlite"
+    with JobQueue(path) as queue:
+        queue.enqueue(generation_jobs(40))
+    claimed: list[int] = []
+    lock = threading.Lock()
+
+    def claim_all(owner: str) -> None:
+        with JobQueue(path) as queue:
+            while (job := queue.claim(owner)) is not None:
+                with lock:
+                    claimed.append(job[0])
+
+    threads = [threading.Thread(target=claim_all, args=(f"worker-{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(claimed) == list(range(1, 41))
+
+
+def test_worker_records_outcomes(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Jobs run through `run_job` with resumable outputs; failures end dead-lettered."""
+    path = tmp_path / "jobs.sqlite"
+    with JobQueue(path) as queue:
+        queue.enqueue(generation_jobs(2), max_attempts=2)
+    runs = []
+
+    def run_job(job: dict) -> Path | None:
+        runs.append(job)
+        return None if job["doi"] == "10.1000:1" else Path("papers/out.json")
+
+    monkeypatch.setattr(worker, "run_job", run_job)
+    stats = worker.run_worker(path, "worker", retry_delay=0, exit_when_idle=True)
+
+    assert stats == {"succeeded": 1, "failed": 2}
+    assert all(job["incremental"] and job["stream_output"] for job in runs)
+    with JobQueue(path) as queue:
+        assert queue.counts() == {"queued": 0, "leased": 0, "done": 1, "dead": 1}
@@ -0,0 +1,114 @@
+"""Tests for the append-only JSONL log of generator outputs."""
+
+import json
+import os
+from pathlib import Path
+
+from src.generators.jsonl_outputs import (
+    COMPLETE_EVENT,
+    JsonlWriter,
+    is_complete,
+    is_current,
+    iter_records,
+    load_partial_outputs,
+    write_json_atomic,
+)
+from src.generators.main import load_previous_outputs
+
+
+def test_partial_outputs_survive_a_truncated_record(tmp_path: Path) -> None:
+    """Records written before a crash are recovered and a half-written one is skipped."""
+    log_path = tmp_path / "gen.jsonl"
+    writer = JsonlWriter(log_path)
+    writer.write(
+        {"event": "stage", "key": "methods", "cost_key": "methods", "value": "m", "cost": 0.1}
+    )
+    writer.write(
+        {
+            "event": "permutation",
+            "experiment": "experiment_1",
+            "permutation_id": "2",
+            "results": "r",
+        }
+    )
+    writer.close()
+    with log_path.open("a") as f:
+        f.write('{"event": "permutation", "experi')
+
+    assert len(list(iter_records(log_path))) == 2
+    assert not is_complete(log_path)
+    assert load_partial_outputs(log_path) == {
+        "methods": "m",
+        "token_cost": {"methods": 0.1},
+        "results_permutations": {"experiment_1": {"2": "r"}},
+    }
+
+
+def test_log_is_complete_after_the_complete_record(tmp_path: Path) -> None:
+    """A log closed by a successful run is recognised as complete."""
+    log_path = tmp_path / "gen.jsonl"
+    writer = JsonlWriter(log_path)
+    writer.write({"event": COMPLETE_EVENT})
+    writer.close()
+    assert is_complete(log_path)
+
+
+def test_resuming_drops_the_truncated_record(tmp_path: Path) -> None:
+    """Records appended when resuming a crashed run start on a line of their own."""
+    log_path = tmp_path / "gen.jsonl"
+    writer = JsonlWriter(log_path)
+    writer.write(
+        {"event": "stage", "key": "methods", "cost_key": "methods", "value": "m", "cost": 0}
+    )
+    writer.close()
+    with log_path.open("a") as f:
+        f.write('{"event": "permutation", "experi')
+
+    writer = JsonlWriter(log_path, append=True)
+    writer.write({"event": COMPLETE_EVENT})
+    writer.close()
+
+    assert [record["event"] for record in iter_records(log_path)] == ["stage", COMPLETE_EVENT]
+    assert is_complete(log_path)
+    assert load_partial_outputs(log_path)["methods"] == "m"
+
+
+def test_resuming_a_log_holding_only_a_truncated_record(tmp_path: Path) -> None:
+    """A log holding only a truncated record is emptied before appending."""
+    log_path = tmp_path / "gen.jsonl"
+    log_path.write_text('{"event": "sta')
+    writer = JsonlWriter(log_path, append=True)
+    writer.write({"event": COMPLETE_EVENT})
+    writer.close()
+    assert log_path.read_text() == '{"event": "complete"}\n'
+
+
+def test_log_older_than_the_outputs_is_stale(tmp_path: Path) -> None:
+    """Outputs rewritten by a later run without streaming win over the log."""
+    output_path = tmp_path / "gen.json"
+    log_path = output_path.with_suffix(".jsonl")
+    writer = JsonlWriter(log_path)
+    writer.write(
+        {"event": "stage", "key": "methods", "cost_key": "methods", "value": "old", "cost": 0}
+    )
+    writer.close()
+    assert is_current(log_path, output_path)
+
+    output_path.write_text(json.dumps({"methods": "new"}))
+    os.utime(log_path, (0, 0))
+    assert not is_current(log_path, output_path)
+    assert load_previous_outputs(output_path) == {"methods": "new"}
+
+
+def test_atomic_outputs_get_the_permissions_of_open(tmp_path: Path) -> None:
+    """New outputs follow the umask and rewritten ones keep their permissions."""
+    umask = os.umask(0)
+    os.umask(umask)
+    output_path = tmp_path / "gen.json"
+    write_json_atomic({"methods": "m"}, output_path)
+    assert output_path.stat().st_mode & 0o777 == 0o666 & ~umask
+
+    output_path.chmod(0o640)
+    write_json_atomic({"methods": "n"}, output_path)
+    assert output_path.stat().st_mode & 0o777 == 0o640
+    assert json.loads(output_path.read_text()) == {"methods": "n"}
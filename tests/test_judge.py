@@ -0,0 +1,127 @@
+"""Tests for the LLM-as-judge evaluator."""
+
+from pathlib import Path
+
+import pytest
+from pydantic import ValidationError
+
+from src.evaluators.judge_c001 import runner
+from src.evaluators.judge_c001.cache import JudgmentCache, judgment_key
+from src.evaluators.judge_c001.prompts import Judgment, Judgments
+
+
+def test_cache_round_trip_is_keyed_by_judge_model(tmp_path: Path) -> None:
+    """Judgments are found again for the same inputs, and not for another judge."""
+    key = judgment_key("methods", "alternative", "gpt-4o")
+    other_key = judgment_key("methods", "alternative", "claude-3-5-sonnet")
+    cache = JudgmentCache(tmp_path / "judge.sqlite")
+    cache.put_many({key: {"plausibility": 4, "rationale": "Consistent with the design."}})
+    cache.close()
+
+    cache = JudgmentCache(tmp_path / "judge.sqlite")
+    assert cache.get_many([key, other_key]) == {
+        key: {"plausibility": 4, "rationale": "Consistent with the design."}
+    }
+    cache.close()
+
+
+@pytest.fixture
+def requests(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> list[list[str]]:
+    """Stub the judge model, answering for the alternatives of each prompt.
+
+    Alternatives containing "invalid" make their request fail validation, those
+    containing "error" make it fail, and those containing "skip" are left out of
+    packed answers.
+
+    Returns:
+        The alternatives of each request.
+    """
+    requests: list[list[str]] = []
+
+    async def ask(
+        model: str, sys_prompt: str, user_prompt: str, output_class: type, **kwargs: object
+    ) -> tuple[Judgments, float]:
+        lines = [line.strip() for line in user_prompt.splitlines()]
+        alternatives = dict(
+            line.removeprefix("Result ").split(": ", 1)
+            for line in lines
+            if line.startswith("Result ")
+        )
+        requests.append(list(alternatives))
+        if any("error" in text for text in alternatives.values()):
+            raise RuntimeError("Service unavailable")
+        if any("invalid" in text for text in alternatives.values()):
+            raise ValidationError.from_exception_data("Judgments", [])
+        judgments = [
+            Judgment(alternative_id=alternative_id, plausibility=4, rationale="Plausible.")
+            for alternative_id, text in alternatives.items()
+            if len(alternatives) == 1 or "skip" not in text
+        ]
+        return Judgments(judgments=judgments), 0.1
+
+    monkeypatch.setattr(runner, "ask_llm_async_with_schema", ask)
+    monkeypatch.setattr(runner, "count_tokens", lambda model, text: len(text.split()))
+    monkeypatch.setattr(runner, "JudgmentCache", lambda: JudgmentCache(tmp_path / "judge.sqlite"))
+    return requests
+
+
+def gen_outputs(*alternatives: str) -> dict:
+    """Build generator outputs with alternatives of a single experiment.
+
+    Args:
+        *alternatives: The alternative results.
+
+    Returns:
+        The outputs.
+    """
+    return {
+        "llm": "gpt-4o",
+        "methods": "Participants rated words.",
+        "results_permutations": {
+            "experiment_1": {str(i): text for i, text in enumerate(alternatives, 2)}
+        },
+    }
+
+
+def test_alternatives_are_packed_and_missing_ones_judged_singly(
+    requests: list[list[str]], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Alternatives share requests, those left out of an answer are judged alone."""
+    monkeypatch.setattr(runner, "MAX_PACK_SIZE", 2)
+    outputs = runner.run("Paper", gen_outputs("Words were rated.", "It skip worked.", "Ratings."))
+    assert requests == [
+        ["experiment_1/2", "experiment_1/3"],
+        ["experiment_1/4"],
+        ["experiment_1/3"],
+    ]
+    assert outputs["summary"]["num_judged"] == 3
+    assert outputs["summary"]["token_cost"] == pytest.approx(0.3)
+
+    # Judgments are cached.
+    outputs = runner.run("Paper", gen_outputs("Words were rated.", "It skip worked.", "Ratings."))
+    assert len(requests) == 3
+    assert outputs["summary"]["num_cached"] == 3
+
+
+def test_invalid_packed_answers_fall_back_to_single_requests(requests: list[list[str]]) -> None:
+    """A packed answer failing validation is judged again one alternative at a time."""
+    outputs = runner.run("Paper", gen_outputs("Words were rated.", "An invalid answer."))
+    assert requests[1:] == [["experiment_1/2"], ["experiment_1/3"]]
+    assert list(outputs["experiments"]["experiment_1"]) == ["2"]
+    assert outputs["summary"]["num_failed"] == 1
+
+
+def test_failed_packs_keep_the_judgments_of_others(
+    requests: list[list[str]], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """A failed request leaves its alternatives unjudged, the others are cached."""
+    monkeypatch.setattr(runner, "MAX_PACK_SIZE", 1)
+    outputs = runner.run("Paper", gen_outputs("Words were rated.", "An error."))
+    assert outputs["summary"] == {
+        "num_alternatives": 2,
+        "num_judged": 1,
+        "num_cached": 0,
+        "num_failed": 1,
+        "token_cost": pytest.approx(0.1),
+    }
+    assert runner.run("Paper", gen_outputs("Words were rated."))["summary"]["num_cached"] == 1
@@ -0,0 +1,66 @@
+"""Tests for the knowledge graph formats of prompts."""
+
+import json
+import re
+from pathlib import Path
+
+import pytest
+
+from src.generators.ken_c137 import kg_pipeline
+from src.generators.ken_c137.prompts.create_user_prompts import KnowledgeGraphCreator
+from src.generators.ken_c137.prompts.kg_formats import (
+    COMPACT_PROMPT_FORMATS,
+    kg_as_compact,
+    kg_as_triples,
+)
+
+KG = {
+    "nodes": [
+        {"id": 1, "label": "Training"},
+        {"id": 2, "label": "Accuracy"},
+        {"id": 3, "label": "Age"},
+    ],
+    "edges": [{"source": 1, "target": 2, "relation": "increases"}],
+}
+
+
+def test_triples_use_labels_and_list_unconnected_nodes() -> None:
+    """Each edge becomes a labelled triple, nodes without edges are listed after them."""
+    assert kg_as_triples(KG) == "Training --increases--> Accuracy\nUnconnected: Age"
+
+
+def test_compact_keeps_node_ids() -> None:
+    """Nodes are listed once with their ids, edges refer to the ids."""
+    assert kg_as_compact(KG) == (
+        "Nodes (id: label):\n1: Training\n2: Accuracy\n3: Age\n"
+        "Edges (id --relation--> id):\n1 --increases--> 2"
+    )
+
+
+def test_packed_prompt_keeps_permutation_ids() -> None:
+    """Multi-line graphs start on their own line, after the header naming their id."""
+    kg_creator = KnowledgeGraphCreator("", COMPACT_PROMPT_FORMATS)
+    prompt = kg_creator.convert_kgs_to_text_packed({"2": KG, "5": KG}, "Original results.")
+    assert re.findall(r"Knowledge graph (\S+):\s", prompt) == ["2", "5"]
+    assert "Knowledge graph 2:\nTraining --increases--> Accuracy" in prompt
+    assert str(KG) not in prompt
+
+
+def test_unknown_format_is_rejected() -> None:
+    """Unknown formats fail when the prompt creator is built rather than mid-run."""
+    with pytest.raises(ValueError, match="Unknown knowledge graph formats"):
+        KnowledgeGraphCreator("", {"kg_to_text": "yaml"})
+
+
+def test_compact_prompts_flag_selects_the_compact_formats() -> None:
+    """Generic callers ask for the compact formats without knowing their names."""
+    previous = json.loads(
+        (
+            Path(__file__).parents[1]
+            / "papers/10.1016:j.cognition.2020.104244/gen_ken_c137_algo1_gpt-4o-2024-08-06.json"
+        ).read_text()
+    )
+    outputs = kg_pipeline.run(
+        "Paper", llm=previous["llm"], previous_outputs=previous, compact_prompts=True
+    )
+    assert outputs["kg_formats"] == COMPACT_PROMPT_FORMATS
@@ -0,0 +1,122 @@
+"""Tests for resuming the knowledge graph pipeline from previous outputs."""
+
+import json
+from pathlib import Path
+
+import pytest
+from pydantic import BaseModel
+
+from src.generators.ken_c137 import kg_pipeline
+from src.generators.ken_c137.prompts.response_models import KGAsText
+
+SAMPLE_OUTPUTS = (
+    Path(__file__).parents[1]
+    / "papers/10.1016:j.cognition.2020.104244/gen_ken_c137_algo1_gpt-4o-2024-08-06.json"
+)
+
+
+@pytest.fixture
+def previous() -> dict:
+    """Load the outputs of the sample paper.
+
+    Returns:
+        The outputs, with five converted permutations.
+    """
+    return json.loads(SAMPLE_OUTPUTS.read_text())
+
+
+@pytest.fixture
+def llm_calls(monkeypatch: pytest.MonkeyPatch) -> list[type[BaseModel]]:
+    """Stub the LLM with one converting every permuted graph to the same text.
+
+    Returns:
+        The response models of every request.
+    """
+    calls: list[type[BaseModel]] = []
+
+    def ask_llm_with_schema(
+        llm: str, sys_prompt: str, user_prompt: str, model: type[BaseModel]
+    ) -> tuple[BaseModel, float]:
+        calls.append(model)
+        return KGAsText(results="Converted."), 0.5
+
+    monkeypatch.setattr(kg_pipeline, "ask_llm_with_schema", ask_llm_with_schema)
+    return calls
+
+
+def test_steps_are_reused_with_their_cost(previous: dict) -> None:
+    """Steps present in the previous outputs are not run, and missing costs count as zero."""
+
+    def step() -> tuple[str, float]:
+        raise AssertionError("The step should be reused")
+
+    assert kg_pipeline.reuse_or_run(previous, "results", "kg_to_text", step) == (
+        previous["results"],
+        previous["token_cost"]["kg_to_text"],
+    )
+    assert kg_pipeline.reuse_or_run(previous, "methods", "methods", step) == (
+        previous["methods"],
+        0.0,
+    )
+    assert kg_pipeline.reuse_or_run({}, "methods", "methods", lambda: ("Methods.", 0.1)) == (
+        "Methods.",
+        0.1,
+    )
+
+
+def test_permutations_are_reused_or_created(
+    previous: dict, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Previous permutations are reused as they are, otherwise they are created."""
+    knowledge_graph_permutations, node_swaps_tracker, triple_deviation_pct = (
+        kg_pipeline.reuse_or_create_permutations(
+            previous, previous["knowledge_graph"], previous["semantic_groups"]
+        )
+    )
+    assert knowledge_graph_permutations == previous["knowledge_graph_permutations"]
+    assert node_swaps_tracker is previous["node_swaps_tracker"]
+    assert triple_deviation_pct is previous["triple_deviation_pct"]
+
+    created = ({"experiment_1": {}}, {}, {})
+    monkeypatch.setattr(
+        kg_pipeline.permute_knowledge_graph,
+        "create_permutations",
+        lambda knowledge_graph, semantic_groups: created,
+    )
+    assert kg_pipeline.reuse_or_create_permutations({}, {}, {}) is created
+
+
+def test_only_permutations_without_results_are_converted(
+    previous: dict, llm_calls: list[type[BaseModel]]
+) -> None:
+    """Resuming converts the missing permutations only, and token costs stay cumulative."""
+    converted = previous["results_permutations"]["experiment_1"]
+    previous["results_permutations"]["experiment_1"] = {"2": converted["2"], "5": converted["5"]}
+    outputs = kg_pipeline.run("Paper", llm=previous["llm"], previous_outputs=previous)
+
+    assert llm_calls == [KGAsText] * 3
+    assert outputs["results_permutations"] == {
+        "experiment_1": {
+            "2": converted["2"],
+            "3": "Converted.",
+            "4": "Converted.",
+            "5": converted["5"],
+            "6": "Converted.",
+        }
+    }
+    for key in ["methods", "knowledge_graph", "results", "semantic_groups"]:
+        assert outputs[key] == previous[key]
+    assert outputs["token_cost"]["kg_permutes_to_text"] == pytest.approx(
+        previous["token_cost"]["kg_permutes_to_text"] + 1.5
+    )
+    assert outputs["num_graph_permutations"] == {"experiment_1": 5, "total": 5}
+    assert "extraction_llm" not in outputs
+
+
+def test_complete_outputs_need_no_request(previous: dict, llm_calls: list[type[BaseModel]]) -> None:
+    """Resuming from complete outputs reproduces them without calling the LLM."""
+    outputs = kg_pipeline.run("Paper", llm=previous["llm"], previous_outputs=previous)
+    assert llm_calls == []
+    assert outputs["results_permutations"] == previous["results_permutations"]
+    # The sample outputs predate the cost of the methods step.
+    assert outputs["token_cost"] == pytest.approx({"methods": 0.0, **previous["token_cost"]})
@@ -0,0 +1,32 @@
+"""Tests for the structural knowledge graph evaluator."""
+
+import numpy as np
+
+from src.evaluators.kgstruct_c001.metrics import normalize_label, score_graphs
+
+GENERATED = {
+    "nodes": [{"id": 1, "label": "Participants"}, {"id": 2, "label": "Chosen Robot"}],
+    "edges": [{"source": 1, "target": 2, "relation": "designs"}],
+}
+LABELLED = {
+    "nodes": [{"label": "Participant"}, {"label": "Chosen-Robot"}, {"label": "Shared Pattern"}],
+    "edges": [
+        {"source": "Participant", "target": "Chosen-Robot", "label": "designs"},
+        {"source": "Chosen-Robot", "target": "Shared Pattern", "label": "has on back"},
+    ],
+}
+
+
+def test_normalize_label() -> None:
+    """Case, hyphens and plurals do not prevent matches."""
+    assert normalize_label("Non-Chosen Robots") == normalize_label("non chosen robot")
+
+
+def test_score_graphs_generated_against_labelled() -> None:
+    """Generated graphs with ids are matched to labelled graphs with labels."""
+    scores = score_graphs([GENERATED], [LABELLED])
+    assert np.isclose(scores["nodes"]["precision"][0, 0], 1.0)
+    assert np.isclose(scores["nodes"]["recall"][0, 0], 2 / 3)
+    assert np.isclose(scores["triples"]["precision"][0, 0], 1.0)
+    assert np.isclose(scores["triples"]["recall"][0, 0], 0.5)
+    assert np.isclose(scores["triples"]["f1"][0, 0], 2 / 3)
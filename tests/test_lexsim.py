@@ -0,0 +1,29 @@
+"""Tests for the lexical-similarity pre-screen evaluator."""
+
+import numpy as np
+
+from src.evaluators.lexsim_c001.runner import screen_experiment
+from src.evaluators.lexsim_c001.similarity import cosine_similarity_matrix
+
+
+def test_similarity_matrix_is_symmetric_with_unit_diagonal() -> None:
+    """Every text is identical to itself and similarity is symmetric."""
+    texts = ["participants preferred the chosen pattern", "the robot had a shared pattern"]
+    similarity = cosine_similarity_matrix(texts)
+    assert np.allclose(np.diag(similarity), 1.0)
+    assert np.allclose(similarity, similarity.T)
+
+
+def test_screen_flags_unchanged_and_duplicate_alternatives() -> None:
+    """Copies of the original or of earlier alternatives do not pass the screen."""
+    original = "Participants preferred the unique pattern on the chosen robot."
+    alternatives = {
+        "2": original,
+        "3": "Participants preferred the shared pattern over both unique patterns.",
+        "4": "Participants preferred the shared pattern over both unique patterns.",
+        "5": "No preference between the patterns was observed in any condition.",
+    }
+    screen = screen_experiment(original, alternatives)
+    assert screen["flags"]["2"]["unchanged"]
+    assert screen["flags"]["4"]["near_duplicate_of"] == ["3"]
+    assert screen["passed"] == ["3", "5"]
@@ -0,0 +1,57 @@
+"""Tests for structured and non-blocking logging."""
+
+import json
+import logging
+import os
+from pathlib import Path
+
+from src.logger import handlers
+from src.logger.handlers import ContextFilter, JsonFormatter, NonBlockingHandler, log_context
+
+
+def test_queued_json_records_carry_their_context(tmp_path: Path) -> None:
+    """Records are written by the background thread with the fields of their context."""
+    log_path = tmp_path / "log.jsonl"
+    file_handler = logging.FileHandler(log_path)
+    file_handler.setFormatter(JsonFormatter())
+    handler = NonBlockingHandler(file_handler)
+    logger = logging.getLogger("tests.logger")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addFilter(ContextFilter())
+    logger.addHandler(handler)
+
+    items = ["a"]
+    with log_context(run_id="doi/gen"), log_context(stage="methods"):
+        logger.info("Items: %s", items)
+    # The message was merged when logged, not when written.
+    items.append("b")
+    logger.info("Done", extra={"permutations": 3})
+    handler.close()
+    logger.removeHandler(handler)
+
+    records = [json.loads(line) for line in log_path.read_text().splitlines()]
+    assert records[0]["message"] == "Items: ['a']"
+    assert (records[0]["run_id"], records[0]["stage"]) == ("doi/gen", "methods")
+    assert "run_id" not in records[1]
+    assert records[1]["permutations"] == 3
+
+
+def test_only_open_handlers_restart_in_forked_children(tmp_path: Path) -> None:
+    """A forked child writes through the open handlers, closed ones stay stopped."""
+    log_path = tmp_path / "log.txt"
+    handler = NonBlockingHandler(logging.FileHandler(log_path))
+    closed = NonBlockingHandler(logging.NullHandler())
+    closed.close()
+    assert set(handlers._open_handlers) >= {handler}
+    assert closed not in handlers._open_handlers
+
+    pid = os.fork()
+    if pid == 0:
+        handler.handle(logging.makeLogRecord({"msg": "From the child", "levelno": logging.INFO}))
+        handler.close()
+        os._exit(0 if closed.listener._thread is None else 1)
+    _, status = os.waitpid(pid, 0)
+    handler.close()
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert log_path.read_text() == "From the child\n"
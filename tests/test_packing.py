@@ -0,0 +1,24 @@
+"""Tests for packing prompt items into token-budgeted requests."""
+
+from src.llm.packing import pack_by_token_budget
+
+
+def test_packs_respect_token_budget() -> None:
+    """Packs are closed before exceeding the token budget."""
+    item_tokens = {"2": 40, "3": 40, "4": 40, "5": 40}
+    packs = pack_by_token_budget(item_tokens, token_budget=100, overhead_tokens=20)
+    assert packs == [["2", "3"], ["4", "5"]]
+
+
+def test_packs_respect_max_pack_size() -> None:
+    """Packs never hold more than max_pack_size items."""
+    item_tokens = {i: 1 for i in range(5)}
+    packs = pack_by_token_budget(item_tokens, token_budget=1000, max_pack_size=2)
+    assert packs == [[0, 1], [2, 3], [4]]
+
+
+def test_oversized_item_gets_its_own_pack() -> None:
+    """An item larger than the budget is still returned, alone in its pack."""
+    item_tokens = {"a": 10, "b": 500, "c": 10}
+    packs = pack_by_token_budget(item_tokens, token_budget=100)
+    assert packs == [["a"], ["b"], ["c"]]
@@ -0,0 +1,64 @@
+"""Tests for the stage profiler."""
+
+import sys
+import threading
+import time
+
+from src.profiling import StageProfiler, activate_profiler, profile_stage, stages
+
+# The telemetry module the profiler reads, imported as the src modules import it.
+telemetry = sys.modules[stages.time_calls.__module__]
+
+
+def test_stages_are_recorded_only_with_an_active_profiler() -> None:
+    """Repeated stages add up, and stages outside `activate_profiler` are not recorded."""
+    profiler = StageProfiler(hotspots=True, memory=True)
+    with profile_stage("ignored"):
+        pass
+    with activate_profiler(profiler):
+        for _ in range(2):
+            with profile_stage("build"):
+                items = [str(i) for i in range(10000)]
+                with profile_stage("join"):
+                    "".join(items)
+
+    report = profiler.report()
+    assert list(report["stages"]) == ["join", "build"]
+    build = report["stages"]["build"]
+    assert build["calls"] == 2
+    assert build["wall_seconds"] >= report["stages"]["join"]["wall_seconds"]
+    assert build["peak_memory_bytes"] > 0
+    assert build["hotspots"]
+    # Nested stages are timed, but only the outermost stage is profiled.
+    assert "peak_memory_bytes" not in report["stages"]["join"]
+    assert report["stages"]["join"]["hotspots"] == []
+
+
+def test_llm_time_is_charged_to_the_run_making_the_calls() -> None:
+    """A stage waiting while another run calls the LLM spends no time in LLM calls."""
+    idle_started = threading.Event()
+    call_done = threading.Event()
+    idle_profiler = StageProfiler()
+    calling_profiler = StageProfiler()
+
+    def idle() -> None:
+        with activate_profiler(idle_profiler), profile_stage("idle"):
+            idle_started.set()
+            call_done.wait(5)
+
+    def call() -> None:
+        idle_started.wait(5)
+        with activate_profiler(calling_profiler), profile_stage("convert"):
+            with telemetry.get_telemetry().track_call("KGAsText"):
+                time.sleep(0.05)
+        call_done.set()
+
+    threads = [threading.Thread(target=idle), threading.Thread(target=call)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert idle_profiler.report()["stages"]["idle"]["llm_seconds"] == 0.0
+    convert = calling_profiler.report()["stages"]["convert"]
+    assert 0.05 <= convert["llm_seconds"] <= convert["wall_seconds"]
@@ -0,0 +1,151 @@
+"""Tests for the local repair of invalid structured responses."""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import litellm
+import pytest
+from pydantic import ValidationError
+
+from src.generators.ken_c137.prompts.response_models import (
+    IdentifiedSemanticGroups,
+    InitialKG,
+    KGAsText,
+    PackedKGAsText,
+)
+from src.llm import caller
+from src.llm.caller import MinuteRateLimiter
+from src.llm.repair import REPAIR_SYS_PROMPT, parse_locally, repair_json, repair_prompt
+from src.llm.telemetry import Telemetry
+
+
+def test_prompt_example_shapes_are_reshaped_to_the_schema() -> None:
+    """Semantic groups and graphs keyed by experiment, as in the prompts, validate."""
+    semantic_groups = {
+        "semantic_groups": {
+            "experiment_1": {"Drugs": [{"id": 1, "label": "A", "level": "1"}]},
+        }
+    }
+    parsed = parse_locally(json.dumps(semantic_groups), IdentifiedSemanticGroups)
+    assert parsed.to_dict_format() == {
+        "experiment_1": {"Drugs": [{"id": 1, "label": "A", "level": 1}]}
+    }
+
+    knowledge_graph = {
+        "knowledge_graph": {
+            "experiment_1": {
+                "nodes": [{"id": 1, "label": "A"}, {"id": 2, "label": "B"}],
+                "edges": [{"source": 1, "target": 2, "relation": "raises"}],
+            },
+        }
+    }
+    parsed_kg = parse_locally(json.dumps(knowledge_graph), InitialKG)
+    assert (
+        parsed_kg.to_dict_format()["experiment_1"]
+        == knowledge_graph["knowledge_graph"]["experiment_1"]
+    )
+
+
+def test_truncated_output_keeps_its_complete_items() -> None:
+    """A response cut off mid-item, in a code fence, keeps only its complete items."""
+    content = (
+        '```json\n{"permutations": [{"permutation_id": "1", "results": "One."},'
+        ' {"permutation_id": "2", "results": "Tw'
+    )
+    parsed = parse_locally(content, PackedKGAsText)
+    assert parsed.to_dict_format() == {"1": "One."}
+
+    content = '{"permutations": [{"permutation_id": "1", "results": "One."}, {"permutation_id":'
+    assert parse_locally(content, PackedKGAsText).to_dict_format() == {"1": "One."}
+    assert json.loads(repair_json('{"a": [1, 2,],}')) == {"a": [1, 2]}
+
+
+def test_truncated_text_is_not_accepted() -> None:
+    """A text cut off mid-string is left to a repair request rather than closed."""
+    with pytest.raises(ValidationError):
+        parse_locally('{"results": "The drug increased bl', KGAsText)
+    assert json.loads(repair_json('["One.", "Tw')) == ["One."]
+
+
+def test_unrepairable_output_raises_the_original_error() -> None:
+    """Outputs missing required content are left to a repair request."""
+    content = '{"permutations": [{"permutation_id": "1"}]}'
+    with pytest.raises(ValidationError) as error:
+        parse_locally(content, PackedKGAsText)
+    prompt = repair_prompt(content, error.value)
+    assert content in prompt
+    assert "permutations.0.results: Field required" in prompt
+
+
+def response(content: str) -> SimpleNamespace:
+    """Build a litellm response.
+
+    Args:
+        content: The content of the response.
+
+    Returns:
+        The response, costing 0.5.
+    """
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        usage=SimpleNamespace(total_tokens=10),
+        _hidden_params={"response_cost": 0.5},
+    )
+
+
+@pytest.fixture
+def telemetry(monkeypatch: pytest.MonkeyPatch) -> Telemetry:
+    """Stub everything but the completion calls of the LLM caller.
+
+    Returns:
+        The telemetry the repairs are recorded in.
+    """
+    telemetry = Telemetry()
+    monkeypatch.setattr(caller, "get_telemetry", lambda: telemetry)
+    monkeypatch.setattr("src.llm.repair.get_telemetry", lambda: telemetry)
+    monkeypatch.setattr(caller, "get_config", lambda: None)
+    monkeypatch.setattr(caller, "supports_schema", lambda model: True)
+    monkeypatch.setattr(caller, "get_rate_limiter", lambda: MinuteRateLimiter(100_000))
+    monkeypatch.setattr(caller, "get_concurrency_controller", lambda: None)
+    clients = SimpleNamespace(client=lambda *args: None, async_client=lambda *args: None)
+    monkeypatch.setattr(caller, "get_shared_clients", lambda: clients)
+    monkeypatch.setattr(litellm, "token_counter", lambda model, messages: 10)
+    return telemetry
+
+
+def test_repair_request_fixes_invalid_response(
+    telemetry: Telemetry, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """An invalid response is sent back with its errors and the fixed one is returned."""
+    prompts: list[list[dict]] = []
+    contents = ['{"results": "The drug increased bl', '{"results": "The drug increased it."}']
+
+    def completion(messages: list[dict], **kwargs: object) -> SimpleNamespace:
+        prompts.append(messages)
+        return response(contents.pop(0))
+
+    monkeypatch.setattr(litellm, "completion", completion)
+    parsed, cost = caller.ask_llm_with_schema("gpt-4o", "sys", "user", KGAsText)
+    assert parsed.results == "The drug increased it."
+    assert cost == 1.0
+    assert prompts[1][0]["content"] == REPAIR_SYS_PROMPT
+    assert "The drug increased bl" in prompts[1][1]["content"]
+    assert telemetry.summary()["repairs"] == {"local": 0, "request": 1, "failed": 0}
+
+
+def test_failed_async_repair_request_raises(
+    telemetry: Telemetry, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """A repair request which is invalid too raises, without a further repair request."""
+    calls: list[list[dict]] = []
+
+    async def acompletion(messages: list[dict], **kwargs: object) -> SimpleNamespace:
+        calls.append(messages)
+        return response('{"result": "Misnamed."}')
+
+    monkeypatch.setattr(litellm, "acompletion", acompletion)
+    with pytest.raises(ValidationError):
+        asyncio.run(caller.ask_llm_async_with_schema("gpt-4o", "sys", "user", KGAsText))
+    assert len(calls) == 2
+    assert telemetry.summary()["repairs"] == {"local": 0, "request": 0, "failed": 1}
@@ -0,0 +1,72 @@
+"""Tests for the coalescing of identical in-flight LLM requests."""
+
+import asyncio
+
+import pytest
+from pydantic import BaseModel
+
+from src.llm import caller
+from src.llm.telemetry import Telemetry
+
+
+class Verdict(BaseModel):
+    """Stands in for a response schema."""
+
+    score: int
+
+
+def test_identical_requests_share_one_call(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Concurrent identical requests get the same response, costed once; others are sent."""
+    telemetry = Telemetry()
+    monkeypatch.setattr("src.llm.coalescing.get_telemetry", lambda: telemetry)
+    calls: list[str] = []
+
+    async def ask(
+        model: str,
+        sys_prompt: str,
+        user_prompt: str,
+        output_class: type[Verdict],
+        top_p: float,
+        temperature: float,
+        repair: bool,
+    ) -> tuple[Verdict, float]:
+        calls.append(user_prompt)
+        await asyncio.sleep(0.01)
+        return output_class(score=len(calls)), 0.5
+
+    monkeypatch.setattr(caller, "_ask_llm_async_with_schema", ask)
+
+    async def ask_concurrently() -> list[tuple[str | Verdict, float]]:
+        return await asyncio.gather(
+            *(caller.ask_llm_async_with_schema("gpt-4o", "sys", "A", Verdict) for _ in range(3)),
+            caller.ask_llm_async_with_schema("gpt-4o", "sys", "B", Verdict),
+        )
+
+    responses = asyncio.run(ask_concurrently())
+    assert calls == ["A", "B"]
+    assert [cost for _, cost in responses] == [0.5, 0.0, 0.0, 0.5]
+    assert responses[0][0] is responses[1][0] is responses[2][0]
+    assert telemetry.summary()["coalesced_requests"] == 2
+
+    # Completed requests are not cached: the same request is sent again.
+    asyncio.run(ask_concurrently())
+    assert calls == ["A", "B", "A", "B"]
+
+
+def test_errors_reach_every_caller(monkeypatch: pytest.MonkeyPatch) -> None:
+    """A failed call raises in all callers waiting for it."""
+    monkeypatch.setattr("src.llm.coalescing.get_telemetry", Telemetry)
+
+    async def fail(*args: object) -> tuple[str, float]:
+        await asyncio.sleep(0.01)
+        raise ValueError("Invalid response")
+
+    monkeypatch.setattr(caller, "_ask_llm_async", fail)
+
+    async def ask_concurrently() -> list[tuple[str, float] | BaseException]:
+        return await asyncio.gather(
+            *(caller.ask_llm_async("gpt-4o", "sys", "A") for _ in range(2)),
+            return_exceptions=True,
+        )
+
+    assert all(isinstance(result, ValueError) for result in asyncio.run(ask_concurrently()))
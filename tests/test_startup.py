@@ -0,0 +1,24 @@
+"""Tests for CLI startup."""
+
+import subprocess
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).parent.parent / "src"
+
+
+def test_entry_points_do_not_import_provider_stack() -> None:
+    """Importing the entry points and generators leaves litellm unimported."""
+    code = (
+        "import sys\n"
+        "import evaluators.main, generators.main, generators.ken_c137, llm.caller\n"
+        "assert 'litellm' not in sys.modules\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=SRC_DIR)
+
+
+def test_config_is_resolved_once() -> None:
+    """The LLM configuration is cached after the first call."""
+    from src.llm.config import get_config
+
+    assert get_config() is get_config()
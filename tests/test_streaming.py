@@ -0,0 +1,177 @@
+"""Tests for streaming generator events to evaluators."""
+
+import json
+import queue
+import sys
+import threading
+from collections.abc import Iterable
+from pathlib import Path
+from types import ModuleType, SimpleNamespace
+
+import pytest
+
+from src.evaluators import streaming
+from src.evaluators.streaming import StreamingEvaluation, iter_events
+from src.generators.ken_c137 import kg_pipeline
+from src.generators.ken_c137.prompts.response_models import KGAsText
+
+SAMPLE_OUTPUTS = (
+    Path(__file__).parents[1]
+    / "papers/10.1016:j.cognition.2020.104244/gen_ken_c137_algo1_gpt-4o-2024-08-06.json"
+)
+
+
+def test_events_are_consumed_until_the_queue_is_closed() -> None:
+    """Events published from another thread are yielded in order until the sentinel."""
+    events: queue.Queue[dict | None] = queue.Queue()
+    published = [{"event": "context"}, {"event": "permutation", "permutation_id": "2"}]
+
+    def publish() -> None:
+        for event in published:
+            events.put(event)
+        events.put(None)
+
+    threading.Thread(target=publish).start()
+    assert list(iter_events(events)) == published
+
+
+def test_pipeline_publishes_stages_context_and_permutations(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Reused and converted permutations are all published, after the stages and context."""
+    previous = json.loads(SAMPLE_OUTPUTS.read_text())
+    previous["results_permutations"]["experiment_1"] = {
+        "2": previous["results_permutations"]["experiment_1"]["2"]
+    }
+    monkeypatch.setattr(
+        kg_pipeline,
+        "ask_llm_with_schema",
+        lambda llm, sys_prompt, user_prompt, model: (KGAsText(results="Converted."), 0.5),
+    )
+    events: list[dict] = []
+    kg_pipeline.run("Paper", llm="gpt-4o", previous_outputs=previous, on_event=events.append)
+
+    assert [event["event"] for event in events] == ["stage"] * 4 + ["context"] + ["permutation"] * 5
+    assert [event["key"] for event in events[:4]] == [
+        "methods",
+        "knowledge_graph",
+        "results",
+        "semantic_groups",
+    ]
+    assert events[4]["results"] == previous["results"]
+    permutations = {event["permutation_id"]: event["results"] for event in events[5:]}
+    assert permutations == {
+        "2": previous["results_permutations"]["experiment_1"]["2"],
+        "3": "Converted.",
+        "4": "Converted.",
+        "5": "Converted.",
+        "6": "Converted.",
+    }
+
+
+def fake_evaluator(uid: str, streams: bool) -> ModuleType:
+    """Create an evaluator module counting the permutations it is given.
+
+    Args:
+        uid: UID of the evaluator.
+        streams: Whether the evaluator has a `stream` function.
+
+    Returns:
+        The module, to be registered as `evaluators.<uid>`.
+    """
+    module = ModuleType(f"evaluators.{uid}")
+
+    def stream(paper_content: str, events: Iterable[dict]) -> dict:
+        permutations = [event for event in events if event["event"] == "permutation"]
+        return {"uid": uid, "paper": paper_content, "num_permutations": len(permutations)}
+
+    if streams:
+        module.stream = stream  # type: ignore[attr-defined]
+    return module
+
+
+@pytest.fixture
+def saved(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> list[tuple]:
+    """Register two streaming evaluators and one without `stream`, and record saved outputs.
+
+    Returns:
+        The arguments of every call saving evaluator outputs or running an evaluator.
+    """
+    monkeypatch.chdir(tmp_path)
+    Path("papers/10.1000:example").mkdir(parents=True)
+    Path("papers/10.1000:example/original_paper.txt").write_text("Paper")
+    for uid, streams in [("first_c000", True), ("second_c000", True), ("batch_c000", False)]:
+        monkeypatch.setitem(sys.modules, f"evaluators.{uid}", fake_evaluator(uid, streams))
+
+    calls: list[tuple] = []
+    lock = threading.Lock()
+
+    def save_outputs(doi: str, uid: str, gen_outputs_path: Path, outputs: dict) -> Path:
+        with lock:
+            calls.append(("save", uid, outputs))
+        return Path(f"eval_{uid}.json")
+
+    def evaluate(doi: str, uid: str, gen_outputs_path: Path) -> Path:
+        calls.append(("evaluate", uid, gen_outputs_path))
+        return Path(f"eval_{uid}.json")
+
+    monkeypatch.setattr(streaming, "save_outputs", save_outputs)
+    monkeypatch.setattr(streaming, "evaluate", evaluate)
+    return calls
+
+
+def test_events_fan_out_to_every_streaming_evaluator(saved: list[tuple]) -> None:
+    """Streaming evaluators all get every event, the others run on the saved outputs."""
+    evaluation = StreamingEvaluation(
+        "10.1000:example", ["first_c000", "missing_c000", "second_c000", "batch_c000"]
+    )
+    assert list(evaluation.queues) == ["first_c000", "second_c000"]
+    assert evaluation.batch_uids == ["batch_c000"]
+
+    evaluation.publish({"event": "context", "results": {}})
+    for permutation_id in ["2", "3"]:
+        evaluation.publish({"event": "permutation", "permutation_id": permutation_id})
+    output_paths = evaluation.finish(Path("gen.json"))
+
+    assert output_paths == [
+        Path("eval_first_c000.json"),
+        Path("eval_second_c000.json"),
+        Path("eval_batch_c000.json"),
+    ]
+    assert sorted(saved[:2], key=lambda call: call[1]) == [
+        ("save", "first_c000", {"uid": "first_c000", "paper": "Paper", "num_permutations": 2}),
+        ("save", "second_c000", {"uid": "second_c000", "paper": "Paper", "num_permutations": 2}),
+    ]
+    assert saved[2] == ("evaluate", "batch_c000", Path("gen.json"))
+
+
+def test_nothing_is_saved_when_generation_failed(saved: list[tuple]) -> None:
+    """Closing the streams of a failed generation saves no outputs and runs no evaluator."""
+    evaluation = StreamingEvaluation("10.1000:example", ["first_c000", "batch_c000"])
+    evaluation.publish({"event": "permutation", "permutation_id": "2"})
+    assert evaluation.finish(None) == []
+    assert saved == []
+
+
+def test_failing_stream_does_not_stop_the_others(
+    saved: list[tuple], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """An evaluator raising while streaming is logged and the others are still saved."""
+
+    def stream(paper_content: str, events: Iterable[dict]) -> dict:
+        list(events)
+        raise RuntimeError("Evaluator crashed")
+
+    monkeypatch.setitem(sys.modules, "evaluators.first_c000", SimpleNamespace(stream=stream))
+    evaluation = StreamingEvaluation("10.1000:example", ["first_c000", "second_c000"])
+    assert evaluation.finish(Path("gen.json")) == [Path("eval_second_c000.json")]
+
+
+def test_unknown_paper_starts_no_evaluator(saved: list[tuple]) -> None:
+    """Without the paper no evaluator is started, and finishing the failed run saves nothing."""
+    evaluation = StreamingEvaluation("10.1000:missing", ["first_c000", "batch_c000"])
+    assert evaluation.queues == {}
+    assert evaluation.batch_uids == []
+    evaluation.publish({"event": "permutation", "permutation_id": "2"})
+    assert evaluation.finish(None) == []
+    assert saved == []
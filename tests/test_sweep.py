@@ -0,0 +1,73 @@
+"""Tests for sweeps of generators over LLMs and configs."""
+
+import json
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from src.generators import sweep
+
+
+def test_outputs_are_named_by_config_and_extraction_llm() -> None:
+    """Default configs with the target LLM extracting keep the names of single runs."""
+    combinations = sweep.combinations_of(
+        ["azure/gpt-4o", "openai/gpt-4o-mini"],
+        [],
+        dict([sweep.parse_config("default={}"), sweep.parse_config('packed={"packed": true}')]),
+    )
+    assert [combination.additional_config for combination in combinations] == [
+        "",
+        "packed",
+        "kg-azure-gpt-4o",
+        "packed_kg-azure-gpt-4o",
+    ]
+    with pytest.raises(ValueError, match="not <name>=<JSON object>"):
+        sweep.parse_config('{"packed": true}')
+
+
+def test_shared_steps_run_once_per_extraction_llm(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Every combination is run from the shared outputs of its extraction LLM."""
+    monkeypatch.chdir(tmp_path)
+    Path("papers/10.1000:example").mkdir(parents=True)
+    shared_llms = []
+    runs = []
+    lock = threading.Lock()
+
+    def run_shared(paper_content: str, llm: str, **kwargs: object) -> dict:
+        shared_llms.append(llm)
+        return {"llm": llm, "methods": f"Methods by {llm}"}
+
+    def run(paper_content: str, max_num_samples: int, llm: str, **kwargs: object) -> dict:
+        with lock:
+            runs.append((llm, kwargs))
+        return {"llm": llm, "extraction_llm": kwargs["previous_outputs"]["llm"]}
+
+    module = SimpleNamespace(run_shared=run_shared, run=run)
+    monkeypatch.setattr(sweep, "load_paper_and_generator", lambda doi, uid: ("Paper", module))
+    combinations = sweep.combinations_of(["a", "b"], ["a"], {"default": {}, "packed": {}})
+    results = sweep.sweep("10.1000:example", "fake", "algo1", combinations)
+
+    assert shared_llms == ["a"]
+    assert len(runs) == 4
+    assert all(saved is not None for saved in results.values())
+    outputs = json.loads(Path("papers/10.1000:example/gen_fake_algo1_b_kg-a.json").read_text())
+    assert outputs == {"llm": "b", "extraction_llm": "a"}
+
+
+def test_combinations_share_steps_by_prompt_formats() -> None:
+    """Configs with other prompt formats need their own shared steps, others reuse them."""
+    configs = dict(
+        [
+            sweep.parse_config("default={}"),
+            sweep.parse_config('packed={"packed": true}'),
+            sweep.parse_config('compact={"compact_prompts": true}'),
+        ]
+    )
+    default, packed, compact = sweep.combinations_of(["a"], [], configs)
+    assert compact.run_kwargs == {"compact_prompts": True}
+    assert compact.shared_kwargs == {"compact_prompts": True}
+    assert default.shared_key == packed.shared_key != compact.shared_key
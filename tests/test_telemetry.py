@@ -0,0 +1,34 @@
+"""Tests for the telemetry of LLM calls."""
+
+import pytest
+
+from src.llm.telemetry import Telemetry, percentile
+
+
+def test_percentile_uses_nearest_rank() -> None:
+    """The p95 of 20 values is the 19th smallest, and empty values give 0."""
+    values = [float(value) for value in range(20, 0, -1)]
+    assert percentile(values, 95) == 19.0
+    assert percentile(values, 100) == 20.0
+    assert percentile([], 95) == 0.0
+
+
+def test_summary_groups_calls_by_name() -> None:
+    """Failed calls count as errors and are left out of the latency statistics."""
+    telemetry = Telemetry()
+    telemetry.record_call("InitialKG", 1.0)
+    telemetry.record_call("InitialKG", 3.0)
+    with pytest.raises(RuntimeError), telemetry.track_call("KGAsText"):
+        raise RuntimeError("provider error")
+    telemetry.record_rate_limit_wait(2.5)
+
+    summary = telemetry.summary()
+    assert summary["calls"] == 2
+    assert summary["errors"] == 1
+    assert summary["rate_limit_wait_seconds"] == 2.5
+    assert summary["stages"] == {
+        "InitialKG": {"calls": 2, "errors": 0, "mean_seconds": 2.0, "p95_seconds": 3.0}
+    }
+
+    telemetry.reset()
+    assert telemetry.summary()["calls"] == 0